@@ -0,0 +1,79 @@
+"""Shared timing and output helpers for the benchmark scripts.
+
+Every script writes one JSON document:
+
+    {"suite": "parsers", "env": {...}, "results": [{"name", "unit", "value", ...}]}
+
+`value` is always lower-is-better (ns/call, ms/raceday). compare.py diffs two
+of these files.
+"""
+import json, platform, subprocess, sys, time
+from datetime import datetime, timezone
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+
+
+def load_fixture(name: str):
+    return json.loads((FIXTURES / name).read_text(encoding="utf-8"))
+
+
+def _git_revision() -> str:
+    try:
+        rev = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                               capture_output=True, text=True).stdout.strip()
+        return rev + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def environment() -> dict:
+    return {
+        "time": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git": _git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.node(),
+    }
+
+
+def ns_per_call(fn, inputs, repeat: int = 5, min_seconds: float = 0.2) -> float:
+    # Replays `inputs` enough times for one timing to take min_seconds and keeps
+    # the fastest of `repeat` timings, like timeit.
+    loops = 1
+    while True:
+        t0 = time.perf_counter()
+        for _ in range(loops):
+            for x in inputs:
+                fn(x)
+        if time.perf_counter() - t0 >= min_seconds:
+            break
+        loops *= 2
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for _ in range(loops):
+            for x in inputs:
+                fn(x)
+        best = min(best, time.perf_counter() - t0)
+    return best / (loops * len(inputs)) * 1e9
+
+
+def write(suite: str, results: list, output: str) -> None:
+    doc = {"suite": suite, "env": environment(), "results": results}
+    text = json.dumps(doc, ensure_ascii=False, indent=1)
+    if output == "-":
+        print(text)
+    else:
+        Path(output).write_text(text + "\n", encoding="utf-8")
+        print(f"Wrote {len(results)} results to {output}", file=sys.stderr)
+
+
+def print_table(results: list) -> None:
+    for r in results:
+        extra = "  ".join(f"{k}={v}" for k, v in r.items() if k not in ("name", "unit", "value"))
+        print(f"{r['name']:<44}{r['value']:>12.1f} {r['unit']:<12}{extra}", file=sys.stderr)
@@ -0,0 +1,130 @@
+"""Compare scraper.normalize against the per-command copies it replaced.
+
+    python benchmarks/bench_normalize.py [--repeat 200]
+
+Every function is first checked for byte-identical output on
+benchmarks/fixtures/cell_text.json, then timed on the corpus replayed
+--repeat times (a backfill sees the same names over and over).
+"""
+import argparse, json, re, sys, timeit
+from pathlib import Path
+from typing import Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from scraper import normalize  # noqa: E402
+
+CORPUS = Path(__file__).resolve().parent / "fixtures" / "cell_text.json"
+
+
+# Legacy implementations, copied verbatim from scrape_results.py and
+# scrape_startlist.py before they moved to scraper/normalize.py.
+
+_APOSTROPHES_RE = re.compile(r"[\'\u2019]")
+_paren_re = re.compile(r"\([^)]*\)")
+
+
+def legacy_normalize_cell_text(s: str) -> str:
+    if s is None:
+        return ""
+    return s.replace("\u00a0", " ").strip()
+
+
+def legacy_trim_to_max(s: str, max_len: int) -> str:
+    s = s or ""
+    return s if len(s) <= max_len else s[:max_len]
+
+
+def legacy_normalize_name(name: str) -> str:
+    cleaned = legacy_normalize_cell_text(name).replace("*", "")
+    cleaned = _APOSTROPHES_RE.sub("", cleaned)
+    cleaned = re.sub(r"\s+", " ", cleaned).strip()
+    return legacy_trim_to_max(cleaned, 50)
+
+
+def legacy_normalize_kusk(kusk: str) -> str:
+    cleaned = re.sub(r"\s+", " ", legacy_normalize_cell_text(kusk)).strip()
+    cleaned = _APOSTROPHES_RE.sub("", cleaned)
+    return legacy_trim_to_max(cleaned, 80)
+
+
+def legacy_normalize_startlista_kusk(kusk: str, max_len: int) -> str:
+    cleaned = re.sub(r"\s+", " ", legacy_normalize_cell_text(kusk)).strip()
+    return legacy_trim_to_max(cleaned, max_len)
+
+
+def legacy_normalize_startlista_name(name: str) -> str:
+    cleaned = legacy_normalize_cell_text(name)
+
+    cleaned = cleaned.replace("*", "")
+    cleaned = cleaned.replace("'", "").replace("’", "")
+    cleaned = _paren_re.sub("", cleaned)
+
+    if len(cleaned) >= 7:
+        cleaned = cleaned[:-7]
+
+    cleaned = cleaned.rstrip()
+    cleaned = cleaned.upper()
+
+    return legacy_trim_to_max(cleaned, 50)
+
+
+def legacy_parse_swe_int(token: str) -> Optional[int]:
+    if token is None:
+        return None
+    t = legacy_normalize_cell_text(token)
+    t = t.replace("(", "").replace(")", "")
+    t = t.replace("\u00a0", " ")
+    t = t.replace(".", "").replace(" ", "")
+    t = re.sub(r"[^\d]", "", t)
+    if not t:
+        return None
+    try:
+        return int(t)
+    except ValueError:
+        return None
+
+
+PAIRS = [
+    ("normalize_cell_text", legacy_normalize_cell_text, normalize.normalize_cell_text),
+    ("normalize_name", legacy_normalize_name, normalize.normalize_name),
+    ("normalize_kusk", legacy_normalize_kusk, normalize.normalize_kusk),
+    ("normalize_startlista_kusk", lambda s: legacy_normalize_startlista_kusk(s, 120),
+     lambda s: normalize.normalize_startlista_kusk(s, 120)),
+    ("normalize_startlista_name", legacy_normalize_startlista_name, normalize.normalize_startlista_name),
+    ("parse_swe_int", legacy_parse_swe_int, normalize.parse_swe_int),
+]
+
+
+def check_identical(corpus) -> int:
+    mismatches = 0
+    for name, old, new in PAIRS:
+        for s in corpus + [None]:
+            if old(s) != new(s):
+                mismatches += 1
+                print(f"MISMATCH {name}({s!r}): {old(s)!r} != {new(s)!r}")
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=200, help="How many times to replay the corpus per timing run.")
+    args = parser.parse_args()
+
+    corpus = json.loads(CORPUS.read_text(encoding="utf-8"))
+    if check_identical(corpus):
+        sys.exit(1)
+    print(f"{len(corpus)} fixture strings: output identical for all {len(PAIRS)} functions")
+
+    stream = corpus * args.repeat
+    print(f"{'function':<28}{'legacy ns/call':>16}{'new ns/call':>14}{'speedup':>10}")
+    for name, old, new in PAIRS:
+        t_old = min(timeit.repeat(lambda: [old(s) for s in stream], number=1, repeat=3))
+        t_new = min(timeit.repeat(lambda: [new(s) for s in stream], number=1, repeat=3))
+        per_old = t_old / len(stream) * 1e9
+        per_new = t_new / len(stream) * 1e9
+        print(f"{name:<28}{per_old:>16.0f}{per_new:>14.0f}{t_old / t_new:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Throughput of the page-cell parsers and name normalizers, fully offline.
+
+    python benchmarks/bench_parsers.py [--output parsers.json]
+
+Inputs are benchmarks/fixtures/parser_cells.json (time, placing, prize,
+distance/post and raceday header texts in the shapes inner_text() returns) and
+benchmarks/fixtures/cell_text.json (horse and driver cells). Without
+DJANGO_SETTINGS_MODULE a minimal configuration is used, so no database or
+environment is needed.
+"""
+import argparse, os, sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import django  # noqa: E402
+from django.conf import settings  # noqa: E402
+
+import _report  # noqa: E402
+
+
+def setup_django():
+    if "DJANGO_SETTINGS_MODULE" not in os.environ and not settings.configured:
+        settings.configure(INSTALLED_APPS=["scraper"], USE_TZ=True)
+    django.setup()
+
+
+def cases():
+    from scraper import normalize
+    from scraper.management.commands import scrape_results, scrape_startlist
+
+    cells = _report.load_fixture("parser_cells.json")
+    names = _report.load_fixture("cell_text.json")
+    return [
+        ("results.parse_tid_cell", scrape_results.parse_tid_cell, cells["tid"]),
+        ("results.map_placering_value", scrape_results.map_placering_value, cells["placering"]),
+        ("results.parse_pris_text", scrape_results.parse_pris_text, cells["pris"]),
+        ("results.parse_dist_spar", scrape_results.parse_dist_spar, cells["dist_spar_results"]),
+        ("results._extract_track_and_date", scrape_results._extract_track_and_date, cells["nav_texts"]),
+        ("startlist.parse_dist_spar", scrape_startlist.parse_dist_spar, cells["dist_spar_startlist"]),
+        ("startlist._extract_track_and_date", scrape_startlist._extract_track_and_date, cells["nav_texts"]),
+        ("normalize.normalize_cell_text", normalize.normalize_cell_text, names),
+        ("normalize.normalize_name", normalize.normalize_name, names),
+        ("normalize.normalize_kusk", normalize.normalize_kusk, names),
+        ("normalize.normalize_startlista_kusk", lambda s: normalize.normalize_startlista_kusk(s, 120), names),
+        ("normalize.normalize_startlista_name", normalize.normalize_startlista_name, names),
+        ("normalize.parse_swe_int", normalize.parse_swe_int, names),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output", default="-", help="Where to write the JSON results; - for stdout.")
+    parser.add_argument("--repeat", type=int, default=5, help="Timings per function; the fastest is kept.")
+    parser.add_argument("--filter", default="", help="Only run benchmarks whose name contains this text.")
+    args = parser.parse_args()
+
+    setup_django()
+    results = []
+    for name, fn, inputs in cases():
+        if args.filter not in name:
+            continue
+        ns = _report.ns_per_call(fn, inputs, repeat=args.repeat)
+        # The normalizers are memoized, so a replayed corpus measures the warm
+        # cache; that is what a backfill sees after the first few racedays.
+        results.append({"name": name, "unit": "ns/call", "value": round(ns, 1), "inputs": len(inputs)})
+
+    _report.print_table(results)
+    _report.write("parsers", results, args.output)
+
+
+if __name__ == "__main__":
+    main()
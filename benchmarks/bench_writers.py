@@ -0,0 +1,179 @@
+"""DB writer throughput at raceday sizes, against a throwaway test database.
+
+    DJANGO_SETTINGS_MODULE=horseproj.settings python benchmarks/bench_writers.py \\
+        [--racedays 5 --races 10 --starters 12] [--output writers.json]
+
+Creates the Django test database (test_<NAME>, migrated from scratch) on the
+configured server, so production tables are never touched, and drops it
+afterwards unless --keepdb is given. Numbers are only comparable between runs
+on the same Postgres; SQLite works for a smoke test.
+
+Scenarios, each timed over all racedays with one writer call per raceday like
+the scrapers make:
+
+    results_insert           write_rows_to_db into empty tables
+    results_unchanged        the same rows again (a re-scrape with no news)
+    results_changed          placing, time and odds changed on every row
+    startlist_insert         write_startlist_rows for future racedays (also
+                             upserts the resultat rows)
+    startlist_unchanged      the same startlists again
+"""
+import argparse, os, random, sys, time
+from dataclasses import replace
+from datetime import date, time as dt_time, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import django  # noqa: E402
+
+import _report  # noqa: E402
+
+BANKODS = ("S", "Å", "J", "B", "R", "Mp", "F", "Ö", "Ax", "H")
+DRIVERS = (
+    "Örjan Kihlström", "Björn Goop", "Erik Adielsson", "Magnus A Djuse", "Carl Johan Jepson",
+    "Ulf Ohlsson", "Per Linderoth", "Kevin Oscarsson", "Mats E Djuse", "Jorma Kontio",
+    "Rikard N Skoglund", "Daniel Wäjersten", "Peter Ingves", "Johan Untersteiner", "Oskar J Andersson",
+)
+
+
+def setup_django():
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "horseproj.settings")
+    django.setup()
+
+
+def name_pool():
+    from scraper.normalize import normalize_name
+
+    seen = {}
+    for raw in _report.load_fixture("cell_text.json"):
+        clean = normalize_name(raw)
+        if clean and clean not in seen:
+            seen[clean] = raw
+    return list(seen.values())
+
+
+def racedays(n_days: int, races: int, starters: int, seed: int = 39):
+    from scraper.management.commands.scrape_results import Row
+    from scraper.management.commands.scrape_startlist import StartRow
+    from scraper.normalize import normalize_startlista_name
+
+    rnd = random.Random(seed)
+    pool = name_pool()
+    if starters > len(pool):
+        raise SystemExit(f"--starters can be at most {len(pool)} (distinct names in the corpus)")
+
+    days = []
+    for d in range(n_days):
+        datum = int((date(2024, 3, 1) + timedelta(days=d)).strftime("%Y%m%d"))
+        bankod = BANKODS[d % len(BANKODS)]
+        results, starts = [], []
+        for lopp in range(1, races + 1):
+            distans = rnd.choice((1640, 2140, 2640))
+            for nr, raw in enumerate(rnd.sample(pool, starters), start=1):
+                kusk = rnd.choice(DRIVERS)
+                results.append(Row(
+                    datum=datum, bankod=bankod, lopp=lopp, nr=nr, namn=raw, distans=distans, spar=nr,
+                    placering=nr if nr <= 8 else 15, tid=round(rnd.uniform(11.0, 17.0), 1),
+                    startmetod=rnd.choice(("a", "")), galopp=rnd.choice(("", "", "g")), underlag="n",
+                    kusk=kusk, pris=rnd.choice((0, 5_000, 20_000)), odds=rnd.randint(15, 999),
+                ))
+                starts.append(StartRow(
+                    startdatum=datum, bankod=bankod, lopp=lopp, nr=nr, namn=normalize_startlista_name(raw + " 5 år   "),
+                    spar=nr, distans=distans, kusk=kusk, struken=rnd.random() < 0.05,
+                    starttid=dt_time(18, 0) if lopp == 1 else dt_time(18 + lopp // 3, (lopp * 20) % 60),
+                    ts_id=610_000 + d,
+                ))
+        days.append((results, starts))
+    return days
+
+
+def changed(rows):
+    return [replace(r, placering=(r.placering % 12) + 1, tid=r.tid + 0.1, odds=r.odds + 1) for r in rows]
+
+
+def clear_tables():
+    from scraper.models import DirtyRace, HorseResult, StartList
+
+    for model in (HorseResult, StartList, DirtyRace):
+        model.objects.all().delete()
+
+
+def run_scenario(write, batches):
+    from django.db import connection
+
+    queries = 0
+
+    def count(execute, sql, params, many, context):
+        nonlocal queries
+        queries += 1
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(count):
+        t0 = time.perf_counter()
+        for rows in batches:
+            write(rows)
+        seconds = time.perf_counter() - t0
+    return seconds, queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--racedays", type=int, default=5, help="Racedays per scenario.")
+    parser.add_argument("--races", type=int, default=10, help="Races per raceday.")
+    parser.add_argument("--starters", type=int, default=12, help="Horses per race.")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per scenario; the fastest is kept.")
+    parser.add_argument("--keepdb", action="store_true", help="Keep the test database between runs.")
+    parser.add_argument("--output", default="-", help="Where to write the JSON results; - for stdout.")
+    args = parser.parse_args()
+
+    setup_django()
+    from django.db import connection
+    from scraper.management.commands.scrape_results import write_rows_to_db
+    from scraper.management.commands.scrape_startlist import write_startlist_rows
+
+    days = racedays(args.racedays, args.races, args.starters)
+    results_rows = [r for r, _ in days]
+    start_rows = [s for _, s in days]
+    n_rows = sum(len(r) for r in results_rows)
+
+    def write_startlist(rows):
+        # today_int=0: every raceday is upcoming, so resultat rows are upserted too.
+        write_startlist_rows(rows, 0)
+
+    # (name, write, batches, setup): setup runs untimed on empty tables first.
+    insert_results = (write_rows_to_db, results_rows)
+    insert_starts = (write_startlist, start_rows)
+    scenarios = [
+        ("results_insert", write_rows_to_db, results_rows, None),
+        ("results_unchanged", write_rows_to_db, results_rows, insert_results),
+        ("results_changed", write_rows_to_db, [changed(r) for r in results_rows], insert_results),
+        ("startlist_insert", write_startlist, start_rows, None),
+        ("startlist_unchanged", write_startlist, start_rows, insert_starts),
+    ]
+
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=args.keepdb)
+    results = []
+    try:
+        for name, write, batches, setup in scenarios:
+            best, queries = float("inf"), 0
+            for _ in range(args.repeat):
+                clear_tables()
+                if setup is not None:
+                    run_scenario(*setup)
+                seconds, queries = run_scenario(write, batches)
+                best = min(best, seconds)
+            results.append({
+                "name": f"writers.{name}", "unit": "ms/raceday", "value": round(best / len(batches) * 1000, 2),
+                "rows_per_second": round(n_rows / best), "queries_per_row": round(queries / n_rows, 2),
+                "rows_per_raceday": n_rows // len(batches), "engine": connection.vendor,
+            })
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=args.keepdb)
+
+    _report.print_table(results)
+    _report.write("writers", results, args.output)
+
+
+if __name__ == "__main__":
+    main()
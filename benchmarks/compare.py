@@ -0,0 +1,47 @@
+"""Compare two benchmark result files and flag regressions.
+
+    python benchmarks/compare.py before.json after.json [--threshold 0.10]
+
+Exits with status 1 when any benchmark got slower by more than --threshold
+(a fraction), so it can gate a change in CI or a pre-merge check.
+"""
+import argparse, json, sys
+
+
+def load(path: str) -> dict:
+    with open(path, encoding="utf-8") as fh:
+        doc = json.load(fh)
+    return {r["name"]: r for r in doc["results"]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Slowdown that counts as a regression.")
+    args = parser.parse_args()
+
+    before, after = load(args.before), load(args.after)
+    regressions = 0
+    print(f"{'benchmark':<44}{'before':>12}{'after':>12}{'change':>9}")
+    for name in sorted(before.keys() | after.keys()):
+        old, new = before.get(name), after.get(name)
+        if old is None or new is None:
+            print(f"{name:<44}{'only in ' + ('after' if old is None else 'before'):>33}")
+            continue
+        change = new["value"] / old["value"] - 1 if old["value"] else 0.0
+        mark = ""
+        if change > args.threshold:
+            mark = "  REGRESSION"
+            regressions += 1
+        elif change < -args.threshold:
+            mark = "  faster"
+        print(f"{name:<44}{old['value']:>12.1f}{new['value']:>12.1f}{change:>+8.0%}{mark} {new['unit']}")
+
+    if regressions:
+        print(f"{regressions} regressions above {args.threshold:.0%}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
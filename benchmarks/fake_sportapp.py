@@ -0,0 +1,328 @@
+"""A local stand-in for sportapp.travsport.se with latency and fault injection.
+
+    python benchmarks/fake_sportapp.py --port 8765 --latency-ms 300 --error-rate 0.02
+    SPORTAPP_BASE_URL=http://127.0.0.1:8765 python manage.py scrape_results --start-id 610000 --end-id 610040
+
+Serves the calendar, startlist, results and proposition pages under the real
+URL shapes, with the markup the scrapers' selectors expect (MUI data grids,
+RaceDayNavigator header, "Lopp N" headings). Pages are generated from the
+benchmark fixtures, deterministically per ts-ID, unless --pages-dir holds a
+saved page for the URL: <pages-dir>/ts<id>-results.html, ts<id>-startlist.html,
+ts<id>-propositions.html or ts<id>-proposition-ts<pid>.html.
+
+ts-IDs from --first-id onwards map to consecutive days, --ids-per-day IDs per
+day starting at --first-date. A --missing-rate share of them are not racedays
+and answer 404. Fault injection applies to every request:
+
+    --latency-ms / --jitter-ms   time to first byte
+    --slow-rate / --slow-ms      share of responses whose body trickles in over slow-ms
+    --error-rate / --error-status  share answered with 503 (or 429)
+"""
+import argparse, html, json, os, random, re, sys, threading, time
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+
+TRACKS = (
+    "SOLVALLA", "ÅBY", "JÄGERSRO", "BERGSÅKER", "ROMME", "MANTORP", "FÄRJESTAD", "ÖSTERSUND", "AXEVALLA",
+    "HALMSTAD", "GÄVLE", "BODEN", "UMÅKER", "ESKILSTUNA", "KALMAR", "ÅRJÄNG", "VISBY", "DANNERO",
+)
+DRIVERS = (
+    "Örjan Kihlström", "Björn Goop", "Erik Adielsson", "Magnus A Djuse", "Carl Johan Jepson",
+    "Ulf Ohlsson", "Per Linderoth", "Kevin Oscarsson", "Mats E Djuse", "Jorma Kontio",
+)
+WEEKDAYS = ("Måndag", "Tisdag", "Onsdag", "Torsdag", "Fredag", "Lördag", "Söndag")
+MONTHS = ("januari", "februari", "mars", "april", "maj", "juni", "juli", "augusti",
+          "september", "oktober", "november", "december")
+UNDERLAG = ("Lätt bana", "Lätt bana", "Något tung bana", "Tung bana", "Vinterbana")
+
+ROUTES = (
+    ("results", re.compile(r"^/race/raceday/ts(\d+)/results/all$")),
+    ("startlist", re.compile(r"^/race/raceday/ts(\d+)/startlist/all$")),
+    ("proposition", re.compile(r"^/propositions/raceday/ts(\d+)/proposition/ts(\d+)$")),
+    ("propositions", re.compile(r"^/propositions/raceday/ts(\d+)$")),
+    ("calendar", re.compile(r"^/race/calendar/race$")),
+)
+
+
+class Site:
+    def __init__(self, args):
+        self.args = args
+        cells = json.loads((FIXTURES / "parser_cells.json").read_text(encoding="utf-8"))
+        names = json.loads((FIXTURES / "cell_text.json").read_text(encoding="utf-8"))
+        # Only the shapes the parsers turn into a value; the odd ones are for
+        # the parser benchmarks, not for filling a whole raceday.
+        self.names = [n for n in names if "(" in n or "år" in n]
+        self.tid = [t for t in cells["tid"] if re.search(r"\d[.,]\d", t)]
+        self.pris = [p for p in cells["pris"] if "Pris:" in p]
+        self.rnd = random.Random(args.seed)
+        self.lock = threading.Lock()
+        self.stats = {}
+
+    # -- ts-ID layout ---------------------------------------------------------
+
+    def day_of(self, ts_id: int):
+        offset = ts_id - self.args.first_id
+        if offset < 0:
+            return None
+        return self.args.first_date + timedelta(days=offset // self.args.ids_per_day)
+
+    def is_raceday(self, ts_id: int) -> bool:
+        if self.day_of(ts_id) is None:
+            return False
+        return random.Random(ts_id).random() >= self.args.missing_rate
+
+    def raceday(self, ts_id: int):
+        rnd = random.Random(ts_id * 7919)
+        day = self.day_of(ts_id)
+        track = TRACKS[ts_id % len(TRACKS)]
+        races = []
+        for lopp in range(1, rnd.randint(self.args.min_races, self.args.max_races) + 1):
+            distans = rnd.choice((1640, 2140, 2640))
+            starters = rnd.randint(self.args.min_starters, self.args.max_starters)
+            horses = []
+            for nr, name in enumerate(rnd.sample(self.names, starters), start=1):
+                horses.append({
+                    "nr": nr, "name": name, "driver": rnd.choice(DRIVERS), "spar": nr, "distans": distans,
+                    "struken": rnd.random() < 0.04, "odds": rnd.randint(12, 999),
+                    "tid": rnd.choice(self.tid), "placering": str(nr) if nr <= 8 else rnd.choice(("0", "k", "d")),
+                })
+            races.append({
+                "lopp": lopp, "start": f"{18 + (lopp - 1) * 25 // 60}:{(lopp - 1) * 25 % 60:02d}",
+                "distans": distans, "underlag": rnd.choice(UNDERLAG), "pris": rnd.choice(self.pris), "horses": horses,
+            })
+        return day, track, races
+
+    # -- pages ----------------------------------------------------------------
+
+    def nav(self, day: date, track: str) -> str:
+        date_text = f"{WEEKDAYS[day.weekday()]} {day.day} {MONTHS[day.month - 1]} {day.year}"
+        return (f'<div class="RaceDayNavigator_title__a1"><span>{html.escape(track.title())}</span>'
+                f'<span>{date_text}</span></div>')
+
+    def results_page(self, ts_id: int) -> str:
+        day, track, races = self.raceday(ts_id)
+        parts = [self.nav(day, track)]
+        for race in races:
+            parts.append(
+                f'<div class="MuiBox-root css-1"><h2>Lopp {race["lopp"]}</h2>'
+                f'<span>Banförhållande:</span><span>{race["underlag"]}</span>'
+                f'<p>{html.escape(race["pris"])}</p></div>'
+            )
+            rows = []
+            for i, h in enumerate(x for x in race["horses"] if not x["struken"]):
+                rows.append(
+                    f'<div role="row" data-rowindex="{i}">'
+                    f'<div data-field="placementDisplay">{h["placering"]}</div>'
+                    f'<div data-field="horse"><div>{h["nr"]}</div><span>{html.escape(h["name"])}</span></div>'
+                    f'<div data-field="driver"><a>{html.escape(h["driver"])}</a></div>'
+                    f'<div data-field="startPositionAndDistance">{h["spar"]}/{h["distans"]}</div>'
+                    f'<div data-field="time">{html.escape(h["tid"])}</div>'
+                    f'<div data-field="odds">{h["odds"]}</div></div>'
+                )
+            parts.append(f'<div class="MuiDataGrid-root">{"".join(rows)}</div>')
+        return "".join(parts)
+
+    def startlist_page(self, ts_id: int) -> str:
+        day, track, races = self.raceday(ts_id)
+        parts = [self.nav(day, track)]
+        for race in races:
+            parts.append(f'<div class="MuiBox-root css-1"><h2>Lopp {race["lopp"]} {race["start"]}</h2></div>')
+            rows = []
+            for i, h in enumerate(race["horses"]):
+                name = html.escape(h["name"])
+                if h["struken"]:
+                    name = f'<span class="linethrough">{name}</span>'
+                else:
+                    name = f"<span>{name}</span>"
+                rows.append(
+                    f'<div role="row" data-rowindex="{i}">'
+                    f'<div data-field="horse"><div>{h["nr"]}</div>{name}</div>'
+                    f'<div data-field="driver">{html.escape(h["driver"])}</div>'
+                    f'<div data-field="trackName">{h["spar"]}/{h["distans"]}</div>'
+                    f'<div data-field="odds">{h["odds"]}</div></div>'
+                )
+            parts.append(f'<div class="MuiDataGrid-root">{"".join(rows)}</div>')
+        return "".join(parts)
+
+    def propositions_page(self, ts_id: int) -> str:
+        _, _, races = self.raceday(ts_id)
+        links = "".join(
+            f'<div role="row" data-rowindex="{i}"><a href="/propositions/raceday/ts{ts_id}/proposition/ts{ts_id * 100 + i}">'
+            f'Prop. {i + 1}</a></div>'
+            for i in range(len(races) + 2)
+        )
+        return f'<div class="MuiDataGrid-virtualScroller">{links}</div>'
+
+    def proposition_page(self, ts_id: int, prop_id: int) -> str:
+        day, track, races = self.raceday(ts_id)
+        rnd = random.Random(prop_id)
+        rows = "".join(
+            f'<div role="row" data-rowindex="{i}">'
+            f'<div data-field="horseName"><a>{html.escape(name)}</a></div>'
+            f'<div data-field="distance">{rnd.choice((1640, 2140, 2160))} m</div>'
+            f'<div data-field="driverPreferences">1. {html.escape(rnd.choice(DRIVERS))}\n2. {html.escape(rnd.choice(DRIVERS))}</div></div>'
+            for i, name in enumerate(rnd.sample(self.names, rnd.randint(6, 20)))
+        )
+        return f'{self.nav(day, track)}<h1>Prop. {prop_id - ts_id * 100 + 1}</h1><div class="MuiDataGrid-root">{rows}</div>'
+
+    def calendar_page(self, year: int, month: int) -> str:
+        parts = []
+        day = date(year, month, 1)
+        while day.month == month:
+            offset = (day - self.args.first_date).days
+            ids = [] if offset < 0 else [
+                self.args.first_id + offset * self.args.ids_per_day + i for i in range(self.args.ids_per_day)
+            ]
+            ids = [ts_id for ts_id in ids if self.is_raceday(ts_id)]
+            if ids:
+                parts.append(f"<h2>{WEEKDAYS[day.weekday()]} {day.day} {MONTHS[month - 1]}</h2>")
+                for ts_id in ids:
+                    parts.append(
+                        f'<div><span>{TRACKS[ts_id % len(TRACKS)].title()}</span>'
+                        f'<a href="/race/raceday/ts{ts_id}/startlist/all">Startlista</a>'
+                        f'<a href="/race/raceday/ts{ts_id}/results/all">Resultat</a></div>'
+                    )
+            day += timedelta(days=1)
+        return "".join(parts) or "<h2>Inga tävlingar</h2>"
+
+    def saved_page(self, name: str):
+        if not self.args.pages_dir:
+            return None
+        path = Path(self.args.pages_dir) / name
+        return path.read_text(encoding="utf-8") if path.exists() else None
+
+    def render(self, path: str, query: dict):
+        # Returns (status, html).
+        for route, pattern in ROUTES:
+            m = pattern.match(path)
+            if not m:
+                continue
+            if route == "calendar":
+                year = int(query.get("year", [date.today().year])[0])
+                month = int(query.get("month", [date.today().month])[0])
+                return 200, self.calendar_page(year, month)
+            ts_id = int(m.group(1))
+            if not self.is_raceday(ts_id):
+                return 404, "<h1>Sidan kunde inte hittas</h1>"
+            if route == "proposition":
+                prop_id = int(m.group(2))
+                saved = self.saved_page(f"ts{ts_id}-proposition-ts{prop_id}.html")
+                return 200, saved or self.proposition_page(ts_id, prop_id)
+            saved = self.saved_page(f"ts{ts_id}-{route}.html")
+            builder = {"results": self.results_page, "startlist": self.startlist_page,
+                       "propositions": self.propositions_page}[route]
+            return 200, saved or builder(ts_id)
+        return 404, "<h1>Sidan kunde inte hittas</h1>"
+
+    # -- fault injection ------------------------------------------------------
+
+    def faults(self):
+        # Returns (first byte delay, body trickle seconds, forced status or None).
+        a = self.args
+        with self.lock:
+            delay = max(0.0, a.latency_ms + self.rnd.uniform(-a.jitter_ms, a.jitter_ms)) / 1000
+            trickle = a.slow_ms / 1000 if self.rnd.random() < a.slow_rate else 0.0
+            status = a.error_status if self.rnd.random() < a.error_rate else None
+        return delay, trickle, status
+
+    def count(self, status: int):
+        with self.lock:
+            self.stats[status] = self.stats.get(status, 0) + 1
+
+
+def make_handler(site: Site):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            delay, trickle, forced = site.faults()
+            time.sleep(delay)
+            if forced is not None:
+                status, body = forced, "<h1>Service Unavailable</h1>"
+            else:
+                status, body = site.render(url.path, parse_qs(url.query))
+            site.count(status)
+
+            data = f'<!doctype html><html><head><meta charset="utf-8"></head><body>{body}</body></html>'.encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            if forced == 429:
+                self.send_header("Retry-After", "1")
+            self.end_headers()
+            if not trickle:
+                self.wfile.write(data)
+                return
+            chunks = 10
+            step = max(1, len(data) // chunks)
+            for i in range(0, len(data), step):
+                self.wfile.write(data[i:i + step])
+                self.wfile.flush()
+                time.sleep(trickle / chunks)
+
+        def log_message(self, fmt, *args):
+            if site.args.verbose:
+                sys.stderr.write("%s %s\n" % (self.address_string(), fmt % args))
+
+    return Handler
+
+
+def add_server_arguments(parser) -> None:
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765, help="0 picks a free port.")
+    parser.add_argument("--first-id", type=int, default=610_000, help="First ts-ID that maps to a day.")
+    parser.add_argument("--first-date", type=date.fromisoformat, default=date(2025, 1, 1), help="Day of --first-id.")
+    parser.add_argument("--ids-per-day", type=int, default=4, help="ts-IDs per day.")
+    parser.add_argument("--missing-rate", type=float, default=0.3, help="Share of ts-IDs that are not racedays (404).")
+    parser.add_argument("--min-races", type=int, default=8)
+    parser.add_argument("--max-races", type=int, default=12)
+    parser.add_argument("--min-starters", type=int, default=8)
+    parser.add_argument("--max-starters", type=int, default=15)
+    parser.add_argument("--latency-ms", type=float, default=150, help="Mean time to first byte.")
+    parser.add_argument("--jitter-ms", type=float, default=50, help="Uniform +/- jitter on --latency-ms.")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="Share of responses with a slow body.")
+    parser.add_argument("--slow-ms", type=float, default=5_000, help="How long a slow body takes to arrive.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with --error-status.")
+    parser.add_argument("--error-status", type=int, default=503, choices=(429, 500, 502, 503, 504))
+    parser.add_argument("--pages-dir", default="", help="Directory of saved pages that replace the generated ones.")
+    parser.add_argument("--seed", type=int, default=40, help="Seed for latency and error injection.")
+    parser.add_argument("--verbose", action="store_true", help="Log every request.")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_server_arguments(parser)
+    return parser
+
+
+def start(args) -> tuple:
+    # Starts the server in a daemon thread; returns (server, site, base_url).
+    site = Site(args)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(site))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address[:2]
+    return server, site, f"http://{host}:{port}"
+
+
+def main():
+    args = build_parser().parse_args()
+    server, site, base_url = start(args)
+    print(f"Fake sportapp on {base_url} (pid {os.getpid()}); Ctrl-C to stop", file=sys.stderr)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        print(f"Responses by status: {dict(sorted(site.stats.items()))}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
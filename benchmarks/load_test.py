@@ -0,0 +1,109 @@
+"""Run the real scrape commands against the fake sportapp and measure throughput.
+
+    DJANGO_SETTINGS_MODULE=<settings with a scratch database> python benchmarks/load_test.py \\
+        --command results --command startlist --concurrency 1,2,4,8 --ids 40 \\
+        --latency-ms 400 --error-rate 0.03 [--output load.json]
+
+Starts benchmarks/fake_sportapp.py in this process (all its fault injection
+options are accepted) and runs `manage.py scrape_<command> --start-id ..
+--end-id .. --concurrency N --profile` once per command and concurrency. The
+page timings come from the pages.csv that --profile writes. For each run it
+reports pages/minute over the wall clock (browser start included), p50/p95/p99
+page latency, retries and failed pages.
+
+The commands write to the database of DJANGO_SETTINGS_MODULE, so it has to be
+set explicitly; point it at a scratch database, never production.
+"""
+import argparse, csv, os, subprocess, sys, tempfile, time
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import _report  # noqa: E402
+import fake_sportapp  # noqa: E402
+
+COMMANDS = {"results": "scrape_results", "startlist": "scrape_startlist", "propositions": "scrape_proposition"}
+
+
+def percentile(values, q: float) -> float:
+    # Nearest rank; fine for the few hundred pages of a load test.
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(q * len(ordered)) - 1))]
+
+
+def read_pages(profile_root: Path):
+    rows = []
+    for path in profile_root.glob("*/pages.csv"):
+        with open(path, encoding="utf-8", newline="") as fh:
+            rows.extend(csv.DictReader(fh))
+    return rows
+
+
+def run_once(command: str, start_id: int, end_id: int, concurrency: int, base_url: str, workdir: Path):
+    profile_root = workdir / f"{command}-c{concurrency}"
+    env = dict(os.environ, SPORTAPP_BASE_URL=base_url, SCRAPER_PROFILE_DIR=str(profile_root))
+    cmd = [
+        sys.executable, str(_report.ROOT / "manage.py"), COMMANDS[command],
+        "--start-id", str(start_id), "--end-id", str(end_id), "--concurrency", str(concurrency),
+        "--profile", "--profile-traces", "0",
+    ]
+    t0 = time.perf_counter()
+    proc = subprocess.run(cmd, env=env, cwd=_report.ROOT, capture_output=True, text=True)
+    wall = time.perf_counter() - t0
+    if proc.returncode != 0:
+        sys.stderr.write(proc.stderr[-4000:])
+        raise SystemExit(f"{' '.join(cmd)} exited with {proc.returncode}")
+    return wall, read_pages(profile_root)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--command", action="append", choices=sorted(COMMANDS), help="Repeatable. Default: results.")
+    parser.add_argument("--concurrency", default="1,2,4", help="Comma-separated --concurrency values to try.")
+    parser.add_argument("--ids", type=int, default=40, help="How many ts-IDs each run scrapes.")
+    parser.add_argument("--output", default="-", help="Where to write the JSON results; - for stdout.")
+    fake_sportapp.add_server_arguments(parser)
+    args = parser.parse_args()
+
+    if "DJANGO_SETTINGS_MODULE" not in os.environ:
+        raise SystemExit("Set DJANGO_SETTINGS_MODULE to settings with a scratch database first.")
+    commands = args.command or ["results"]
+    levels = [int(c) for c in args.concurrency.split(",") if c.strip()]
+
+    server, site, base_url = fake_sportapp.start(args)
+    start_id, end_id = args.first_id, args.first_id + args.ids - 1
+    results = []
+    try:
+        with tempfile.TemporaryDirectory(prefix="load_test_") as tmp:
+            for command in commands:
+                for concurrency in levels:
+                    site.stats.clear()
+                    wall, pages = run_once(command, start_id, end_id, concurrency, base_url, Path(tmp))
+                    done = [p for p in pages if p["outcome"] != "retry"]
+                    latencies = [float(p["seconds"]) * 1000 for p in done]
+                    n = len(done) or 1
+                    results.append({
+                        "name": f"load.{command}.c{concurrency}", "unit": "ms/page",
+                        "value": round(wall / n * 1000, 1),
+                        "pages_per_minute": round(len(done) / wall * 60, 1),
+                        "p50_ms": round(percentile(latencies, 0.50)),
+                        "p95_ms": round(percentile(latencies, 0.95)),
+                        "p99_ms": round(percentile(latencies, 0.99)),
+                        "pages": len(done),
+                        "empty": sum(p["outcome"] == "empty" for p in done),
+                        "failed": sum(p["outcome"] == "failed" for p in done),
+                        "retries": sum(p["outcome"] == "retry" for p in pages),
+                        "http": {str(k): v for k, v in sorted(site.stats.items())},
+                        "wall_seconds": round(wall, 1),
+                    })
+                    _report.print_table(results[-1:])
+    finally:
+        server.shutdown()
+
+    _report.write("load", results, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -83,6 +83,57 @@ DATABASES = {
     }
 }
 
+# Connection pool (psycopg_pool): each process keeps up to DB_POOL_MAX_SIZE
+# connections open, so a request does not pay for a TLS handshake. With
+# CONN_HEALTH_CHECKS the pool checks a connection with a round trip before
+# handing it out. Only the web server turns it on (Dockerfile): the scrapers'
+# asyncio.to_thread writes keep one connection per executor thread, which
+# would hold pool slots for good. Without the pool, connections are kept for
+# DB_CONN_MAX_AGE seconds instead.
+DB_POOL = os.environ.get("DB_POOL", "False") == "True"
+DATABASES["default"]["CONN_HEALTH_CHECKS"] = True
+if DB_POOL:
+    DATABASES["default"]["OPTIONS"]["pool"] = {
+        "min_size": int(os.environ.get("DB_POOL_MIN_SIZE", "2")),
+        "max_size": int(os.environ.get("DB_POOL_MAX_SIZE", "10")),
+        "timeout": float(os.environ.get("DB_POOL_TIMEOUT", "10")),
+        "max_idle": 300,
+        "max_lifetime": 1800,
+    }
+else:
+    DATABASES["default"]["CONN_MAX_AGE"] = int(os.environ.get("DB_CONN_MAX_AGE", "60"))
+
+
+# Site the scrapers read (scraper/crawl.py). Point it at a local
+# benchmarks/fake_sportapp.py for offline load tests.
+SPORTAPP_BASE_URL = os.environ.get("SPORTAPP_BASE_URL", "https://sportapp.travsport.se")
+
+# Scraper pacing and retries (scraper/crawl.py, scraper/throttle.py)
+
+SCRAPER_MAX_RETRIES         = int(os.environ.get("SCRAPER_MAX_RETRIES", "3"))
+SCRAPER_RETRY_BASE_SECONDS  = float(os.environ.get("SCRAPER_RETRY_BASE_SECONDS", "2"))
+SCRAPER_RETRY_CAP_SECONDS   = float(os.environ.get("SCRAPER_RETRY_CAP_SECONDS", "60"))
+SCRAPER_LATENCY_TOLERANCE   = float(os.environ.get("SCRAPER_LATENCY_TOLERANCE", "2.0"))
+
+# Directory for per-run metrics (scraper/instrumentation.py): <job>.prom for the
+# node_exporter textfile collector and metrics.jsonl. Empty disables the files.
+SCRAPER_METRICS_DIR = os.environ.get("SCRAPER_METRICS_DIR", "")
+
+# Where --profile puts its per-run directories (scraper/profiling.py).
+SCRAPER_PROFILE_DIR = os.environ.get("SCRAPER_PROFILE_DIR", str(BASE_DIR / "profiles"))
+
+# Columnar resultat snapshot (scraper/snapshot.py, build_snapshot). Empty means
+# no snapshot: races are not queued for it and scrape_daily skips the refresh.
+RESULTAT_SNAPSHOT_DIR = os.environ.get("RESULTAT_SNAPSHOT_DIR", "")
+
+# In-process response cache for the read API (scraper/cache.py): size bound in
+# bytes of response body per process (0 turns it off), and how often a process
+# looks for invalidations written by the scrapers.
+RESPONSE_CACHE_MAX_BYTES = int(os.environ.get("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+RESPONSE_CACHE_CHECK_SECONDS = float(os.environ.get("RESPONSE_CACHE_CHECK_SECONDS", "1.0"))
+
+# Start times on sportapp are Swedish local time (watch_raceday).
+RACE_TIME_ZONE = os.environ.get("RACE_TIME_ZONE", "Europe/Stockholm")
 
 
 # Password validation
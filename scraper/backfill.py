@@ -0,0 +1,45 @@
+import asyncio, logging
+
+# Worker processes are started with the "spawn" method, so this module must stay
+# importable before django.setup(): Django imports happen inside the functions.
+from scraper.crawl import runner_for
+
+
+def mark_done(kind: str, ts_id: int, rows: int) -> None:
+    from django.utils import timezone
+    from scraper.models import BackfillCheckpoint
+
+    BackfillCheckpoint.objects.update_or_create(
+        kind=kind,
+        ts_id=ts_id,
+        defaults=dict(rows=rows, completed_at=timezone.now()),
+    )
+
+
+def pending_ids(kind: str, start_id: int, end_id: int) -> list:
+    from scraper.models import BackfillCheckpoint
+
+    done = set(
+        BackfillCheckpoint.objects.filter(kind=kind, ts_id__gte=start_id, ts_id__lte=end_id)
+        .values_list("ts_id", flat=True)
+    )
+    return [ts_id for ts_id in range(start_id, end_id + 1) if ts_id not in done]
+
+
+def shard(ids: list, n_workers: int) -> list:
+    # Interleaved shards: neighbouring IDs (same weekday, same amount of races)
+    # end up on different workers, which keeps the shards evenly loaded.
+    return [ids[i::n_workers] for i in range(n_workers) if ids[i::n_workers]]
+
+
+def worker_main(kind: str, ts_ids: list, concurrency: int, worker_no: int) -> None:
+    import django
+    django.setup()
+    logging.basicConfig(level=logging.INFO, format=f"%(levelname)s [w{worker_no}] %(message)s", force=True)
+
+    run = runner_for(kind)
+    logging.info("Worker %d: %d %s IDs", worker_no, len(ts_ids), kind)
+    from scraper.ledger import recorded_run
+    opts = {"kind": kind, "concurrency": concurrency, "worker": worker_no}
+    with recorded_run(f"backfill_{kind}_worker", opts, min(ts_ids), max(ts_ids), job=f"backfill_{kind}_w{worker_no}"):
+        asyncio.run(run(ts_ids, concurrency=concurrency, on_done=lambda ts_id, rows: mark_done(kind, ts_id, rows)))
@@ -0,0 +1,299 @@
+import hashlib, json, logging, threading, time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Callable, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from scraper.models import CacheInvalidation, HorseResult
+from scraper.normalize import name_key, normalize_kusk
+
+# In-process LRU of encoded API responses, tagged with what they were built
+# from:
+#
+#   raceday:<datum>    resultat, startlista or proposition rows of that day
+#   horse:<name key>   resultat rows of a horse
+#   driver:<kusk>      resultat rows of a driver, or their driver_stats
+#   form:<name key>    the horse's horse_form row
+#
+# The scrapers and refreshes run in other processes than the web workers, so
+# a writer appends the tags it touched to cache_invalidation when its
+# transaction commits, and every web process reads the new rows at most once
+# per RESPONSE_CACHE_CHECK_SECONDS and evicts the entries carrying them.
+# Between checks a hit is served from memory without a query. The readers
+# also prune rows older than RETENTION, at most once per PRUNE_SECONDS each,
+# so a write never pays for it.
+
+ALL = "*"                   # evicts everything
+MAX_TAGS = 20_000           # a bigger write (a --full rebuild) just sends ALL
+RETENTION = timedelta(days=1)
+HOLE_SECONDS = 60.0
+PRUNE_SECONDS = 300.0
+RECENT_TAGS = 100_000
+RACES_PER_QUERY = 200
+
+RaceKey = Tuple[int, str, int]
+
+
+def raceday_tag(datum: int) -> str:
+    return f"raceday:{datum}"
+
+
+def horse_tag(namn: str) -> str:
+    return f"horse:{name_key(namn)}"
+
+
+def driver_tag(kusk: str) -> str:
+    return f"driver:{normalize_kusk(kusk)}"
+
+
+def form_tag(namn: str) -> str:
+    return f"form:{name_key(namn)}"
+
+
+@dataclass
+class Entry:
+    body: bytes
+    etag: str
+    tags: FrozenSet[str]
+
+
+class ResponseCache:
+    def __init__(self, max_bytes: int, check_seconds: float):
+        self.max_bytes = max_bytes
+        self.check_seconds = check_seconds
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._entries: "OrderedDict[str, Entry]" = OrderedDict()
+        self._by_tag: Dict[str, Set[str]] = {}
+        self.size = 0
+        self.hits = self.misses = self.stores = self.evictions = self.invalidations = 0
+        # Invalidation log position. An id below last_id can still commit
+        # after a higher one (sequence order is not commit order), so skipped
+        # ids are re-read for HOLE_SECONDS before they are given up on.
+        self._last_id: Optional[int] = None
+        self._holes: Dict[int, float] = {}
+        self._synced_at = 0.0
+        self._pruned_at = 0.0
+        # Sync generation, and the generation each tag was last invalidated
+        # in: a response computed across an invalidation of one of its tags
+        # is not stored.
+        self.generation = 0
+        self._invalidated: Dict[str, int] = {}
+        self._invalidated_floor = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def get(self, key: str) -> Optional[Entry]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def fresh(self, key: str) -> Optional[Entry]:
+        # A hit that needs no query, for the event loop: only while the last
+        # invalidation check is recent. None means go through cached().
+        if not self.enabled or time.monotonic() - self._synced_at >= self.check_seconds:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            return entry
+
+    def put(self, key: str, body: bytes, tags: Iterable[str], since: int) -> Entry:
+        # since: self.generation read before the response was computed. An
+        # invalidation synced meanwhile keeps it out; one not synced yet
+        # evicts it at the next sync, like any other entry with its tags.
+        tags = frozenset(tags)
+        entry = Entry(body, '"%s"' % hashlib.blake2b(body, digest_size=16).hexdigest(), tags)
+        if not self.enabled or len(body) > self.max_bytes:
+            return entry
+        with self._lock:
+            if since < self._invalidated_floor or any(
+                self._invalidated.get(t, -1) > since for t in tags | {ALL}
+            ):
+                return entry
+            self._remove(key)
+            self._entries[key] = entry
+            for tag in tags:
+                self._by_tag.setdefault(tag, set()).add(key)
+            self.size += len(body)
+            self.stores += 1
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+        return entry
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self.size -= len(entry.body)
+        for tag in entry.tags:
+            keys = self._by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_tag[tag]
+
+    def evict(self, tags: Iterable[str]) -> int:
+        tags = set(tags)
+        with self._lock:
+            self.generation += 1
+            if len(self._invalidated) + len(tags) > RECENT_TAGS:
+                self._invalidated.clear()
+                self._invalidated_floor = self.generation
+            for tag in tags:
+                self._invalidated[tag] = self.generation
+            if ALL in tags:
+                keys = list(self._entries)
+            else:
+                keys = {k for tag in tags for k in self._by_tag.get(tag, ())}
+            for key in keys:
+                self._remove(key)
+            self.invalidations += len(keys)
+            return len(keys)
+
+    def clear(self) -> None:
+        self.evict([ALL])
+
+    def sync(self, force: bool = False) -> int:
+        # Evicts the entries tagged by invalidations committed since the last
+        # check. Returns how many entries went.
+        now = time.monotonic()
+        if not self.enabled or (not force and now - self._synced_at < self.check_seconds):
+            return 0
+        # One thread polls; the others keep serving from memory meanwhile.
+        if not self._sync_lock.acquire(blocking=force):
+            return 0
+        try:
+            return self._sync(now)
+        finally:
+            self._sync_lock.release()
+
+    def _sync(self, now: float) -> int:
+        self._synced_at = now
+        if now - self._pruned_at >= PRUNE_SECONDS:
+            self._pruned_at = now
+            CacheInvalidation.objects.filter(created_at__lt=timezone.now() - RETENTION).delete()
+        if self._last_id is None:
+            # Nothing is cached yet, so older invalidations do not matter.
+            last = CacheInvalidation.objects.order_by("-id").values_list("id", flat=True).first()
+            self._last_id = last or 0
+            return 0
+
+        qs = CacheInvalidation.objects.filter(id__gt=self._last_id)
+        if self._holes:
+            qs = qs | CacheInvalidation.objects.filter(id__in=list(self._holes))
+        rows = list(qs.order_by().values_list("id", "tag"))
+        ids = {i for i, _ in rows}
+        for i in ids:
+            self._holes.pop(i, None)
+        top = max(ids, default=self._last_id)
+        if top > self._last_id:
+            for missing in range(self._last_id + 1, top):
+                if missing not in ids:
+                    self._holes[missing] = now
+            self._last_id = top
+        self._holes = {i: t for i, t in self._holes.items() if now - t < HOLE_SECONDS}
+        return self.evict(tag for _, tag in rows) if rows else 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "stores": self.stores,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "last_invalidation_id": self._last_id,
+            }
+
+
+responses = ResponseCache(
+    getattr(settings, "RESPONSE_CACHE_MAX_BYTES", 64 * 1024 * 1024),
+    getattr(settings, "RESPONSE_CACHE_CHECK_SECONDS", 1.0),
+)
+
+
+def cached(key: str, compute: Callable[[], Tuple[object, Iterable[str]]]) -> Tuple[Entry, bool]:
+    # compute() returns (payload, tags). Returns the entry and whether it came
+    # from the cache.
+    responses.sync()
+    entry = responses.get(key) if responses.enabled else None
+    if entry is not None:
+        return entry, True
+    since = responses.generation
+    payload, tags = compute()
+    body = json.dumps(payload, cls=DjangoJSONEncoder, ensure_ascii=False).encode()
+    return responses.put(key, body, tags, since), False
+
+
+def invalidate(tags: Iterable[str]) -> int:
+    # Called by writers inside their transaction; the log rows go in when it
+    # commits, so readers never evict before the data they would reload is
+    # visible. Without a transaction on_commit runs at once.
+    tags = sorted(set(tags))
+    if not tags:
+        return 0
+    if len(tags) > MAX_TAGS:
+        tags = [ALL]
+
+    def write():
+        now = timezone.now()
+        CacheInvalidation.objects.bulk_create(
+            [CacheInvalidation(tag=tag, created_at=now) for tag in tags], batch_size=2_000,
+        )
+        responses.evict(tags)
+
+    transaction.on_commit(write)
+    return len(tags)
+
+
+def invalidate_all() -> int:
+    return invalidate([ALL])
+
+
+def row_tags(namn: str, kusk: str) -> List[str]:
+    return [horse_tag(namn), *([driver_tag(kusk)] if kusk else [])]
+
+
+def race_tags(keys: Iterable[RaceKey]) -> List[str]:
+    # Everything a change to these races can show up in: their days and the
+    # horses and drivers in them as the rows stand now. A writer that can
+    # change a row's horse or driver calls this before writing and adds the
+    # new ones (row_tags), so the replaced driver is evicted too.
+    keys = sorted({(int(d), b, int(l)) for d, b, l in keys})
+    tags = {raceday_tag(d) for d, _, _ in keys}
+    for lo in range(0, len(keys), RACES_PER_QUERY):
+        races = Q()
+        for d, b, l in keys[lo:lo + RACES_PER_QUERY]:
+            races |= Q(datum=d, bankod=b, lopp=l)
+        for namn, kusk in HorseResult.objects.filter(races).values_list("namn", "kusk"):
+            tags.update(row_tags(namn, kusk))
+    return sorted(tags)
+
+
+def invalidate_races(keys: Iterable[RaceKey]) -> int:
+    n = invalidate(race_tags(keys))
+    if n:
+        logging.info("  cache: invalidated %d tags", n)
+    return n
@@ -0,0 +1,147 @@
+import asyncio, logging, time
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Iterable, Optional
+from django.conf import settings
+from playwright.async_api import async_playwright, TimeoutError as PlaywrightTimeoutError
+from scraper import profiling
+from scraper.instrumentation import COUNT_BUCKETS, metrics
+from scraper.throttle import AdaptiveLimiter, TransientPageError, backoff_delay
+
+# Overridable so the scrapers can run against a local stand-in
+# (benchmarks/fake_sportapp.py).
+SPORTAPP_BASE = getattr(settings, "SPORTAPP_BASE_URL", "https://sportapp.travsport.se").rstrip("/")
+DEFAULT_TIMEOUT_MS = 120_000
+
+# Page kinds that can be scraped by ts-ID through runner_for().
+KINDS = ("results", "startlist", "propositions")
+
+
+@asynccontextmanager
+async def open_browser():
+    from scraper import tracks
+    await asyncio.to_thread(tracks.preload)
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=True)
+        try:
+            yield browser
+        finally:
+            await browser.close()
+
+
+@asynccontextmanager
+async def open_page(browser):
+    ctx = await browser.new_context()
+    ctx.set_default_timeout(DEFAULT_TIMEOUT_MS)
+    session = profiling.active()
+    if session is not None:
+        await session.start_context(ctx)
+    page = await ctx.new_page()
+    try:
+        yield page
+    finally:
+        await ctx.close()
+
+
+async def crawl(
+    ts_ids: Iterable[int],
+    handle: Callable[[object, int], Awaitable[Optional[int]]],
+    browser=None,
+    concurrency: int = 1,
+    on_done: Optional[Callable[[int, int], None]] = None,
+    kind: str = "",
+) -> Optional[AdaptiveLimiter]:
+    # Runs handle(page, ts_id) for every ID with up to `concurrency` pages, each in
+    # its own browser context. How many of them run at once is decided by an
+    # AdaptiveLimiter. Timeouts and 5xx are retried with jittered backoff, other
+    # failures are logged and skipped. on_done(ts_id, rows) runs in a thread after
+    # every ID that did not fail. Page metrics are labelled with `kind`.
+    if browser is None:
+        async with open_browser() as own_browser:
+            return await crawl(ts_ids, handle, browser=own_browser, concurrency=concurrency, on_done=on_done, kind=kind)
+
+    queue: asyncio.Queue = asyncio.Queue()
+    for ts_id in ts_ids:
+        queue.put_nowait((ts_id, 0))
+    if queue.empty():
+        return None
+
+    max_retries = settings.SCRAPER_MAX_RETRIES
+    limiter = AdaptiveLimiter(max_limit=concurrency, tolerance=settings.SCRAPER_LATENCY_TOLERANCE)
+    outstanding = queue.qsize()
+    loop = asyncio.get_running_loop()
+
+    async def worker():
+        nonlocal outstanding
+        async with open_page(browser) as page:
+            while outstanding > 0:
+                try:
+                    ts_id, attempt = await asyncio.wait_for(queue.get(), timeout=0.5)
+                except asyncio.TimeoutError:
+                    continue
+
+                await limiter.acquire()
+                session = profiling.active()
+                if session is not None:
+                    await session.start_page(page, kind, ts_id)
+                outcome, n_rows = "failed", None
+                t0 = time.perf_counter()
+                try:
+                    n_rows = await handle(page, ts_id)
+                    outcome = "ok" if n_rows else "empty"
+                except (TransientPageError, PlaywrightTimeoutError) as exc:
+                    limiter.record_failure(exc)
+                    status = getattr(exc, "status", None)
+                    metrics.inc("page_errors_total", kind=kind, error="http" if status else "timeout")
+                    if attempt < max_retries:
+                        outcome = "retry"
+                        limiter.retries += 1
+                        metrics.inc("retries_total", kind=kind)
+                        delay = backoff_delay(attempt, settings.SCRAPER_RETRY_BASE_SECONDS, settings.SCRAPER_RETRY_CAP_SECONDS)
+                        logging.warning("  ts%s: %s; retry %d/%d in %.1fs", ts_id, exc, attempt + 1, max_retries, delay)
+                        loop.call_later(delay, queue.put_nowait, (ts_id, attempt + 1))
+                    else:
+                        logging.warning("  failed ts%s after %d attempts: %s", ts_id, attempt + 1, exc)
+                        metrics.inc("pages_total", kind=kind, outcome="failed")
+                        outstanding -= 1
+                    continue
+                except Exception as exc:
+                    limiter.record_failure(exc)
+                    logging.warning("  failed ts%s: %s", ts_id, exc)
+                    metrics.inc("page_errors_total", kind=kind, error="other")
+                    metrics.inc("pages_total", kind=kind, outcome="failed")
+                    outstanding -= 1
+                    continue
+                finally:
+                    await limiter.release()
+                    if session is not None:
+                        await session.end_page(page, kind, ts_id, attempt, outcome, time.perf_counter() - t0, n_rows)
+
+                # Empty pages (non-racedays) wait for a selector until it times out,
+                # so their latency says nothing about the site's health.
+                latency = time.perf_counter() - t0
+                limiter.record_success(latency if n_rows else None)
+                metrics.inc("pages_total", kind=kind, outcome=outcome)
+                metrics.observe("page_seconds", latency, kind=kind, empty=not n_rows)
+                metrics.observe("page_rows", n_rows or 0, buckets=COUNT_BUCKETS, kind=kind)
+                outstanding -= 1
+                if on_done is not None:
+                    await asyncio.to_thread(on_done, ts_id, n_rows or 0)
+
+    n_workers = max(1, min(concurrency, queue.qsize()))
+    await asyncio.gather(*(worker() for _ in range(n_workers)))
+    limiter.log_state()
+    return limiter
+
+
+def runner_for(kind: str):
+    # Imported lazily: this module is imported by spawned workers before django.setup().
+    if kind == "results":
+        from scraper.management.commands.scrape_results import run_ids
+        return run_ids
+    if kind == "startlist":
+        from scraper.management.commands.scrape_startlist import run_ids
+        return run_ids
+    if kind == "propositions":
+        from scraper.management.commands.scrape_proposition import run_days
+        return run_days
+    raise ValueError(f"Unknown page kind {kind!r}")
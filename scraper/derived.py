@@ -0,0 +1,257 @@
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from django.db import connection, transaction
+
+from scraper import cache, dirty
+from scraper.models import HorseResult
+
+# tid is stored as the seconds part of the km-time (1.14,5 -> 14.5) and 99.0 marks
+# a horse without a valid time (dist, kub, u, ...).
+TID_SENTINEL = 99.0
+KM_BASE_SECONDS = 60.0
+NO_PLACERING = 1_000
+
+LOAD_FIELDS = ("id", "datum", "bankod", "lopp", "nr", "placering", "tid", "distans", "pris")
+
+DERIVED_COLUMNS = (
+    ("tillagg", "tillagg", "integer"),
+    ("tillagg_tid", "tillaggtid", "double precision"),
+    ("ny_tid", "nytid", "double precision"),
+    ("lopp_tid", "lopptid", "double precision"),
+    ("diff_tid", "difftid", "double precision"),
+    ("diff_vinst", "diffvinst", "double precision"),
+    ("diff_medel", "diffmedel", "double precision"),
+    ("sortering", "sortering", "integer"),
+    ("sortering_plac", "sorteringplac", "integer"),
+    ("sortering_tid", "sorteringtid", "integer"),
+    ("sortering_pris", "sorteringpris", "integer"),
+    ("sortering_klass", "sorteringklass", "integer"),
+    ("lopp_klass", "loppklass", "double precision"),
+)
+
+WRITE_BATCH_SIZE = 2_000
+
+# Consumers that read the derived columns; a recompute marks its races dirty
+# for them. horse_form and the driver rollups only use scraped columns.
+DOWNSTREAM = tuple(c for c in dirty.CONSUMERS if c not in ("derived", "form", "driver"))
+
+
+def load_arrays(rows: List[tuple]) -> Dict[str, np.ndarray]:
+    if not rows:
+        return {}
+    cols = list(zip(*rows))
+    return {
+        "id": np.asarray(cols[0], dtype=np.int64),
+        "datum": np.asarray(cols[1], dtype=np.int64),
+        "bankod": np.asarray(cols[2], dtype=object),
+        "lopp": np.asarray(cols[3], dtype=np.int64),
+        "nr": np.asarray(cols[4], dtype=np.int64),
+        "placering": np.asarray(cols[5], dtype=float),
+        "tid": np.asarray(cols[6], dtype=float),
+        "distans": np.asarray(cols[7], dtype=float),
+        "pris": np.asarray(cols[8], dtype=float),
+    }
+
+
+def _group_index(*keys: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    # Rows must already be sorted by the keys. Returns the group id of every row
+    # and the first row index of every group.
+    n = len(keys[0])
+    new = np.zeros(n, dtype=bool)
+    new[0] = True
+    for k in keys:
+        new[1:] |= k[1:] != k[:-1]
+    starts = np.flatnonzero(new)
+    return np.cumsum(new) - 1, starts
+
+
+def _rank(group: np.ndarray, starts: np.ndarray, key: np.ndarray, tiebreak: np.ndarray, dense_ties: bool) -> np.ndarray:
+    order = np.lexsort((tiebreak, key, group))
+    g_sorted = group[order]
+    pos = np.arange(len(order))
+    if dense_ties:
+        k_sorted = key[order]
+        new = np.ones(len(order), dtype=bool)
+        new[1:] = (g_sorted[1:] != g_sorted[:-1]) | (k_sorted[1:] != k_sorted[:-1])
+        pos = np.maximum.accumulate(np.where(new, pos, 0))
+    ranks = np.empty(len(order), dtype=np.int64)
+    ranks[order] = pos - starts[g_sorted] + 1
+    return ranks
+
+
+def _group_reduce(ufunc, values: np.ndarray, group: np.ndarray, n_groups: int, initial: float) -> np.ndarray:
+    out = np.full(n_groups, initial, dtype=float)
+    ufunc.at(out, group, values)
+    return out
+
+
+def compute_metrics(a: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    # Rows must be sorted by (datum, bankod, lopp); every metric is computed per race.
+    race, race_starts = _group_index(a["datum"], a["bankod"], a["lopp"])
+    n_races = len(race_starts)
+
+    tid = a["tid"]
+    distans = a["distans"]
+    placering = a["placering"]
+    valid = np.isfinite(tid) & (tid < TID_SENTINEL)
+
+    # Distance handicap: meters behind the shortest distance in the race, and the
+    # km-time credit for running them at the horse's own pace.
+    base_dist = _group_reduce(np.fmin, np.where(np.isfinite(distans), distans, np.inf), race, n_races, np.inf)
+    base_dist = np.where(np.isfinite(base_dist), base_dist, np.nan)[race]
+    tillagg = distans - base_dist
+    tillagg_tid = np.where(valid, (KM_BASE_SECONDS + tid) * (distans / base_dist - 1.0), np.nan)
+    ny_tid = np.where(valid, tid - np.nan_to_num(tillagg_tid), np.nan)
+    ny_tid = np.where(tid == TID_SENTINEL, TID_SENTINEL, ny_tid)
+
+    # Winner reference: the row placed 1 with a valid time, else the best valid time.
+    is_winner = valid & (placering == 1)
+    best_tid = _group_reduce(np.fmin, np.where(valid, tid, np.inf), race, n_races, np.inf)
+    best_ny = _group_reduce(np.fmin, np.where(valid, ny_tid, np.inf), race, n_races, np.inf)
+    win_tid = _group_reduce(np.fmin, np.where(is_winner, tid, np.inf), race, n_races, np.inf)
+    win_ny = _group_reduce(np.fmin, np.where(is_winner, ny_tid, np.inf), race, n_races, np.inf)
+    lopp_tid = np.where(np.isfinite(win_tid), win_tid, best_tid)
+    lopp_tid = np.where(np.isfinite(lopp_tid), lopp_tid, np.nan)[race]
+    vinst_ny = np.where(np.isfinite(win_ny), win_ny, best_ny)
+    vinst_ny = np.where(np.isfinite(vinst_ny), vinst_ny, np.nan)[race]
+
+    ny_valid = np.where(valid, ny_tid, 0.0)
+    sum_ny = np.bincount(race, weights=ny_valid, minlength=n_races)
+    cnt_ny = np.bincount(race, weights=valid.astype(float), minlength=n_races)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_ny = (sum_ny / cnt_ny)[race]
+
+    diff_tid = np.where(valid, tid - lopp_tid, np.nan)
+    diff_vinst = np.where(valid, ny_tid - vinst_ny, np.nan)
+    diff_medel = np.where(valid, ny_tid - mean_ny, np.nan)
+
+    plac_key = np.where(np.isfinite(placering) & (placering > 0), placering, NO_PLACERING)
+    tid_key = np.where(valid, ny_tid, np.inf)
+    nr = a["nr"]
+    sortering_plac = _rank(race, race_starts, plac_key, nr, dense_ties=True)
+    sortering_tid = _rank(race, race_starts, tid_key, plac_key * 1_000 + nr, dense_ties=True)
+    sortering = _rank(race, race_starts, plac_key * 1e6 + np.where(valid, ny_tid, 1e5), nr, dense_ties=False)
+
+    # Class is the prize on a log scale; prize rank is per raceday (datum, bankod),
+    # class rank is across every track racing that day.
+    pris = a["pris"]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        lopp_klass = np.where(pris > 0, np.round(np.log10(pris), 3), np.nan)
+    day, _ = _group_index(a["datum"], a["bankod"])
+    neg_pris = -np.where(np.isfinite(pris), pris, -1.0)
+    sortering_pris = _race_rank(day, race, neg_pris)
+    date, _ = _group_index(a["datum"])
+    neg_klass = -np.where(np.isfinite(lopp_klass), lopp_klass, -1.0)
+    sortering_klass = _race_rank(date, race, neg_klass)
+
+    return {
+        "tillagg": tillagg,
+        "tillagg_tid": np.round(tillagg_tid, 2),
+        "ny_tid": np.round(ny_tid, 2),
+        "lopp_tid": lopp_tid,
+        "diff_tid": np.round(diff_tid, 2),
+        "diff_vinst": np.round(diff_vinst, 2),
+        "diff_medel": np.round(diff_medel, 2),
+        "sortering": sortering,
+        "sortering_plac": sortering_plac,
+        "sortering_tid": sortering_tid,
+        "sortering_pris": sortering_pris,
+        "sortering_klass": sortering_klass,
+        "lopp_klass": lopp_klass,
+    }
+
+
+def _race_rank(outer: np.ndarray, race: np.ndarray, key: np.ndarray) -> np.ndarray:
+    # Rank races (not rows) inside an outer group, then broadcast back to rows.
+    first = np.ones(len(race), dtype=bool)
+    first[1:] = race[1:] != race[:-1]
+    idx = np.flatnonzero(first)
+    r_outer = outer[idx]
+    _, r_starts = _group_index(r_outer)
+    race_ranks = _rank(r_outer, r_starts, key[idx], np.arange(len(idx)), dense_ties=True)
+    return race_ranks[race]
+
+
+def _column_values(values: np.ndarray, sql_type: str) -> list:
+    if values.dtype.kind == "f":
+        out = values.tolist()
+        if sql_type == "integer":
+            return [None if v != v else int(v) for v in out]
+        return [None if v != v else v for v in out]
+    return [int(v) for v in values.tolist()]
+
+
+def write_metrics(ids: np.ndarray, metrics: Dict[str, np.ndarray]) -> int:
+    columns = [(db_col, sql_type, _column_values(metrics[field], sql_type)) for field, db_col, sql_type in DERIVED_COLUMNS]
+    id_list = ids.tolist()
+    set_sql = ", ".join(f"{db_col} = CAST(v.{db_col} AS {sql_type})" for db_col, sql_type, _ in columns)
+    col_sql = ", ".join(["id"] + [db_col for db_col, _, _ in columns])
+    row_sql = "(" + ", ".join(["%s"] * (len(columns) + 1)) + ")"
+
+    written = 0
+    with transaction.atomic(), connection.cursor() as cur:
+        for lo in range(0, len(id_list), WRITE_BATCH_SIZE):
+            hi = min(lo + WRITE_BATCH_SIZE, len(id_list))
+            params = []
+            for i in range(lo, hi):
+                params.append(id_list[i])
+                params.extend(values[i] for _, _, values in columns)
+            cur.execute(
+                f"UPDATE {HorseResult._meta.db_table} AS r SET {set_sql} "
+                f"FROM (VALUES {', '.join([row_sql] * (hi - lo))}) AS v({col_sql}) "
+                f"WHERE r.id = CAST(v.id AS bigint)",
+                params,
+            )
+            written += hi - lo
+    return written
+
+
+def _load_rows(qs) -> List[tuple]:
+    return list(
+        qs.order_by("datum", "bankod", "lopp", "nr")
+          .values_list(*LOAD_FIELDS)
+          .iterator(chunk_size=20_000)
+    )
+
+
+def recompute_datums(datums: Iterable[int]) -> int:
+    datums = sorted(set(datums))
+    if not datums:
+        return 0
+    rows = _load_rows(HorseResult.objects.filter(datum__in=datums))
+    if not rows:
+        return 0
+    arrays = load_arrays(rows)
+    metrics = compute_metrics(arrays)
+    with transaction.atomic():
+        written = write_metrics(arrays["id"], metrics)
+        keys = set(zip(arrays["datum"].tolist(), arrays["bankod"], arrays["lopp"].tolist()))
+        if DOWNSTREAM:
+            dirty.mark_races_dirty(keys, DOWNSTREAM)
+        cache.invalidate_races(keys)
+    return written
+
+
+def recompute_races(keys: Iterable[Tuple[int, str, int]]) -> int:
+    # Ranks like sorteringklass span every race of a date, so a dirty race
+    # recomputes its whole race date.
+    return recompute_datums(d for d, _, _ in keys)
+
+
+def recompute_range(datum_from: Optional[int] = None, datum_to: Optional[int] = None, chunk_days: int = 31) -> int:
+    qs = HorseResult.objects.all()
+    if datum_from is not None:
+        qs = qs.filter(datum__gte=datum_from)
+    if datum_to is not None:
+        qs = qs.filter(datum__lte=datum_to)
+    all_datums = list(qs.order_by("datum").values_list("datum", flat=True).distinct())
+
+    total = 0
+    for lo in range(0, len(all_datums), chunk_days):
+        chunk = all_datums[lo:lo + chunk_days]
+        n = recompute_datums(chunk)
+        total += n
+        logging.info("  derived %s..%s: %d rows", chunk[0], chunk[-1], n)
+    return total
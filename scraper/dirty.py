@@ -0,0 +1,69 @@
+import logging
+from contextlib import contextmanager
+from typing import Iterable, Iterator, List, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from scraper.models import DirtyRace
+
+RaceKey = Tuple[int, str, int]
+
+# Every consumer gets its own copy of a dirty race, so one refresh step draining
+# its queue never hides a change from another. "snapshot" (build_snapshot) only
+# exists when there is a snapshot to keep fresh; otherwise nobody would drain it.
+CONSUMERS = ("derived", "form", "driver") + (("snapshot",) if getattr(settings, "RESULTAT_SNAPSHOT_DIR", "") else ())
+
+
+def mark_races_dirty(keys: Iterable[RaceKey], consumers: Tuple[str, ...] = CONSUMERS) -> int:
+    unique_keys = sorted({(int(d), b, int(l)) for d, b, l in keys})
+    if not unique_keys:
+        return 0
+
+    now = timezone.now()
+    DirtyRace.objects.bulk_create(
+        [
+            DirtyRace(consumer=consumer, datum=d, bankod=b, lopp=l, marked_at=now)
+            for consumer in consumers
+            for d, b, l in unique_keys
+        ],
+        update_conflicts=True,
+        unique_fields=("consumer", "datum", "bankod", "lopp"),
+        update_fields=("marked_at",),
+    )
+    return len(unique_keys)
+
+
+@contextmanager
+def drain_dirty_races(consumer: str, limit: int = 500) -> Iterator[List[RaceKey]]:
+    # The claimed rows stay locked until the caller's work is done and are only
+    # deleted if it succeeds. A writer re-marking one of them waits for the lock
+    # and re-inserts it afterwards, so no change is lost.
+    with transaction.atomic():
+        claimed = list(
+            DirtyRace.objects.select_for_update(skip_locked=True)
+            .filter(consumer=consumer)
+            .order_by("marked_at")
+            .values_list("id", "datum", "bankod", "lopp")[:limit]
+        )
+        yield [(d, b, l) for _, d, b, l in claimed]
+        if claimed:
+            DirtyRace.objects.filter(id__in=[pk for pk, _, _, _ in claimed]).delete()
+
+
+def pending_count(consumer: str) -> int:
+    return DirtyRace.objects.filter(consumer=consumer).count()
+
+
+def drain_all(consumer: str, refresh, limit: int = 500) -> Tuple[int, int]:
+    races = 0
+    rows = 0
+    while True:
+        with drain_dirty_races(consumer, limit=limit) as keys:
+            if not keys:
+                break
+            rows += refresh(keys)
+            races += len(keys)
+            logging.info("  %s: refreshed %d dirty races", consumer, len(keys))
+    return races, rows
@@ -0,0 +1,127 @@
+import logging
+from typing import Dict, Iterable, List, Tuple
+
+from django.db import transaction
+from django.db.models import Count, Max, Min, Q, Sum
+from django.utils import timezone
+
+from scraper import cache
+from scraper.form import NOT_A_START
+from scraper.models import DriverHorseStats, DriverStats, HorseResult
+from scraper.normalize import name_key
+
+# driver_stats and driver_horse_stats: rollups of resultat per driver and per
+# driver+horse pairing. refresh_driver_stats drains the "driver" dirty queue
+# and re-aggregates only the drivers who drove in those races, each over their
+# whole history through resultat_kusk_datum_idx (which carries bankod, namn
+# and placering, so this is an index-only scan on Postgres). Pairings are
+# keyed on the horse's namn_key, like the startlist join; the spellings of a
+# name are folded together here rather than grouped on in SQL, which would
+# leave the index.
+
+CONSUMER = "driver"
+DRIVERS_PER_QUERY = 500
+WRITE_BATCH_SIZE = 2_000
+
+UPDATE_FIELDS = (
+    "starts", "wins", "top3", "placing_sum", "first_datum", "last_datum", "per_track", "updated_at",
+)
+
+
+def _starts(kusks: List[str]):
+    return (
+        HorseResult.objects.filter(kusk__in=kusks, placering__isnull=False)
+        .exclude(placering__in=NOT_A_START)
+    )
+
+
+def _aggregate(qs, *group):
+    return qs.values(*group).order_by().annotate(
+        n=Count("id"),
+        wins=Count("id", filter=Q(placering=1)),
+        top3=Count("id", filter=Q(placering__lte=3)),
+        psum=Sum("placering"),
+        first=Min("datum"),
+        last=Max("datum"),
+    )
+
+
+def refresh_drivers(kusks: Iterable[str]) -> int:
+    kusks = sorted({k for k in kusks if k})
+    now = timezone.now()
+    written = 0
+    for lo in range(0, len(kusks), DRIVERS_PER_QUERY):
+        chunk = kusks[lo:lo + DRIVERS_PER_QUERY]
+        drivers: Dict[str, DriverStats] = {}
+        for row in _aggregate(_starts(chunk), "kusk", "bankod"):
+            d = drivers.get(row["kusk"])
+            if d is None:
+                d = drivers[row["kusk"]] = DriverStats(
+                    kusk=row["kusk"], starts=0, wins=0, top3=0, placing_sum=0, per_track={}, updated_at=now,
+                )
+            d.starts += row["n"]
+            d.wins += row["wins"]
+            d.top3 += row["top3"]
+            d.placing_sum += row["psum"] or 0
+            d.first_datum = min(filter(None, (d.first_datum, row["first"])))
+            d.last_datum = max(filter(None, (d.last_datum, row["last"])))
+            d.per_track[row["bankod"]] = [row["n"], row["wins"], row["top3"]]
+
+        pairs: Dict[Tuple[str, str], DriverHorseStats] = {}
+        for row in _aggregate(_starts(chunk), "kusk", "namn"):
+            key = (row["kusk"], name_key(row["namn"]))
+            p = pairs.get(key)
+            if p is None:
+                p = pairs[key] = DriverHorseStats(
+                    kusk=row["kusk"], namn_key=key[1], namn=row["namn"], starts=0, wins=0, top3=0, placing_sum=0,
+                )
+            elif row["last"] > p.last_datum:
+                p.namn = row["namn"]   # the spelling of the latest start
+            p.starts += row["n"]
+            p.wins += row["wins"]
+            p.top3 += row["top3"]
+            p.placing_sum += row["psum"] or 0
+            p.last_datum = max(filter(None, (p.last_datum, row["last"])))
+
+        with transaction.atomic():
+            DriverStats.objects.bulk_create(
+                list(drivers.values()),
+                batch_size=WRITE_BATCH_SIZE,
+                update_conflicts=True,
+                unique_fields=("kusk",),
+                update_fields=UPDATE_FIELDS,
+            )
+            gone = set(chunk) - set(drivers)
+            if gone:
+                DriverStats.objects.filter(kusk__in=gone).delete()
+            # A driver's pairings are few enough to replace wholesale, which
+            # also drops pairings that no longer exist.
+            DriverHorseStats.objects.filter(kusk__in=chunk).delete()
+            DriverHorseStats.objects.bulk_create(list(pairs.values()), batch_size=WRITE_BATCH_SIZE)
+            cache.invalidate(cache.driver_tag(k) for k in chunk)
+        written += len(drivers)
+    return written
+
+
+def refresh_races(keys: Iterable[Tuple[int, str, int]]) -> int:
+    # drain_all callback: every driver in the changed races.
+    keys = set(keys)
+    rows = HorseResult.objects.filter(datum__in={d for d, _, _ in keys}).values_list("datum", "bankod", "lopp", "kusk")
+    return refresh_drivers(kusk for d, b, l, kusk in rows if (d, b, l) in keys)
+
+
+def rebuild() -> int:
+    started = timezone.now()
+    kusks = list(
+        HorseResult.objects.exclude(kusk="").order_by("kusk").values_list("kusk", flat=True).distinct()
+    )
+    written = 0
+    for lo in range(0, len(kusks), DRIVERS_PER_QUERY * 10):
+        written += refresh_drivers(kusks[lo:lo + DRIVERS_PER_QUERY * 10])
+        logging.info("  driver stats: %d/%d drivers", min(lo + DRIVERS_PER_QUERY * 10, len(kusks)), len(kusks))
+    stale = DriverStats.objects.filter(updated_at__lt=started).values_list("kusk", flat=True)
+    with transaction.atomic():
+        DriverHorseStats.objects.filter(kusk__in=list(stale)).delete()
+        DriverStats.objects.filter(updated_at__lt=started).delete()
+    cache.invalidate_all()
+    return written
@@ -0,0 +1,102 @@
+import csv, json, zlib
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from django.db.models import Q
+
+from scraper.models import HorseResult, Proposition, StartList
+
+# Streaming exports for export_table and /api/export/. Rows come off a
+# server-side cursor (QuerySet.iterator) in CHUNK_SIZE batches and go out as
+# text chunks of about the same size, so memory stays flat however many rows
+# the range holds. Rows are ordered by (date, id), which is also the resume
+# point: "--after 20240301,123456" continues right after that row.
+
+# table -> (model, date column)
+TABLES = {
+    "resultat": (HorseResult, "datum"),
+    "startlista": (StartList, "startdatum"),
+    "proposition": (Proposition, "startdatum"),
+}
+FORMATS = ("csv", "ndjson")
+CHUNK_SIZE = 2_000
+
+
+class _Line:
+    # csv.writer target that hands back the formatted line instead of storing it.
+    def write(self, value: str) -> str:
+        return value
+
+
+def parse_after(value: str) -> Tuple[int, int]:
+    try:
+        datum, pk = value.split(",")
+        return int(datum), int(pk)
+    except ValueError as exc:
+        raise ValueError(f"Invalid resume point {value!r}. Use <date as YYYYMMDD>,<id>.") from exc
+
+
+def columns(table: str) -> List[str]:
+    return [f.column for f in TABLES[table][0]._meta.concrete_fields]
+
+
+def rows(table: str, datum_from: Optional[int] = None, datum_to: Optional[int] = None,
+         bankod: Optional[str] = None, after: Optional[Tuple[int, int]] = None,
+         chunk_size: int = CHUNK_SIZE) -> Iterator[tuple]:
+    model, date_col = TABLES[table]
+    qs = model.objects.all()
+    if datum_from is not None:
+        qs = qs.filter(**{f"{date_col}__gte": datum_from})
+    if datum_to is not None:
+        qs = qs.filter(**{f"{date_col}__lte": datum_to})
+    if bankod:
+        qs = qs.filter(bankod=bankod)
+    if after is not None:
+        qs = qs.filter(Q(**{f"{date_col}__gt": after[0]}) | Q(**{date_col: after[0], "id__gt": after[1]}))
+    attnames = [f.attname for f in model._meta.concrete_fields]
+    return qs.order_by(date_col, "id").values_list(*attnames).iterator(chunk_size=chunk_size)
+
+
+def resume_point(table: str, row: tuple) -> str:
+    # The --after / ?after= value that continues after this row.
+    names = columns(table)
+    return f"{row[names.index(TABLES[table][1])]},{row[names.index('id')]}"
+
+
+def _text(value):
+    return value if value is None or isinstance(value, (int, float, str, bool)) else str(value)
+
+
+def lines(table: str, fmt: str, data: Iterable[tuple], header: bool = True,
+          chunk_size: int = CHUNK_SIZE) -> Iterator[str]:
+    # Formatted text in chunks of chunk_size rows; yielding per row costs more
+    # in generator and socket overhead than the formatting itself.
+    names = columns(table)
+    writer = csv.writer(_Line())
+    buf = []
+    if fmt == "csv" and header:
+        buf.append(writer.writerow(names))
+    for row in data:
+        if fmt == "csv":
+            buf.append(writer.writerow(row))
+        else:
+            buf.append(json.dumps(dict(zip(names, map(_text, row))), ensure_ascii=False) + "\n")
+        if len(buf) >= chunk_size:
+            yield "".join(buf)
+            buf = []
+    if buf:
+        yield "".join(buf)
+
+
+def encoded(chunks: Iterable[str], gzip: bool = False) -> Iterator[bytes]:
+    # Each call makes a complete gzip member, so a resumed export appended to
+    # the same .gz file still decompresses as one stream.
+    if not gzip:
+        for chunk in chunks:
+            yield chunk.encode("utf-8")
+        return
+    z = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        out = z.compress(chunk.encode("utf-8"))
+        if out:
+            yield out
+    yield z.flush()
@@ -0,0 +1,134 @@
+import logging
+from itertools import groupby
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.db import transaction
+from django.utils import timezone
+
+from scraper import cache
+from scraper.derived import TID_SENTINEL
+from scraper.models import HorseForm, HorseResult
+from scraper.normalize import name_key
+
+# horse_form: per-horse form kept next to resultat so a startlist's form is one
+# indexed read. Horses are keyed on namn_key, like the startlist join, so the
+# spellings of one horse share a row. refresh_form drains the "form" dirty
+# queue and recomputes only the horses that ran in those races, each from its
+# full history (an index range on resultat_namn_key_datum_idx); --full streams
+# the whole table once. A horse with no real start yet has no row.
+
+CONSUMER = "form"
+LAST_STARTS = 5
+NOT_A_START = (0, 99)   # upcoming, struck
+WRITE_BATCH_SIZE = 2_000
+NAMES_PER_QUERY = 1_000
+
+LOAD_FIELDS = ("namn", "datum", "placering", "tid", "distans", "startmetod", "galopp", "pris")
+UPDATE_FIELDS = (
+    "starts", "wins", "top3", "gallops", "win_earnings", "first_datum", "last_datum",
+    "last_placings", "best_tid", "updated_at",
+)
+
+
+def compute(namn_key: str, rows: List[tuple], now) -> Optional[HorseForm]:
+    # rows: LOAD_FIELDS of one horse, oldest first. None without a real start.
+    starts = [r for r in rows if r[2] is not None and r[2] not in NOT_A_START]
+    if not starts:
+        return None
+    best: Dict[str, float] = {}
+    for _, _, _, tid, distans, startmetod, _, _ in starts:
+        if tid is None or tid >= TID_SENTINEL or distans is None:
+            continue
+        key = f"{distans}{'a' if startmetod == 'a' else 'v'}"
+        if key not in best or tid < best[key]:
+            best[key] = tid
+    return HorseForm(
+        namn_key=namn_key,
+        namn=starts[-1][0],
+        starts=len(starts),
+        wins=sum(r[2] == 1 for r in starts),
+        top3=sum(1 <= r[2] <= 3 for r in starts),
+        gallops=sum(r[6] == "g" for r in starts),
+        win_earnings=sum(r[7] or 0 for r in starts if r[2] == 1),
+        first_datum=starts[0][1],
+        last_datum=starts[-1][1],
+        last_placings=[r[2] for r in reversed(starts[-LAST_STARTS:])],
+        best_tid=best,
+        updated_at=now,
+    )
+
+
+def _save(forms: List[HorseForm]) -> None:
+    HorseForm.objects.bulk_create(
+        forms,
+        batch_size=WRITE_BATCH_SIZE,
+        update_conflicts=True,
+        unique_fields=("namn_key",),
+        update_fields=UPDATE_FIELDS,
+    )
+
+
+def _forms(rows, now) -> Iterable[HorseForm]:
+    # rows: ("namn_key", *LOAD_FIELDS), ordered by namn_key, datum, id.
+    for key, group in groupby(rows, key=lambda r: r[0]):
+        form = compute(key, [r[1:] for r in group], now)
+        if form is not None:
+            yield form
+
+
+def refresh_horses(names: Iterable[str]) -> int:
+    keys = sorted({name_key(n) for n in names} - {""})
+    now = timezone.now()
+    written = 0
+    for lo in range(0, len(keys), NAMES_PER_QUERY):
+        chunk = keys[lo:lo + NAMES_PER_QUERY]
+        rows = (
+            HorseResult.objects.filter(namn_key__in=chunk)
+            .order_by("namn_key", "datum", "id")
+            .values_list("namn_key", *LOAD_FIELDS)
+        )
+        forms = list(_forms(rows, now))
+        with transaction.atomic():
+            _save(forms)
+            # A horse with no real start left (renamed, deleted race, struck).
+            gone = set(chunk) - {f.namn_key for f in forms}
+            if gone:
+                HorseForm.objects.filter(namn_key__in=gone).delete()
+            cache.invalidate(cache.form_tag(k) for k in chunk)
+        written += len(forms)
+    return written
+
+
+def refresh_races(keys: Iterable[Tuple[int, str, int]]) -> int:
+    # drain_all callback: every horse in the changed races. name_key() of a
+    # key is the key itself.
+    keys = set(keys)
+    rows = HorseResult.objects.filter(datum__in={d for d, _, _ in keys}).values_list("datum", "bankod", "lopp", "namn_key")
+    return refresh_horses(k for d, b, l, k in rows if (d, b, l) in keys)
+
+
+def rebuild(chunk_size: int = 20_000) -> int:
+    # One ordered pass over resultat; forms that were not rewritten belong to
+    # horses that are gone and are deleted at the end.
+    started = timezone.now()
+    rows = (
+        HorseResult.objects.exclude(namn_key="").order_by("namn_key", "datum", "id")
+        .values_list("namn_key", *LOAD_FIELDS)
+        .iterator(chunk_size=chunk_size)
+    )
+    batch: List[HorseForm] = []
+    written = 0
+    for form in _forms(rows, started):
+        batch.append(form)
+        if len(batch) >= WRITE_BATCH_SIZE:
+            _save(batch)
+            written += len(batch)
+            batch = []
+            if written % 100_000 == 0:
+                logging.info("  form: %d horses", written)
+    if batch:
+        _save(batch)
+        written += len(batch)
+    HorseForm.objects.filter(updated_at__lt=started).delete()
+    cache.invalidate_all()
+    return written
@@ -0,0 +1,203 @@
+import json, logging, os, threading, time
+from contextlib import contextmanager
+from datetime import datetime, timezone as dt_timezone
+from typing import Dict, Tuple
+
+# In-process metrics for the scrapers: counters and fixed-bucket histograms,
+# labelled like Prometheus series. Commands call export() at the end of a run,
+# which logs the slowest stages and, with SCRAPER_METRICS_DIR set, writes a
+# Prometheus textfile (<dir>/<job>.prom) and appends one JSON line per run to
+# <dir>/metrics.jsonl.
+
+SECONDS_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+COUNT_BUCKETS = (0, 1, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+PREFIX = "scraper_"
+
+LabelKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+def _key(name: str, labels: dict) -> LabelKey:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.sum += value
+        self.count += 1
+        self.max = max(self.max, value)
+
+    def cumulative(self):
+        total = 0
+        for bound, n in zip(self.buckets + (float("inf"),), self.counts):
+            total += n
+            yield bound, total
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters: Dict[LabelKey, float] = {}
+        self.histograms: Dict[LabelKey, Histogram] = {}
+        self.started = time.time()
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+            self.started = time.time()
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, buckets=SECONDS_BUCKETS, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            hist = self.histograms.get(key)
+            if hist is None:
+                hist = self.histograms[key] = Histogram(buckets)
+            hist.observe(value)
+
+    def totals(self):
+        # Counter values and histogram sums; the run ledger diffs two of these.
+        with self._lock:
+            return dict(self.counters), {key: hist.sum for key, hist in self.histograms.items()}
+
+    def to_prometheus(self, job: str) -> str:
+        def fmt(labels, extra=()):
+            pairs = (("job", job),) + labels + tuple(extra)
+            return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+        lines = []
+        with self._lock:
+            for name in sorted({name for name, _ in self.counters}):
+                lines.append(f"# TYPE {PREFIX}{name} counter")
+                for (n, labels), value in sorted(self.counters.items()):
+                    if n == name:
+                        lines.append(f"{PREFIX}{name}{fmt(labels)} {value:g}")
+            for name in sorted({name for name, _ in self.histograms}):
+                lines.append(f"# TYPE {PREFIX}{name} histogram")
+                for (n, labels), hist in sorted(self.histograms.items(), key=lambda item: item[0]):
+                    if n != name:
+                        continue
+                    for bound, total in hist.cumulative():
+                        le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                        lines.append(f"{PREFIX}{name}_bucket{fmt(labels, [('le', le)])} {total}")
+                    lines.append(f"{PREFIX}{name}_sum{fmt(labels)} {hist.sum:.6f}")
+                    lines.append(f"{PREFIX}{name}_count{fmt(labels)} {hist.count}")
+        return "\n".join(lines) + "\n"
+
+    def to_json(self, job: str) -> dict:
+        with self._lock:
+            return {
+                "time": datetime.now(dt_timezone.utc).isoformat(timespec="seconds"),
+                "job": job,
+                "wall_seconds": round(time.time() - self.started, 3),
+                "counters": [
+                    {"name": name, "labels": dict(labels), "value": value}
+                    for (name, labels), value in sorted(self.counters.items())
+                ],
+                "histograms": [
+                    {
+                        "name": name, "labels": dict(labels), "count": hist.count,
+                        "sum": round(hist.sum, 6), "max": round(hist.max, 6),
+                        "buckets": {("+Inf" if b == float("inf") else f"{b:g}"): n for b, n in hist.cumulative()},
+                    }
+                    for (name, labels), hist in sorted(self.histograms.items(), key=lambda item: item[0])
+                ],
+            }
+
+
+metrics = Registry()
+
+
+def lap(stage: str, t0: float, **labels) -> float:
+    # For straight-line code: t = lap("goto", t, kind="results") records the time
+    # since t and returns the new starting point.
+    now = time.perf_counter()
+    metrics.observe("stage_seconds", now - t0, stage=stage, **labels)
+    return now
+
+
+@contextmanager
+def timed(stage: str, **labels):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        lap(stage, t0, **labels)
+
+
+@contextmanager
+def db_round_trips(**labels):
+    # Counts the queries this thread's connection sends while the block runs.
+    from django.db import connection
+
+    n = 0
+
+    def count(execute, sql, params, many, context):
+        nonlocal n
+        n += 1
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(count):
+        try:
+            yield
+        finally:
+            metrics.observe("db_round_trips", n, buckets=COUNT_BUCKETS, **labels)
+            metrics.inc("db_queries_total", n, **labels)
+
+
+def timed_db_call(kind: str, fn, *args):
+    # Meant for asyncio.to_thread(timed_db_call, kind, writer, rows): the wrapper
+    # has to be installed in the thread that owns the connection.
+    with timed("db_write", kind=kind), db_round_trips(kind=kind):
+        return fn(*args)
+
+
+def _slowest_stages(limit: int = 5):
+    totals = []
+    with metrics._lock:
+        for (name, labels), hist in metrics.histograms.items():
+            if name == "stage_seconds":
+                totals.append((hist.sum, hist.count, dict(labels)))
+    return sorted(totals, key=lambda item: item[0], reverse=True)[:limit]
+
+
+def export(job: str) -> None:
+    from django.conf import settings
+
+    for total, count, labels in _slowest_stages():
+        logging.info(
+            "Stage %-14s %-12s %8.1fs total over %5d calls (%.2fs avg)",
+            labels.get("stage", ""), labels.get("kind", ""), total, count, total / count if count else 0,
+        )
+
+    out_dir = getattr(settings, "SCRAPER_METRICS_DIR", "")
+    if not out_dir:
+        return
+    os.makedirs(out_dir, exist_ok=True)
+    # Written to a temp file and renamed so node_exporter never reads half a file.
+    path = os.path.join(out_dir, f"{job}.prom")
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        fh.write(metrics.to_prometheus(job))
+    os.replace(tmp, path)
+    with open(os.path.join(out_dir, "metrics.jsonl"), "a", encoding="utf-8") as fh:
+        fh.write(json.dumps(metrics.to_json(job), ensure_ascii=False) + "\n")
+    logging.info("Metrics written to %s", path)
@@ -0,0 +1,168 @@
+import asyncio, logging, os, random, secrets, socket, time
+from datetime import timedelta
+from typing import Iterable, List, Optional
+
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from scraper.crawl import runner_for
+from scraper.models import ScrapeJob
+
+
+def worker_name() -> str:
+    # hostname:pid repeats across containers (every one is pid 1 somewhere),
+    # and the lease checks go by worker name.
+    return f"{socket.gethostname()}:{os.getpid()}:{secrets.token_hex(3)}"
+
+
+def enqueue(kind: str, ts_ids: Iterable[int], reset: bool = False) -> int:
+    ts_ids = list(ts_ids)
+    before = ScrapeJob.objects.filter(kind=kind, ts_id__in=ts_ids).count()
+    ScrapeJob.objects.bulk_create(
+        [ScrapeJob(kind=kind, ts_id=ts_id) for ts_id in ts_ids],
+        ignore_conflicts=True,
+        batch_size=1_000,
+    )
+    if reset:
+        ScrapeJob.objects.filter(kind=kind, ts_id__in=ts_ids).exclude(state=ScrapeJob.RUNNING).update(
+            state=ScrapeJob.PENDING, attempts=0, lease_expires_at=None, last_error="", worker="",
+            updated_at=timezone.now(),
+        )
+    return len(ts_ids) - before
+
+
+def _claimable(kinds, now, max_attempts: int):
+    ready = Q(state=ScrapeJob.PENDING) & (Q(lease_expires_at__isnull=True) | Q(lease_expires_at__lte=now))
+    expired = Q(state=ScrapeJob.RUNNING, lease_expires_at__lt=now)
+    return ScrapeJob.objects.filter(kind__in=kinds, attempts__lt=max_attempts).filter(ready | expired)
+
+
+def outstanding(kinds, max_attempts: int) -> bool:
+    # Jobs that may still need a worker: pending ones, including those waiting
+    # out a retry backoff, and running ones, whose worker may fail them back to
+    # pending or die and leave the lease to expire.
+    pending = Q(state=ScrapeJob.PENDING, attempts__lt=max_attempts)
+    return ScrapeJob.objects.filter(kind__in=kinds).filter(pending | Q(state=ScrapeJob.RUNNING)).exists()
+
+
+def claim(kinds, worker: str, lease_seconds: int, max_attempts: int, limit: int = 1) -> List[ScrapeJob]:
+    # FOR UPDATE SKIP LOCKED: concurrent workers each lock a different set of rows
+    # and never wait on each other. Expired leases of dead workers are claimable.
+    now = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            _claimable(kinds, now, max_attempts)
+            .select_for_update(skip_locked=True)
+            .order_by("id")
+            .values_list("id", flat=True)[:limit]
+        )
+        if not ids:
+            return []
+        ScrapeJob.objects.filter(id__in=ids).update(
+            state=ScrapeJob.RUNNING,
+            worker=worker,
+            attempts=F("attempts") + 1,
+            lease_expires_at=now + timedelta(seconds=lease_seconds),
+            updated_at=now,
+        )
+    return list(ScrapeJob.objects.filter(id__in=ids).order_by("id"))
+
+
+def renew(job_ids: Iterable[int], worker: str, lease_seconds: int) -> int:
+    now = timezone.now()
+    return ScrapeJob.objects.filter(id__in=list(job_ids), worker=worker, state=ScrapeJob.RUNNING).update(
+        lease_expires_at=now + timedelta(seconds=lease_seconds),
+        updated_at=now,
+    )
+
+
+def complete(job: ScrapeJob, worker: str, rows: int) -> bool:
+    # Only the current lease holder may finish a job; a worker that lost its lease
+    # to another one just drops the result.
+    return bool(ScrapeJob.objects.filter(id=job.id, worker=worker, state=ScrapeJob.RUNNING).update(
+        state=ScrapeJob.DONE, rows=rows, lease_expires_at=None, last_error="", updated_at=timezone.now(),
+    ))
+
+
+def fail(job: ScrapeJob, worker: str, error: str, max_attempts: int, base_delay: float = 30.0) -> None:
+    now = timezone.now()
+    if job.attempts >= max_attempts:
+        state, retry_at = ScrapeJob.FAILED, None
+    else:
+        delay = base_delay * (2 ** (job.attempts - 1))
+        state, retry_at = ScrapeJob.PENDING, now + timedelta(seconds=random.uniform(0.5, 1.0) * delay)
+    ScrapeJob.objects.filter(id=job.id, worker=worker, state=ScrapeJob.RUNNING).update(
+        state=state, lease_expires_at=retry_at, last_error=error[:2_000], updated_at=now,
+    )
+
+
+def fail_exhausted(max_attempts: int) -> int:
+    # Jobs whose last attempt died with its worker would otherwise stay "running".
+    now = timezone.now()
+    return ScrapeJob.objects.filter(
+        state=ScrapeJob.RUNNING, lease_expires_at__lt=now, attempts__gte=max_attempts,
+    ).update(state=ScrapeJob.FAILED, last_error="lease expired on last attempt", updated_at=now)
+
+
+async def run_job(job: ScrapeJob, browser) -> Optional[int]:
+    # The run_* loops log and swallow per-ID errors, so "on_done was never called"
+    # is how a failed page shows up here.
+    done = {}
+    await runner_for(job.kind)([job.ts_id], browser=browser, on_done=lambda ts_id, rows: done.update(rows=rows))
+    return done.get("rows")
+
+
+async def work(browser, kinds, worker: str, concurrency: int, lease_seconds: int, max_attempts: int,
+               poll_seconds: float, exit_when_empty: bool) -> int:
+    finished = 0
+    running = set()
+    next_sweep = 0.0
+
+    async def heartbeat():
+        while True:
+            await asyncio.sleep(max(1.0, lease_seconds / 3))
+            if running:
+                await asyncio.to_thread(renew, set(running), worker, lease_seconds)
+
+    async def slot(n: int):
+        nonlocal finished, next_sweep
+        while True:
+            # Last attempts whose worker died expire while we run, not only
+            # before we start; sweep them about once per poll interval.
+            if time.monotonic() >= next_sweep:
+                next_sweep = time.monotonic() + poll_seconds
+                failed = await asyncio.to_thread(fail_exhausted, max_attempts)
+                if failed:
+                    logging.info("Marked %d jobs with expired last attempts as failed", failed)
+
+            jobs = await asyncio.to_thread(claim, kinds, worker, lease_seconds, max_attempts, 1)
+            if not jobs:
+                if exit_when_empty and not await asyncio.to_thread(outstanding, kinds, max_attempts):
+                    return
+                await asyncio.sleep(poll_seconds)
+                continue
+
+            job = jobs[0]
+            running.add(job.id)
+            logging.info("[slot %d] %s ts%d (attempt %d)", n, job.kind, job.ts_id, job.attempts)
+            try:
+                rows = await run_job(job, browser)
+            except Exception as exc:
+                rows, error = None, str(exc)
+            else:
+                error = "page failed"
+            finally:
+                running.discard(job.id)
+
+            if rows is None:
+                await asyncio.to_thread(fail, job, worker, error, max_attempts)
+            elif await asyncio.to_thread(complete, job, worker, rows):
+                finished += 1
+
+    beat = asyncio.create_task(heartbeat())
+    try:
+        await asyncio.gather(*(slot(n) for n in range(concurrency)))
+    finally:
+        beat.cancel()
+    return finished
@@ -0,0 +1,101 @@
+import logging
+from contextlib import contextmanager
+from datetime import date, datetime
+from typing import Optional
+
+from django.db import DatabaseError
+from django.utils import timezone
+
+from scraper import instrumentation
+from scraper.models import ScrapeRun
+
+# Every scrape command records one ScrapeRun: what it was asked to do, how long
+# it took and what the instrumentation counted while it ran. scrape_report
+# compares the latest run of a command with its recent history.
+
+# Options every Django command has; they say nothing about the run.
+_DJANGO_OPTIONS = {"verbosity", "settings", "pythonpath", "traceback", "no_color", "force_color", "skip_checks"}
+
+
+def _jsonable(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(v) for v in value]
+    return str(value)
+
+
+def clean_arguments(opts: dict) -> dict:
+    return {k: _jsonable(v) for k, v in sorted(opts.items()) if k not in _DJANGO_OPTIONS}
+
+
+def _diff(before: dict, after: dict) -> dict:
+    return {key: value - before.get(key, 0) for key, value in after.items() if value != before.get(key, 0)}
+
+
+def _sum_counter(counters: dict, name: str, **match) -> float:
+    total = 0
+    for (n, labels), value in counters.items():
+        if n == name and all(dict(labels).get(k) == v for k, v in match.items()):
+            total += value
+    return total
+
+
+def _fill(run: ScrapeRun, counters: dict, hist_sums: dict) -> None:
+    # Commands whose pages are scraped in other processes (backfill) set the page
+    # counts themselves; they are only replaced when this process counted any.
+    if _sum_counter(counters, "pages_total"):
+        run.pages = int(_sum_counter(counters, "pages_total"))
+        run.empty_pages = int(_sum_counter(counters, "pages_total", outcome="empty"))
+        run.failed_pages = int(_sum_counter(counters, "pages_total", outcome="failed"))
+    run.retries = int(_sum_counter(counters, "retries_total"))
+    run.rows_created = int(_sum_counter(counters, "rows_written_total", op="created")) or run.rows_created
+    run.rows_updated = int(_sum_counter(counters, "rows_written_total", op="updated")) or run.rows_updated
+
+    stages = {}
+    for (name, labels), seconds in hist_sums.items():
+        if name != "stage_seconds":
+            continue
+        labels = dict(labels)
+        key = f"{labels.get('kind', '')}.{labels.get('stage', '')}"
+        stages[key] = round(stages.get(key, 0) + seconds, 3)
+    run.stage_seconds = dict(sorted(stages.items()))
+
+
+def _save(run: ScrapeRun) -> None:
+    # A ledger problem must never fail the scrape itself.
+    try:
+        run.save()
+    except DatabaseError:
+        logging.exception("Could not write the scrape_run record for %s", run.command)
+
+
+@contextmanager
+def recorded_run(command: str, opts: dict, start_id: Optional[int] = None, end_id: Optional[int] = None,
+                 job: Optional[str] = None):
+    # Yields the ScrapeRun so the command can fill in start_id/end_id once it has
+    # resolved its range. Only the metrics recorded inside the block count, so a
+    # command called from another one (refresh_analytics from scrape_daily) gets
+    # its own numbers.
+    run = ScrapeRun(
+        command=command, arguments=clean_arguments(opts), start_id=start_id, end_id=end_id,
+        started_at=timezone.now(),
+    )
+    _save(run)
+    counters_before, sums_before = instrumentation.metrics.totals()
+    try:
+        yield run
+    except BaseException as exc:
+        run.status = ScrapeRun.FAILED
+        run.error = f"{type(exc).__name__}: {exc}"[:2_000]
+        raise
+    else:
+        run.status = ScrapeRun.OK
+    finally:
+        counters_after, sums_after = instrumentation.metrics.totals()
+        _fill(run, _diff(counters_before, counters_after), _diff(sums_before, sums_after))
+        run.finished_at = timezone.now()
+        _save(run)
+        instrumentation.export(job or command)
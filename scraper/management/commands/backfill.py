@@ -0,0 +1,176 @@
+import asyncio, logging, multiprocessing, os, time
+from datetime import date, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from scraper import backfill
+from scraper.crawl import KINDS, open_browser, open_page
+from scraper.ledger import recorded_run
+from scraper.models import BackfillCheckpoint
+from scraper.race_calendar import find_first_ts_ids
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+
+CALENDAR_LINK_KIND = {"results": "results", "startlist": "startlist", "propositions": "startlist"}
+
+
+def _parse_ts_id(value: str) -> int:
+    return int(str(value).replace("_", ""))
+
+
+def _parse_iso_date(value: str) -> date:
+    try:
+        return date.fromisoformat(value)
+    except ValueError as exc:
+        raise ValueError(f"Invalid date {value!r}. Use YYYY-MM-DD.") from exc
+
+
+def _format_ts_id(ts_id: int) -> str:
+    s = str(ts_id)
+    return f"{s[:-3]}_{s[-3:]}" if len(s) > 3 else s
+
+
+async def _resolve_date_range(link_kind: str, start_date: date, end_date: date):
+    async with open_browser() as browser, open_page(browser) as page:
+        first = await find_first_ts_ids(page, {link_kind: start_date})
+        after_end = await find_first_ts_ids(page, {link_kind: end_date + timedelta(days=1)})
+        last_day = after_end if after_end[link_kind] is not None else await find_first_ts_ids(page, {link_kind: end_date})
+    return first[link_kind], after_end[link_kind], last_day[link_kind]
+
+
+class Command(BaseCommand):
+    help = "Backfill a ts-ID or date range with several worker processes, checkpointing every finished ID."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--kind",
+            choices=KINDS,
+            required=True,
+            help="Which pages to scrape.",
+        )
+        parser.add_argument(
+            "--start-id",
+            type=_parse_ts_id,
+            help="First raceday ts-ID, for example 616_290.",
+        )
+        parser.add_argument(
+            "--end-id",
+            type=_parse_ts_id,
+            help="Last raceday ts-ID, for example 619_310.",
+        )
+        parser.add_argument(
+            "--start-date",
+            type=_parse_iso_date,
+            help="Resolve the first ts-ID from this calendar date instead of --start-id. Use YYYY-MM-DD.",
+        )
+        parser.add_argument(
+            "--end-date",
+            type=_parse_iso_date,
+            help="Resolve the last ts-ID from this calendar date instead of --end-id. Use YYYY-MM-DD.",
+        )
+        parser.add_argument(
+            "--ids-after-end",
+            type=int,
+            default=25,
+            help="With --end-date: how many IDs after the end date's first ts-ID to include when the next day has no link.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="How many worker processes (one browser each) to start.",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=1,
+            help="How many pages each worker scrapes at the same time.",
+        )
+        parser.add_argument(
+            "--restart",
+            action="store_true",
+            help="Forget the checkpoints in the range and scrape every ID again.",
+        )
+
+    def _resolve_id_range(self, opts):
+        start_id = opts.get("start_id")
+        end_id = opts.get("end_id")
+        start_date = opts.get("start_date")
+        end_date = opts.get("end_date")
+
+        if start_date or end_date:
+            if start_id is not None or end_id is not None:
+                raise CommandError("Use either --start-id/--end-id or --start-date/--end-date.")
+            if not (start_date and end_date):
+                raise CommandError("--start-date and --end-date must be given together.")
+            if end_date < start_date:
+                raise CommandError("--end-date must be on or after --start-date.")
+
+            link_kind = CALENDAR_LINK_KIND[opts["kind"]]
+            first_id, next_day_id, last_day_id = asyncio.run(_resolve_date_range(link_kind, start_date, end_date))
+            if first_id is None:
+                raise CommandError(f"Could not find a {link_kind} link for {start_date.isoformat()} in the race calendar.")
+            if next_day_id is not None:
+                return first_id, next_day_id - 1
+            if last_day_id is None:
+                raise CommandError(f"Could not find a {link_kind} link for {end_date.isoformat()} in the race calendar.")
+            return first_id, last_day_id + opts["ids_after_end"]
+
+        if start_id is None or end_id is None:
+            raise CommandError("Give --start-id and --end-id, or --start-date and --end-date.")
+        return start_id, end_id
+
+    def handle(self, *args, **opts):
+        if opts["workers"] < 1:
+            raise CommandError("--workers must be 1 or greater.")
+        if opts["concurrency"] < 1:
+            raise CommandError("--concurrency must be 1 or greater.")
+        if opts["ids_after_end"] < 0:
+            raise CommandError("--ids-after-end must be 0 or greater.")
+
+        kind = opts["kind"]
+        start_id, end_id = self._resolve_id_range(opts)
+        if end_id < start_id:
+            raise CommandError("END_ID must be greater than or equal to START_ID.")
+
+        if opts["restart"]:
+            deleted, _ = BackfillCheckpoint.objects.filter(kind=kind, ts_id__gte=start_id, ts_id__lte=end_id).delete()
+            logging.info("Cleared %d checkpoints", deleted)
+
+        todo = backfill.pending_ids(kind, start_id, end_id)
+        logging.info(
+            "Backfill %s ts%s through ts%s: %d of %d IDs left",
+            kind, _format_ts_id(start_id), _format_ts_id(end_id), len(todo), end_id - start_id + 1,
+        )
+        if not todo:
+            self.stdout.write(self.style.SUCCESS("Done. Nothing left to backfill."))
+            return
+
+        t0 = time.perf_counter()
+        ctx = multiprocessing.get_context("spawn")
+        procs = [
+            ctx.Process(target=backfill.worker_main, args=(kind, ids, opts["concurrency"], n), name=f"backfill-{kind}-{n}")
+            for n, ids in enumerate(backfill.shard(todo, opts["workers"]))
+        ]
+        # Results and proposition backfills are not comparable, so the kind is
+        # part of the ledger's command name. Pages are counted by the workers.
+        with recorded_run(f"backfill_{kind}", opts, start_id, end_id) as run:
+            for p in procs:
+                p.start()
+            for p in procs:
+                p.join()
+
+            left = backfill.pending_ids(kind, start_id, end_id)
+            done = len(todo) - len(left)
+            run.pages = done + len(left)
+            run.failed_pages = len(left)
+            failed_workers = [p.name for p in procs if p.exitcode != 0]
+            elapsed = time.perf_counter() - t0
+            self.stdout.write(
+                f"{done} IDs checkpointed in {elapsed:.1f}s with {len(procs)} workers "
+                f"({done / elapsed * 60 if elapsed else 0:.1f} IDs/min). {len(left)} IDs left."
+            )
+            if failed_workers:
+                raise CommandError(f"Workers exited with errors: {', '.join(failed_workers)}. Re-run to resume.")
+        if left:
+            self.stdout.write(self.style.WARNING("Some IDs failed; re-run the same command to retry them."))
+            return
+        self.stdout.write(self.style.SUCCESS("Done. Backfill complete."))
@@ -0,0 +1,79 @@
+import logging, time
+from pathlib import Path
+from django.core.management.base import BaseCommand, CommandError
+from scraper import dirty, snapshot
+from scraper.ledger import recorded_run
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+
+
+class Command(BaseCommand):
+    help = (
+        "Write or refresh the columnar resultat snapshot (one .npy per column and year). "
+        "Without --full only the years with races changed since the last refresh are rebuilt."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--path",
+            help="Snapshot directory. Default: RESULTAT_SNAPSHOT_DIR.",
+        )
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Rebuild every year. Implied when the directory holds no snapshot yet.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=5_000,
+            help="How many dirty races to drain per transaction.",
+        )
+
+    def handle(self, *args, **opts):
+        if opts["batch_size"] < 1:
+            raise CommandError("--batch-size must be 1 or greater.")
+        if snapshot.CONSUMER not in dirty.CONSUMERS:
+            # Nothing queues changed races for it, so a refresh would rebuild
+            # nothing and the snapshot would silently go stale.
+            raise CommandError(
+                "RESULTAT_SNAPSHOT_DIR is not set, so the scrapers do not queue changes for the snapshot. "
+                "Set it for the scrapers and this command."
+            )
+        try:
+            root = Path(opts["path"]) if opts["path"] else snapshot.default_dir()
+        except ValueError as exc:
+            raise CommandError(f"{exc} Give --path.") from exc
+
+        full = opts["full"] or snapshot.read_manifest(root) is None
+        try:
+            writer = snapshot.Writer(root, full=full)
+        except ValueError as exc:
+            raise CommandError(str(exc)) from exc
+
+        t0 = time.perf_counter()
+        with recorded_run("build_snapshot", opts) as run:
+            # Drain first: whatever changes after this is queued for the next run.
+            def stale(keys):
+                writer.mark_stale(d // 10000 for d, _, _ in keys)
+                return len(keys)
+
+            races, _ = dirty.drain_all(snapshot.CONSUMER, stale, limit=opts["batch_size"])
+
+            if full:
+                years = sorted(set(writer.database_years()) | {int(y) for y in writer.manifest["years"]})
+            else:
+                years = list(writer.manifest["stale_years"])
+
+            rows = 0
+            for year in years:
+                n = writer.build_year(year)
+                rows += n
+                logging.info("  %d: %d rows", year, n)
+            writer.commit(years)
+            run.rows_updated = rows
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Done. {len(years)} years ({rows} rows) written to {root} from {races} changed races "
+            f"in {time.perf_counter() - t0:.1f}s."
+        ))
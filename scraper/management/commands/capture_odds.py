@@ -0,0 +1,246 @@
+import asyncio, logging, re, time
+from contextlib import AsyncExitStack
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from playwright.async_api import Error as PlaywrightError
+
+from scraper.crawl import open_browser, open_page
+from scraper.ledger import recorded_run
+from scraper.models import OddsSnapshot, StartList
+from scraper.throttle import TransientPageError, check_response, page_missing
+from scraper.management.commands.scrape_startlist import STARTLIST_URL
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+
+# Reads (lopp, nr, odds) for every row on a startlist page in one round trip;
+# going through locators cell by cell costs several round trips per horse.
+ODDS_ROWS_JS = """
+() => {
+  const out = [];
+  const heads = document.evaluate("//h2[starts-with(normalize-space(),'Lopp')]", document, null,
+                                  XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+  for (let i = 0; i < heads.snapshotLength; i++) {
+    const head = heads.snapshotItem(i);
+    const m = /Lopp\\s+(\\d+)/.exec(head.textContent || "");
+    if (!m) continue;
+    const grid = document.evaluate("following::div[contains(@class,'MuiDataGrid-root')][1]", head, null,
+                                   XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+    if (!grid) continue;
+    for (const row of grid.querySelectorAll("div[role='row'][data-rowindex]")) {
+      const horse = row.querySelector("div[data-field='mobilehorse']") || row.querySelector("div[data-field='horse']");
+      const nr = horse && horse.querySelector("div");
+      const odds = row.querySelector("div[data-field='odds']");
+      out.push([m[1], nr ? nr.textContent : "", odds ? odds.textContent : ""]);
+    }
+  }
+  return out;
+}
+"""
+
+digits_re = re.compile(r"\d+")
+
+RaceKey = Tuple[int, str, int]
+
+
+def _parse_iso_date(value: str) -> date:
+    try:
+        return date.fromisoformat(value)
+    except ValueError as exc:
+        raise ValueError(f"Invalid date {value!r}. Use YYYY-MM-DD.") from exc
+
+
+def _parse_hh_mm(value: str):
+    try:
+        return datetime.strptime(value, "%H:%M").time()
+    except ValueError as exc:
+        raise ValueError(f"Invalid time {value!r}. Use HH:MM.") from exc
+
+
+def parse_odds_rows(raw) -> List[Tuple[int, int, Optional[int]]]:
+    # Same reading as the results scraper: the first number in the odds cell.
+    # Scratched horses and markets that are not open yet come back as None.
+    out = []
+    for lopp_txt, nr_txt, odds_txt in raw:
+        nr_m = digits_re.search(nr_txt or "")
+        if not nr_m:
+            continue
+        odds_m = digits_re.search(odds_txt or "")
+        out.append((int(lopp_txt), int(nr_m.group(0)), int(odds_m.group(0)) if odds_m else None))
+    return out
+
+
+def load_card(day: date, tz: ZoneInfo) -> Dict[RaceKey, Tuple[int, datetime]]:
+    # (datum, bankod, lopp) -> (raceday ts-ID, start time) for races with a known start.
+    datum = int(day.strftime("%Y%m%d"))
+    card = {}
+    qs = (
+        StartList.objects.filter(startdatum=datum, ts_id__isnull=False, starttid__isnull=False)
+        .values_list("bankod", "lopp", "ts_id", "starttid")
+        .distinct()
+    )
+    for bankod, lopp, ts_id, starttid in qs:
+        card[(datum, bankod, lopp)] = (ts_id, datetime.combine(day, starttid, tzinfo=tz))
+    return card
+
+
+def last_values_query(datum: int):
+    # The newest sample per horse. Postgres keeps one row per horse with
+    # DISTINCT ON; SQLite has no DISTINCT ON, so there every sample of the day
+    # comes back newest first and load_last_values keeps the first per horse.
+    qs = OddsSnapshot.objects.filter(datum=datum).order_by("bankod", "lopp", "nr", "-captured_at")
+    if connection.vendor == "postgresql":
+        qs = qs.distinct("bankod", "lopp", "nr")
+    return qs.values_list("bankod", "lopp", "nr", "odds")
+
+
+def load_last_values(datum: int) -> Dict[tuple, Optional[int]]:
+    # Seeds the dedup state after a restart so the first round does not store a
+    # copy of every value that is already in the table.
+    last = {}
+    for bankod, lopp, nr, odds in last_values_query(datum):
+        last.setdefault((datum, bankod, lopp, nr), odds)
+    return last
+
+
+async def fetch_odds(page, ts_id: int) -> List[Tuple[int, int, Optional[int]]]:
+    try:
+        response = await page.goto(STARTLIST_URL.format(ts_id), timeout=60_000, wait_until="domcontentloaded")
+    except PlaywrightError as exc:
+        raise TransientPageError(f"goto failed: {exc}") from exc
+    check_response(response)
+    if page_missing(response):
+        return []
+    try:
+        await page.wait_for_selector("div[role='row'][data-rowindex]", timeout=30_000)
+    except PlaywrightError:
+        return []
+    return parse_odds_rows(await page.evaluate(ODDS_ROWS_JS))
+
+
+class Command(BaseCommand):
+    help = "Sample odds for all races starting within the next minutes and store every change as a snapshot."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--date",
+            type=_parse_iso_date,
+            help="Capture this date instead of today. Use YYYY-MM-DD.",
+        )
+        parser.add_argument(
+            "--window-minutes",
+            type=float,
+            default=30.0,
+            help="Sample races that start within this many minutes.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=60.0,
+            help="Seconds between two samples of the same raceday.",
+        )
+        parser.add_argument(
+            "--until",
+            type=_parse_hh_mm,
+            help="Stop at this local time. Without it the command stops after the day's last start.",
+        )
+
+    async def _sample(self, pages, stack, browser, ts_id: int):
+        # One page per raceday, kept open between rounds.
+        if ts_id not in pages:
+            pages[ts_id] = await stack.enter_async_context(open_page(browser))
+        try:
+            return ts_id, await fetch_odds(pages[ts_id], ts_id)
+        except Exception as exc:
+            logging.warning("  ts%s: odds sample failed: %s", ts_id, exc)
+            return ts_id, None
+
+    async def _run(self, card, last, tz: ZoneInfo, stop_at: datetime, opts):
+        window = timedelta(minutes=opts["window_minutes"])
+        stats = {"rounds": 0, "samples": 0, "stored": 0}
+        async with open_browser() as browser, AsyncExitStack() as stack:
+            pages = {}
+            while True:
+                now = datetime.now(tz)
+                if now >= stop_at:
+                    break
+                open_races: Dict[int, Dict[int, Tuple[int, str]]] = {}
+                for (datum, bankod, lopp), (ts_id, starts_at) in card.items():
+                    if now <= starts_at <= now + window:
+                        open_races.setdefault(ts_id, {})[lopp] = (datum, bankod)
+                if not open_races:
+                    upcoming = [starts_at for _, starts_at in card.values() if starts_at > now]
+                    if not upcoming:
+                        break
+                    wake = min(min(upcoming) - window, stop_at)
+                    await asyncio.sleep(max(opts["interval"], (wake - now).total_seconds()))
+                    continue
+
+                t0 = time.perf_counter()
+                results = await asyncio.gather(*(
+                    self._sample(pages, stack, browser, ts_id) for ts_id in sorted(open_races)
+                ))
+                captured_at = datetime.now(tz)
+                stats["rounds"] += 1
+
+                new = []
+                for ts_id, odds_rows in results:
+                    if odds_rows is None:
+                        continue
+                    by_lopp = open_races[ts_id]
+                    for lopp, nr, odds in odds_rows:
+                        if lopp not in by_lopp:
+                            continue
+                        datum, bankod = by_lopp[lopp]
+                        stats["samples"] += 1
+                        key = (datum, bankod, lopp, nr)
+                        if key in last and last[key] == odds:
+                            continue
+                        last[key] = odds
+                        new.append(OddsSnapshot(
+                            datum=datum, bankod=bankod, lopp=lopp, nr=nr, captured_at=captured_at, odds=odds,
+                        ))
+
+                if new:
+                    await asyncio.to_thread(OddsSnapshot.objects.bulk_create, new, batch_size=1_000)
+                stats["stored"] += len(new)
+                logging.info(
+                    "Round %d: %d races on %d racedays, %d changed odds stored (%.1fs)",
+                    stats["rounds"], sum(map(len, open_races.values())), len(open_races), len(new), time.perf_counter() - t0,
+                )
+
+                elapsed = (datetime.now(tz) - now).total_seconds()
+                await asyncio.sleep(max(0.0, opts["interval"] - elapsed))
+        return stats
+
+    def handle(self, *args, **opts):
+        if opts["window_minutes"] <= 0:
+            raise CommandError("--window-minutes must be greater than 0.")
+        if opts["interval"] < 5:
+            raise CommandError("--interval must be at least 5 seconds.")
+
+        tz = ZoneInfo(settings.RACE_TIME_ZONE)
+        day = opts.get("date") or datetime.now(tz).date()
+        card = load_card(day, tz)
+        if not card:
+            self.stdout.write(self.style.WARNING(
+                f"No startlist races with a start time for {day.isoformat()}. Run scrape_startlist first."
+            ))
+            return
+
+        if opts.get("until"):
+            stop_at = datetime.combine(day, opts["until"], tzinfo=tz)
+        else:
+            stop_at = max(starts_at for _, starts_at in card.values()) + timedelta(minutes=1)
+
+        last = load_last_values(int(day.strftime("%Y%m%d")))
+        logging.info("Capturing odds for %d races on %s (%d horses seen before)", len(card), day.isoformat(), len(last))
+        with recorded_run("capture_odds", opts):
+            stats = asyncio.run(self._run(card, last, tz, stop_at, opts))
+        self.stdout.write(self.style.SUCCESS(
+            f"Done. {stats['rounds']} rounds, {stats['samples']} odds sampled, {stats['stored']} snapshots stored."
+        ))
@@ -0,0 +1,194 @@
+import json, logging, re
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Max, Min
+from scraper import queries
+from scraper.ledger import recorded_run
+from scraper.management.commands import capture_odds
+from scraper.models import DriverHorseStats, DriverStats, HorseForm, HorseResult, OddsSnapshot, Proposition, StartList
+from scraper.normalize import name_key
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+log = logging.getLogger(__name__)
+
+# The big tables; a sequential scan on one of these is a regression. The small
+# ones (odds_snapshot, dirty_race, ...) are reported but never fail the check.
+LARGE_TABLES = ("resultat", "startlista", "proposition", "horse_form", "driver_horse_stats")
+
+
+def _sample(model, *fields):
+    # A row from the middle of the id range, so the parameters hit real data
+    # without an OFFSET walk over millions of rows.
+    bounds = model.objects.aggregate(lo=Min("id"), hi=Max("id"))
+    if bounds["lo"] is None:
+        return None
+    mid = (bounds["lo"] + bounds["hi"]) // 2
+    return model.objects.filter(id__gte=mid).order_by("id").values_list(*fields).first()
+
+
+def key_queries():
+    # (name, table, query) for the read paths the scrapers and refreshes
+    # depend on; query is a queryset or (sql, params) for raw SQL, and None
+    # when the table is empty.
+    r = _sample(HorseResult, "datum", "bankod", "lopp", "namn", "kusk")
+    s = _sample(StartList, "startdatum", "bankod", "lopp", "nr")
+    p = _sample(Proposition, "startdatum", "bankod", "namn", "proposition")
+    o = _sample(OddsSnapshot, "datum")
+    month = (r[0] // 100 * 100, r[0] // 100 * 100 + 31) if r else None
+
+    return [
+        ("resultat.writer_lookup", "resultat", r and HorseResult.objects.filter(
+            datum=r[0], bankod=r[1], lopp=r[2], namn=r[3])),
+        ("resultat.recompute_datums", "resultat", r and HorseResult.objects.filter(datum__in=[r[0]]).order_by(
+            "datum", "bankod", "lopp", "nr")),
+        ("resultat.recompute_range", "resultat", r and HorseResult.objects.filter(
+            datum__gte=month[0], datum__lte=month[1]).values_list("datum", flat=True).distinct()),
+        ("resultat.horse_history", "resultat", r and queries.horse_history_query(r[3])[:queries.DEFAULT_LIMIT]),
+        ("resultat.driver_history", "resultat", r and queries.driver_history_query(r[4])[:queries.DEFAULT_LIMIT]),
+        ("resultat.track_range", "resultat", r and queries.track_range_query(
+            r[1], month[0], month[1])[:queries.DEFAULT_LIMIT]),
+        ("resultat.raceday_results", "resultat", r and queries.raceday_results_query(r[0])[:queries.DEFAULT_LIMIT]),
+        ("startlista.writer_lookup", "startlista", s and StartList.objects.filter(
+            startdatum=s[0], bankod=s[1], lopp=s[2], nr=s[3])),
+        ("startlista.raceday_card", "startlista", s and StartList.objects.filter(
+            startdatum=s[0], ts_id__isnull=False)),
+        ("startlista.raceday_startlist", "startlista", s and queries.raceday_startlist_query(
+            s[0])[:queries.DEFAULT_LIMIT]),
+        ("horse_form.startlist_form", "startlista", s and queries.startlist_form_query(s[0], s[1])),
+        ("resultat.raceday_card", "resultat", s and queries.raceday_card_sql(s[0], s[1])),
+        ("driver_stats.by_kusk", "driver_stats", r and DriverStats.objects.filter(kusk__in=[r[4]])),
+        ("driver_horse_stats.pairs", "driver_horse_stats", r and DriverHorseStats.objects.filter(
+            kusk__in=[r[4]], namn_key__in=[name_key(r[3])])),
+        ("proposition.writer_lookup", "proposition", p and Proposition.objects.filter(
+            startdatum=p[0], bankod=p[1], namn=p[2], proposition=p[3])),
+        ("proposition.day", "proposition", p and queries.propositions_query(p[0])[:queries.DEFAULT_LIMIT]),
+        ("odds_snapshot.last_values", "odds_snapshot", o and capture_odds.last_values_query(o[0])),
+    ]
+
+
+def _walk(node):
+    yield node
+    for child in node.get("Plans", []):
+        yield from _walk(child)
+
+
+def _sql(query):
+    return query if isinstance(query, tuple) else query.query.sql_with_params()
+
+
+def _plan_lines(node, depth=0):
+    # Text rendering of a JSON plan node, close to EXPLAIN ANALYZE's own.
+    label = node["Node Type"]
+    if node.get("Index Name"):
+        label += f" using {node['Index Name']}"
+    if node.get("Relation Name"):
+        label += f" on {node['Relation Name']}"
+    line = f"{'  ' * depth}{'-> ' if depth else ''}{label}  (cost={node.get('Total Cost')} rows={node.get('Plan Rows')})"
+    if "Actual Rows" in node:
+        line += f" (actual time={node.get('Actual Total Time')} rows={node['Actual Rows']} loops={node.get('Actual Loops')})"
+    yield line
+    for key in ("Index Cond", "Filter", "Hash Cond", "Join Filter"):
+        if node.get(key):
+            yield f"{'  ' * (depth + 1)}{key}: {node[key]}"
+    for child in node.get("Plans", []):
+        yield from _plan_lines(child, depth + 1)
+
+
+def explain_postgres(query):
+    # One EXPLAIN ANALYZE in JSON; returns (seq-scanned tables, execution ms,
+    # text). The text is rendered from the same plan rather than running the
+    # query a second time.
+    sql, params = _sql(query)
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (ANALYZE, FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    root = plan[0]
+    seq = {n.get("Relation Name") for n in _walk(root["Plan"]) if n["Node Type"] == "Seq Scan"}
+    text = "\n".join([*_plan_lines(root["Plan"]), f"Execution Time: {root.get('Execution Time')} ms"])
+    return seq, root.get("Execution Time"), text
+
+
+def explain_sqlite(query):
+    # SQLite has no ANALYZE timing; "SCAN <table>" without an index is its seq
+    # scan. Run EXPLAIN QUERY PLAN directly: QuerySet.explain() on a flat
+    # values_list keeps only the first column of each plan row.
+    sql, params = _sql(query)
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+        details = [row[-1] for row in cursor.fetchall()]
+    seq = set()
+    for line in details:
+        m = re.search(r"\bSCAN (?:TABLE )?(\w+)", line)
+        if m and "USING" not in line:
+            seq.add(m.group(1))
+    return seq, None, "\n".join(details)
+
+
+class Command(BaseCommand):
+    help = (
+        "EXPLAIN ANALYZE the key read queries and fail when one of them sequentially scans "
+        "resultat, startlista, proposition or one of the rollup tables."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--max-ms",
+            type=float,
+            help="Also fail when a query takes longer than this (Postgres only).",
+        )
+        parser.add_argument(
+            "--min-rows",
+            type=int,
+            default=10_000,
+            help="Skip the seq scan check on tables smaller than this; the planner rightly scans tiny tables.",
+        )
+        parser.add_argument(
+            "--verbose-plans",
+            action="store_true",
+            help="Print every plan, not only the failing ones.",
+        )
+
+    def handle(self, *args, **opts):
+        if connection.vendor == "postgresql":
+            explain = explain_postgres
+        elif connection.vendor == "sqlite":
+            explain = explain_sqlite
+        else:
+            raise CommandError(f"No plan check for {connection.vendor}.")
+
+        with recorded_run("check_query_plans", opts):
+            sizes = {
+                "resultat": HorseResult.objects.count(),
+                "startlista": StartList.objects.count(),
+                "proposition": Proposition.objects.count(),
+                "horse_form": HorseForm.objects.count(),
+                "driver_horse_stats": DriverHorseStats.objects.count(),
+            }
+            failures = []
+            for name, table, query in key_queries():
+                if query is None:
+                    log.info("%-28s skipped, %s is empty", name, table)
+                    continue
+                seq, ms, text = explain(query)
+                problems = []
+                big = [t for t in sorted(seq) if t in LARGE_TABLES and sizes[t] >= opts["min_rows"]]
+                if big:
+                    problems.append(f"seq scan on {', '.join(big)}")
+                if opts["max_ms"] is not None and ms is not None and ms > opts["max_ms"]:
+                    problems.append(f"{ms:.1f} ms > {opts['max_ms']:g} ms")
+
+                timing = f"{ms:.2f} ms" if ms is not None else "-"
+                status = "FAIL " + "; ".join(problems) if problems else "ok"
+                self.stdout.write(f"{name:<28} {timing:>11}  {status}")
+                if problems or opts["verbose_plans"]:
+                    self.stdout.write(text)
+                if problems:
+                    failures.append(name)
+
+            if failures:
+                raise CommandError(f"{len(failures)} queries regressed: {', '.join(failures)}")
+        self.stdout.write(self.style.SUCCESS(
+            "Done. " + ", ".join(f"{t} {n} rows" for t, n in sizes.items()) + "; no sequential scans."
+        ))
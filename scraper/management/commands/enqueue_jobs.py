@@ -0,0 +1,63 @@
+import logging
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from scraper.crawl import KINDS
+from scraper.jobqueue import enqueue
+from scraper.ledger import recorded_run
+from scraper.models import ScrapeJob
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+
+
+def _parse_ts_id(value: str) -> int:
+    return int(str(value).replace("_", ""))
+
+
+class Command(BaseCommand):
+    help = "Add ts-IDs to the shared scrape_job queue, or show the queue status."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--kind",
+            choices=KINDS,
+            help="Which pages the jobs scrape.",
+        )
+        parser.add_argument(
+            "--start-id",
+            type=_parse_ts_id,
+            help="First raceday ts-ID, for example 616_290.",
+        )
+        parser.add_argument(
+            "--end-id",
+            type=_parse_ts_id,
+            help="Last raceday ts-ID, for example 619_310.",
+        )
+        parser.add_argument(
+            "--reset",
+            action="store_true",
+            help="Put already queued done/failed jobs in the range back to pending.",
+        )
+        parser.add_argument(
+            "--status",
+            action="store_true",
+            help="Only print job counts per kind and state.",
+        )
+
+    def handle(self, *args, **opts):
+        if not opts["status"]:
+            kind, start_id, end_id = opts.get("kind"), opts.get("start_id"), opts.get("end_id")
+            if kind is None or start_id is None or end_id is None:
+                raise CommandError("--kind, --start-id and --end-id are required unless --status is given.")
+            if end_id < start_id:
+                raise CommandError("END_ID must be greater than or equal to START_ID.")
+
+            with recorded_run("enqueue_jobs", opts, start_id, end_id) as run:
+                created = enqueue(kind, range(start_id, end_id + 1), reset=opts["reset"])
+                run.rows_created = created
+            self.stdout.write(self.style.SUCCESS(
+                f"Queued {created} new {kind} jobs ({end_id - start_id + 1} IDs in range)."
+            ))
+
+        counts = ScrapeJob.objects.values("kind", "state").annotate(n=Count("id")).order_by("kind", "state")
+        for c in counts:
+            self.stdout.write(f"  {c['kind']:<13} {c['state']:<8} {c['n']}")
@@ -0,0 +1,127 @@
+import gzip, logging, sys, time
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from scraper import export
+from scraper.ledger import recorded_run
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+log = logging.getLogger(__name__)
+
+PROGRESS_EVERY = 500_000
+
+
+def _parse_iso_date(value: str) -> date:
+    try:
+        return date.fromisoformat(value)
+    except ValueError as exc:
+        raise ValueError(f"Invalid date {value!r}. Use YYYY-MM-DD.") from exc
+
+
+def _date_to_datum(d: date) -> int:
+    return d.year * 10000 + d.month * 100 + d.day
+
+
+class Command(BaseCommand):
+    help = "Stream resultat, startlista or proposition to CSV or NDJSON with flat memory use."
+
+    def add_arguments(self, parser):
+        parser.add_argument("table", choices=sorted(export.TABLES))
+        parser.add_argument(
+            "--format",
+            choices=export.FORMATS,
+            default="csv",
+            help="Output format.",
+        )
+        parser.add_argument(
+            "--start-date",
+            type=_parse_iso_date,
+            help="First race date to export. Use YYYY-MM-DD.",
+        )
+        parser.add_argument(
+            "--end-date",
+            type=_parse_iso_date,
+            help="Last race date to export. Use YYYY-MM-DD.",
+        )
+        parser.add_argument(
+            "--bankod",
+            help="Only this track.",
+        )
+        parser.add_argument(
+            "--output",
+            default="-",
+            help="File to write; - for stdout.",
+        )
+        parser.add_argument(
+            "--gzip",
+            action="store_true",
+            help="Gzip the output.",
+        )
+        parser.add_argument(
+            "--after",
+            type=export.parse_after,
+            help="Resume after this <YYYYMMDD>,<id> (logged when an export stops early). "
+                 "Appends to --output without a new CSV header.",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=export.CHUNK_SIZE,
+            help="Rows fetched from the server-side cursor and written per chunk.",
+        )
+
+    def handle(self, *args, **opts):
+        if opts["chunk_size"] < 1:
+            raise CommandError("--chunk-size must be 1 or greater.")
+        table, after = opts["table"], opts["after"]
+        start, end = opts["start_date"], opts["end_date"]
+
+        data = export.rows(
+            table,
+            _date_to_datum(start) if start else None,
+            _date_to_datum(end) if end else None,
+            opts["bankod"],
+            after,
+            chunk_size=opts["chunk_size"],
+        )
+        last, pulled = None, 0
+
+        def tracked():
+            nonlocal last, pulled
+            for row in data:
+                last, pulled = row, pulled + 1
+                yield row
+
+        if opts["output"] == "-":
+            out = sys.stdout.buffer
+        else:
+            out = open(opts["output"], "ab" if after else "wb")
+        stream = gzip.GzipFile(fileobj=out, mode="wb") if opts["gzip"] else out
+
+        with recorded_run("export_table", opts):
+            t0 = time.perf_counter()
+            written, resume, next_log = 0, None, PROGRESS_EVERY
+            try:
+                # lines() yields as soon as a chunk fills, so after each write the
+                # last row pulled is the last row on disk: a safe resume point.
+                for chunk in export.lines(table, opts["format"], tracked(), header=after is None,
+                                          chunk_size=opts["chunk_size"]):
+                    stream.write(chunk.encode("utf-8"))
+                    resume, written = last, pulled
+                    if written >= next_log:
+                        log.info("%d rows, at %s", written, export.resume_point(table, resume))
+                        next_log += PROGRESS_EVERY
+            except (Exception, KeyboardInterrupt) as exc:
+                if resume is not None:
+                    log.error("Export stopped; continue with --after %s", export.resume_point(table, resume))
+                raise CommandError(f"Export failed: {exc!r}") from exc
+            finally:
+                if stream is not out:
+                    stream.close()
+                if out is not sys.stdout.buffer:
+                    out.close()
+                else:
+                    out.flush()
+
+        where = "stdout" if opts["output"] == "-" else opts["output"]
+        tail = f", last {export.resume_point(table, resume)}" if resume is not None else ""
+        log.info("Done. %d %s rows exported to %s in %.1fs%s.", written, table, where, time.perf_counter() - t0, tail)
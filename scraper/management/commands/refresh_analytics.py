@@ -0,0 +1,90 @@
+import logging, time
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from scraper import derived, dirty
+from scraper.ledger import recorded_run
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+
+
+def _parse_iso_date(value: str) -> date:
+    try:
+        return date.fromisoformat(value)
+    except ValueError as exc:
+        raise ValueError(f"Invalid date {value!r}. Use YYYY-MM-DD.") from exc
+
+
+def _date_to_datum(d: date) -> int:
+    return d.year * 10000 + d.month * 100 + d.day
+
+
+class Command(BaseCommand):
+    help = "Compute the derived resultat columns (nytid, difftid, sortering*, loppklass, ...) per race."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--start-date",
+            type=_parse_iso_date,
+            help="First race date to recompute. Use YYYY-MM-DD.",
+        )
+        parser.add_argument(
+            "--end-date",
+            type=_parse_iso_date,
+            help="Last race date to recompute. Use YYYY-MM-DD.",
+        )
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Recompute the whole resultat table.",
+        )
+        parser.add_argument(
+            "--dirty",
+            action="store_true",
+            help="Only recompute the races the scrapers marked as changed since the last refresh.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="How many dirty races to drain per transaction with --dirty.",
+        )
+        parser.add_argument(
+            "--chunk-days",
+            type=int,
+            default=31,
+            help="How many race dates to load and write per batch.",
+        )
+
+    def handle(self, *args, **opts):
+        start_date = opts.get("start_date")
+        end_date = opts.get("end_date")
+        if opts["chunk_days"] < 1:
+            raise CommandError("--chunk-days must be 1 or greater.")
+        if opts["batch_size"] < 1:
+            raise CommandError("--batch-size must be 1 or greater.")
+
+        t0 = time.perf_counter()
+        if opts["dirty"]:
+            if opts["all"] or start_date or end_date:
+                raise CommandError("--dirty cannot be combined with --all or a date range.")
+            with recorded_run("refresh_analytics", opts) as run:
+                races, total = dirty.drain_all("derived", derived.recompute_races, limit=opts["batch_size"])
+                run.rows_updated = total
+            self.stdout.write(self.style.SUCCESS(
+                f"Done. {races} dirty races, {total} resultat rows recomputed in {time.perf_counter() - t0:.1f}s."
+            ))
+            return
+
+        if not opts["all"] and start_date is None and end_date is None:
+            raise CommandError("Give --start-date/--end-date, --all or --dirty.")
+
+        with recorded_run("refresh_analytics", opts) as run:
+            total = derived.recompute_range(
+                _date_to_datum(start_date) if start_date else None,
+                _date_to_datum(end_date) if end_date else None,
+                chunk_days=opts["chunk_days"],
+            )
+            run.rows_updated = total
+        self.stdout.write(self.style.SUCCESS(
+            f"Done. {total} resultat rows recomputed in {time.perf_counter() - t0:.1f}s."
+        ))
@@ -0,0 +1,47 @@
+import logging, time
+from django.core.management.base import BaseCommand, CommandError
+from scraper import dirty, driver_stats
+from scraper.ledger import recorded_run
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+
+
+class Command(BaseCommand):
+    help = (
+        "Update driver_stats and driver_horse_stats for the drivers in races changed since the last refresh, "
+        "or rebuild them with --full."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Rebuild every driver from the whole resultat table.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="How many dirty races to drain per transaction.",
+        )
+
+    def handle(self, *args, **opts):
+        if opts["batch_size"] < 1:
+            raise CommandError("--batch-size must be 1 or greater.")
+
+        t0 = time.perf_counter()
+        with recorded_run("refresh_driver_stats", opts) as run:
+            if opts["full"]:
+                # Empty the queue first: the rebuild covers those races, and any
+                # changed while it runs are queued again for the next refresh.
+                dirty.drain_all(driver_stats.CONSUMER, lambda keys: 0, limit=opts["batch_size"])
+                total = driver_stats.rebuild()
+                races = None
+            else:
+                races, total = dirty.drain_all(driver_stats.CONSUMER, driver_stats.refresh_races, limit=opts["batch_size"])
+            run.rows_updated = total
+
+        what = "all drivers" if races is None else f"{races} dirty races"
+        self.stdout.write(self.style.SUCCESS(
+            f"Done. {total} drivers refreshed for {what} in {time.perf_counter() - t0:.1f}s."
+        ))
@@ -0,0 +1,44 @@
+import logging, time
+from django.core.management.base import BaseCommand, CommandError
+from scraper import dirty, form
+from scraper.ledger import recorded_run
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+
+
+class Command(BaseCommand):
+    help = "Update horse_form for the horses in races changed since the last refresh, or rebuild it with --full."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Rebuild every horse from the whole resultat table.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="How many dirty races to drain per transaction.",
+        )
+
+    def handle(self, *args, **opts):
+        if opts["batch_size"] < 1:
+            raise CommandError("--batch-size must be 1 or greater.")
+
+        t0 = time.perf_counter()
+        with recorded_run("refresh_form", opts) as run:
+            if opts["full"]:
+                # Empty the queue first: the rebuild covers those races, and any
+                # changed while it runs are queued again for the next refresh.
+                dirty.drain_all(form.CONSUMER, lambda keys: 0, limit=opts["batch_size"])
+                total = form.rebuild()
+                races = None
+            else:
+                races, total = dirty.drain_all(form.CONSUMER, form.refresh_races, limit=opts["batch_size"])
+            run.rows_updated = total
+
+        what = "all horses" if races is None else f"{races} dirty races"
+        self.stdout.write(self.style.SUCCESS(
+            f"Done. {total} horse_form rows written for {what} in {time.perf_counter() - t0:.1f}s."
+        ))
@@ -0,0 +1,87 @@
+import asyncio, logging, os
+from django.core.management.base import BaseCommand, CommandError
+from scraper import jobqueue
+from scraper.ledger import recorded_run
+from scraper.crawl import KINDS, open_browser
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+
+
+def _parse_kinds(value: str):
+    kinds = tuple(k.strip() for k in value.split(",") if k.strip())
+    unknown = [k for k in kinds if k not in KINDS]
+    if unknown or not kinds:
+        raise ValueError(f"Unknown kinds {unknown}. Use a comma separated list of {', '.join(KINDS)}.")
+    return kinds
+
+
+class Command(BaseCommand):
+    help = (
+        "Pull jobs from the shared scrape_job queue and scrape them. Start any number of "
+        "workers, on one machine or several, against the same Postgres database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--kinds",
+            type=_parse_kinds,
+            default=KINDS,
+            help="Comma separated job kinds to take, for example results,startlist. Default: all.",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=1,
+            help="How many jobs this worker runs at the same time in its browser.",
+        )
+        parser.add_argument(
+            "--lease-seconds",
+            type=int,
+            default=600,
+            help="How long a claimed job stays reserved without a heartbeat before other workers may take it.",
+        )
+        parser.add_argument(
+            "--max-attempts",
+            type=int,
+            default=3,
+            help="How many times a job is tried before it is marked failed.",
+        )
+        parser.add_argument(
+            "--poll-seconds",
+            type=float,
+            default=15.0,
+            help="How long to sleep when the queue is empty.",
+        )
+        parser.add_argument(
+            "--exit-when-empty",
+            action="store_true",
+            help="Stop once no pending or running jobs of --kinds are left instead of polling forever.",
+        )
+
+    def handle(self, *args, **opts):
+        if opts["concurrency"] < 1:
+            raise CommandError("--concurrency must be 1 or greater.")
+        if opts["lease_seconds"] < 30:
+            raise CommandError("--lease-seconds must be 30 or greater.")
+        if opts["max_attempts"] < 1:
+            raise CommandError("--max-attempts must be 1 or greater.")
+
+        worker = jobqueue.worker_name()
+        logging.info("Worker %s taking %s jobs", worker, ",".join(opts["kinds"]))
+
+        async def main():
+            async with open_browser() as browser:
+                return await jobqueue.work(
+                    browser,
+                    opts["kinds"],
+                    worker,
+                    concurrency=opts["concurrency"],
+                    lease_seconds=opts["lease_seconds"],
+                    max_attempts=opts["max_attempts"],
+                    poll_seconds=opts["poll_seconds"],
+                    exit_when_empty=opts["exit_when_empty"],
+                )
+
+        with recorded_run("run_worker", opts, job=f"run_worker_{os.getpid()}"):
+            finished = asyncio.run(main())
+        self.stdout.write(self.style.SUCCESS(f"Done. {finished} jobs completed by {worker}."))
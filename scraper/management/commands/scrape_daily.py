@@ -1,15 +1,153 @@
+import asyncio, logging, time
+from datetime import timedelta
+from django.conf import settings
 from django.core.management import call_command
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from scraper.crawl import open_browser, open_page
+from scraper.ledger import recorded_run
+from scraper.profiling import add_profile_arguments, profiled
+from scraper.race_calendar import find_first_ts_ids
+from scraper.management.commands import scrape_proposition, scrape_results, scrape_startlist
 
 
 class Command(BaseCommand):
-    help = "Run the daily startlist and results scrapers."
+    help = "Run the daily startlist and results scrapers concurrently in one browser, then refresh the races they changed."
 
-    def handle(self, *args, **options):
-        self.stdout.write("Running scrape_startlist...")
-        call_command("scrape_startlist")
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--startlist-ids",
+            type=int,
+            default=20,
+            help="How many IDs after yesterday's first Startlista ts-ID to scrape.",
+        )
+        parser.add_argument(
+            "--results-ids",
+            type=int,
+            default=25,
+            help="How many IDs after the first Resultat ts-ID to scrape.",
+        )
+        parser.add_argument(
+            "--results-days-back",
+            type=int,
+            default=5,
+            help="How many days back the Resultat range starts.",
+        )
+        parser.add_argument(
+            "--startlist-concurrency",
+            type=int,
+            default=2,
+            help="How many startlist pages to scrape at the same time.",
+        )
+        parser.add_argument(
+            "--results-concurrency",
+            type=int,
+            default=2,
+            help="How many results pages to scrape at the same time.",
+        )
+        parser.add_argument(
+            "--with-propositions",
+            action="store_true",
+            help="Also scrape propositions for the startlist ts-ID range.",
+        )
+        parser.add_argument(
+            "--proposition-concurrency",
+            type=int,
+            default=1,
+            help="How many proposition racedays to scrape at the same time.",
+        )
+        add_profile_arguments(parser)
 
-        self.stdout.write("Running scrape_results...")
-        call_command("scrape_results")
+    async def _timed(self, name, coro, timings):
+        t0 = time.perf_counter()
+        try:
+            result = await coro
+            timings.append((name, time.perf_counter() - t0, result, "ok"))
+        except Exception as exc:
+            logging.exception("%s failed", name)
+            timings.append((name, time.perf_counter() - t0, None, f"failed: {exc}"))
 
-        self.stdout.write(self.style.SUCCESS("Done. scrape_startlist and scrape_results completed."))
+    async def _run(self, opts, timings):
+        today = timezone.localdate()
+        async with open_browser() as browser:
+            t0 = time.perf_counter()
+            async with open_page(browser) as page:
+                first_ids = await find_first_ts_ids(page, {
+                    "startlist": today - timedelta(days=1),
+                    "results": today - timedelta(days=opts["results_days_back"]),
+                })
+            timings.append(("calendar", time.perf_counter() - t0, first_ids, "ok"))
+
+            stages = []
+            startlist_id = first_ids.get("startlist")
+            if startlist_id is None:
+                logging.warning("Could not find a Startlista link for yesterday; skipping startlist stage.")
+            else:
+                startlist_ids = range(startlist_id, startlist_id + opts["startlist_ids"] + 1)
+                stages.append(self._timed(
+                    "scrape_startlist",
+                    scrape_startlist.run_ids(startlist_ids, browser=browser, concurrency=opts["startlist_concurrency"]),
+                    timings,
+                ))
+                if opts["with_propositions"]:
+                    stages.append(self._timed(
+                        "scrape_proposition",
+                        scrape_proposition.run_days(startlist_ids, browser=browser, concurrency=opts["proposition_concurrency"]),
+                        timings,
+                    ))
+
+            results_id = first_ids.get("results")
+            if results_id is None:
+                logging.warning("Could not find a Resultat link; skipping results stage.")
+            else:
+                stages.append(self._timed(
+                    "scrape_results",
+                    scrape_results.run_range(results_id, results_id + opts["results_ids"], browser=browser, concurrency=opts["results_concurrency"]),
+                    timings,
+                ))
+
+            await asyncio.gather(*stages)
+
+    def handle(self, *args, **opts):
+        for key in ("startlist_ids", "results_ids", "results_days_back"):
+            if opts[key] < 0:
+                raise CommandError(f"--{key.replace('_', '-')} must be 0 or greater.")
+        for key in ("startlist_concurrency", "results_concurrency", "proposition_concurrency"):
+            if opts[key] < 1:
+                raise CommandError(f"--{key.replace('_', '-')} must be 1 or greater.")
+        if opts["profile_traces"] < 0:
+            raise CommandError("--profile-traces must be 0 or greater.")
+
+        timings = []
+        with recorded_run("scrape_daily", opts), profiled("scrape_daily", opts["profile"], opts["profile_traces"]):
+            t0 = time.perf_counter()
+            asyncio.run(self._run(opts, timings))
+
+            t1 = time.perf_counter()
+            self.stdout.write("Running refresh_analytics --dirty...")
+            call_command("refresh_analytics", dirty=True)
+            timings.append(("refresh_analytics", time.perf_counter() - t1, None, "ok"))
+            t1 = time.perf_counter()
+            self.stdout.write("Running refresh_form...")
+            call_command("refresh_form")
+            timings.append(("refresh_form", time.perf_counter() - t1, None, "ok"))
+            t1 = time.perf_counter()
+            self.stdout.write("Running refresh_driver_stats...")
+            call_command("refresh_driver_stats")
+            timings.append(("refresh_driver_stats", time.perf_counter() - t1, None, "ok"))
+            if settings.RESULTAT_SNAPSHOT_DIR:
+                t1 = time.perf_counter()
+                self.stdout.write("Running build_snapshot...")
+                call_command("build_snapshot")
+                timings.append(("build_snapshot", time.perf_counter() - t1, None, "ok"))
+            wall = time.perf_counter() - t0
+
+            self.stdout.write("Stage timings:")
+            for name, seconds, result, status in timings:
+                self.stdout.write(f"  {name:<20} {seconds:8.1f}s  {status}  {result if result is not None else ''}")
+            serial = sum(seconds for _, seconds, _, _ in timings)
+            self.stdout.write(f"  {'wall clock':<20} {wall:8.1f}s  (stages sum to {serial:.1f}s)")
+
+            if any(status != "ok" for _, _, _, status in timings):
+                raise CommandError("One or more daily stages failed.")
+        self.stdout.write(self.style.SUCCESS("Done. Daily scrape completed."))
@@ -1,12 +1,22 @@
-import asyncio, re, unicodedata, logging
+import asyncio, re, logging, time
 from dataclasses import dataclass
 from typing import List
-from playwright.async_api import async_playwright, Error as PlaywrightError
-from django.core.management.base import BaseCommand
+from playwright.async_api import Error as PlaywrightError
+from django.core.management.base import BaseCommand, CommandError
 from scraper.models import Proposition
+from scraper.cache import invalidate, raceday_tag
+from scraper.crawl import SPORTAPP_BASE, crawl
+from scraper.throttle import TransientPageError, check_response, page_missing
+from scraper.ledger import recorded_run
+from scraper.profiling import add_profile_arguments, profiled
+from scraper.instrumentation import lap, metrics, timed_db_call
+from scraper.tracks import find_bankod_in_text, track_to_bankod
 
 logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
 
+PROPOSITION_DAY_URL = SPORTAPP_BASE + "/propositions/raceday/ts{}"
+PROPOSITION_URL = SPORTAPP_BASE + "/propositions/raceday/ts{}/proposition/ts{}"
+
 SWEDISH_MONTH = {
     "JANUARI": 1, "FEBRUARI": 2, "MARS": 3, "APRIL": 4, "MAJ": 5,
     "JUNI": 6, "JULI": 7, "AUGUSTI": 8, "SEPTEMBER": 9, "OKTOBER": 10,
@@ -21,40 +31,6 @@ def swedish_date_to_yyyymmdd(text: str) -> str:
         d, m, y = p
     return f"{int(y):04d}{SWEDISH_MONTH[m]:02d}{int(d):02d}"
 
-def _strip_diacritics(s: str) -> str:
-    return unicodedata.normalize("NFKD", s).encode("ascii", "ignore").decode()
-
-FULLNAME_TO_BANKOD = {
-    "ARVIKA":"Ar","AXEVALLA":"Ax","BERGSÅKER":"B","BODEN":"Bo","BOLLNÄS":"Bs",
-    "DANNERO":"D","DALA JÄRNA":"Dj","ESKILSTUNA":"E","JÄGERSRO":"J","FÄRJESTAD":"F",
-    "GÄVLE":"G","GÖTEBORG TRAV":"Gt","HAGMYREN":"H","HALMSTAD":"Hd","HOTING":"Hg",
-    "KARLSHAMN":"Kh","KALMAR":"Kr","LINDESBERG":"L","LYCKSELE":"Ly","MANTORP":"Mp",
-    "OVIKEN":"Ov","ROMME":"Ro","RÄTTVIK":"Rä","SOLVALLA":"S","SKELLEFTEÅ":"Sk",
-    "SOLÄNGET":"Sä","TINGSRYD":"Ti","TÄBY TRAV":"Tt","UMÅKER":"U","VEMDALEN":"Vd",
-    "VAGGERYD":"Vg","VISBY":"Vi","ÅBY":"Å","ÅMÅL":"Åm","ÅRJÄNG":"År","ÖREBRO":"Ö","ÖSTERSUND":"Ös",
-}
-_ASCII_FALLBACK = {_strip_diacritics(k): v for k, v in FULLNAME_TO_BANKOD.items()}
-
-def track_to_bankod(name: str) -> str:
-    name_up = name.strip().upper()
-    if name_up.startswith(("TÄVLINGSDAG", "TRAVTÄVLING")):
-        name_up = name_up.split(maxsplit=1)[1]
-    if name_up in FULLNAME_TO_BANKOD:
-        return FULLNAME_TO_BANKOD[name_up]
-    return _ASCII_FALLBACK.get(_strip_diacritics(name_up), name_up[:2].title())
-
-def extract_bankod_from_text(raw: str) -> str | None:
-    t_up = re.sub(r"[^A-ZÅÄÖ\s]", " ", raw.upper())
-    t_up = re.sub(r"\s+", " ", t_up).strip()
-    for key in sorted(FULLNAME_TO_BANKOD.keys(), key=len, reverse=True):
-        if key in t_up:
-            return FULLNAME_TO_BANKOD[key]
-    t_ascii = _strip_diacritics(t_up)
-    for key in sorted(_ASCII_FALLBACK.keys(), key=len, reverse=True):
-        if key in t_ascii:
-            return _ASCII_FALLBACK[key]
-    return None
-
 @dataclass
 class PropRow:
     startdatum: int
@@ -64,204 +40,264 @@ class PropRow:
     distans: int | None = None
     kuskanskemal: str | None = None  
 
-async def scrape_proposition_page(url: str) -> List[PropRow]:
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=True)
-        ctx = await browser.new_context(); ctx.set_default_timeout(120_000)
-        page = await ctx.new_page()
-        try:
-            await page.goto(url, timeout=0)
-        except PlaywrightError:
-            await browser.close(); return []
-
-        try:
-            await page.wait_for_selector("div[role='row'][data-rowindex]", timeout=10_000)
-        except PlaywrightError:
-            await browser.close(); return []
-
-        bankod = None; startdatum = None
-        nav = page.locator("div[class*='RaceDayNavigator_title'] span")
-        if await nav.count() >= 2:
-            track_text = (await nav.nth(0).inner_text()).strip()
-            bank_try = extract_bankod_from_text(track_text) or track_to_bankod(track_text)
-            date_text = (await nav.nth(1).inner_text()).strip()
-            bankod = bank_try
-            startdatum = int(swedish_date_to_yyyymmdd(date_text))
-        if bankod is None or startdatum is None:
-            nodes = page.locator("xpath=//*[self::div or self::span or self::p or self::h1 or self::h2]")
-            date_re = re.compile(r"\b(20\d{2}-\d{2}-\d{2})\b")
-            for i in range(min(await nodes.count(), 250)):
-                t = (await nodes.nth(i).inner_text()).strip()
-                m = date_re.search(t)
-                if not m:
-                    continue
-                date_str = m.group(1)
-                startdatum = int(date_str.replace("-", ""))
-                track_part = t.split(date_str)[0].strip(" •|-").strip()
-                bank_try = extract_bankod_from_text(track_part)
-                bankod = bank_try or track_to_bankod(track_part)
-                break
-
-        if bankod is None or startdatum is None:
-            await browser.close(); return []
-
-        prop_num = None
-        cand = page.locator("xpath=//*[contains(normalize-space(.), 'Prop.')]")
-        for i in range(min(await cand.count(), 50)):
-            txt = (await cand.nth(i).inner_text()).strip()
-            m = re.search(r"Prop\.\s*(\d+)", txt, flags=re.I)
-            if m:
-                prop_num = int(m.group(1))
-                break
-        if prop_num is None:
-            await browser.close(); return []
-                       
-        rows = await page.locator("div[role='row'][data-rowindex]").all()
-        out: List[PropRow] = []
-        for row in rows:
-
-            cell = row.locator("div[data-field='horseName'], div[data-field='horse']")
-            if await cell.count() == 0:
-                continue
-            name_loc = cell.locator("a, span").first
-            namn_raw = (await name_loc.inner_text()).strip()
-            namn = namn_raw.split("(")[0].strip()
-            if not namn:
+async def scrape_proposition_page(page, url: str) -> List[PropRow]:
+    t0 = time.perf_counter()
+    try:
+        response = await page.goto(url, timeout=60_000)
+    except PlaywrightError as exc:
+        raise TransientPageError(f"goto failed: {exc}") from exc
+    check_response(response)
+    t0 = lap("goto", t0, kind="propositions")
+    if page_missing(response):
+        return []
+
+    try:
+        await page.wait_for_selector("div[role='row'][data-rowindex]", timeout=10_000)
+    except PlaywrightError:
+        lap("wait_rows", t0, kind="propositions")
+        return []
+    t0 = lap("wait_rows", t0, kind="propositions")
+
+    bankod = None; startdatum = None
+    nav = page.locator("div[class*='RaceDayNavigator_title'] span")
+    if await nav.count() >= 2:
+        track_text = (await nav.nth(0).inner_text()).strip()
+        bank_try = find_bankod_in_text(track_text) or track_to_bankod(track_text)
+        date_text = (await nav.nth(1).inner_text()).strip()
+        bankod = bank_try
+        startdatum = int(swedish_date_to_yyyymmdd(date_text))
+    if bankod is None or startdatum is None:
+        nodes = page.locator("xpath=//*[self::div or self::span or self::p or self::h1 or self::h2]")
+        date_re = re.compile(r"\b(20\d{2}-\d{2}-\d{2})\b")
+        for i in range(min(await nodes.count(), 250)):
+            t = (await nodes.nth(i).inner_text()).strip()
+            m = date_re.search(t)
+            if not m:
                 continue
-
-            dist_val: int | None = None
-            dist_cell = row.locator("div[data-field='distance']")
-            if await dist_cell.count() > 0:
-                dist_txt = (await dist_cell.first.inner_text()).strip()
-                m = re.search(r"(\d{3,5})", dist_txt)
-                if m:
-                    dist_val = int(m.group(1))
-         
-            kusk_pref: str | None = None                                   
-            pref_cell = row.locator("div[data-field='driverPreferences']")  
-            if await pref_cell.count() > 0:                                 
-                
-                raw = (await pref_cell.first.inner_text()).strip()          
-                raw = re.sub(r"[ \t]+", " ", raw)                           
-                pairs = re.findall(r"(\d+)\s*\.\s*([A-Za-zÅÄÖåäö][^(\n]+)", raw)  
-                if pairs:                                                   
-                    items = [f"{n}. {nm.strip()}" for n, nm in pairs]       
-                    kusk_pref = " | ".join(items)                           
-                else:                                                       
-         
-                    a = pref_cell.first.locator("a")                        
-                    cnt = await a.count()                                   
-                    if cnt > 0:                                             
-                        names = [(await a.nth(i).inner_text()).strip() for i in range(cnt)]  
-                        kusk_pref = " | ".join(f"{i+1}. {nm}" for i, nm in enumerate(names)) 
-
-            out.append(PropRow(
-                startdatum, bankod, namn, prop_num,
-                dist_val,
-                kusk_pref,  
-            ))
-
-        await browser.close()
-        return out
-
-async def fetch_prop_ids_for_day(day_id: int) -> List[int]:
-    list_url = f"https://sportapp.travsport.se/propositions/raceday/ts{day_id}"
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=True)
-        ctx = await browser.new_context(); ctx.set_default_timeout(120_000)
-        page = await ctx.new_page()
-        try:
-            await page.goto(list_url, timeout=0)
-        except PlaywrightError:
-            await browser.close(); return []
-
-        link_sel = f"a[href*='/propositions/raceday/ts{day_id}/proposition/ts']"
+            date_str = m.group(1)
+            startdatum = int(date_str.replace("-", ""))
+            track_part = t.split(date_str)[0].strip(" •|-").strip()
+            bank_try = find_bankod_in_text(track_part)
+            bankod = bank_try or track_to_bankod(track_part)
+            break
+
+    if bankod is None or startdatum is None:
+        return []
+
+    prop_num = None
+    cand = page.locator("xpath=//*[contains(normalize-space(.), 'Prop.')]")
+    for i in range(min(await cand.count(), 50)):
+        txt = (await cand.nth(i).inner_text()).strip()
+        m = re.search(r"Prop\.\s*(\d+)", txt, flags=re.I)
+        if m:
+            prop_num = int(m.group(1))
+            break
+    if prop_num is None:
+        return []
+                   
+    rows = await page.locator("div[role='row'][data-rowindex]").all()
+    out: List[PropRow] = []
+    for row in rows:
+
+        cell = row.locator("div[data-field='horseName'], div[data-field='horse']")
+        if await cell.count() == 0:
+            continue
+        name_loc = cell.locator("a, span").first
+        namn_raw = (await name_loc.inner_text()).strip()
+        namn = namn_raw.split("(")[0].strip()
+        if not namn:
+            continue
+
+        dist_val: int | None = None
+        dist_cell = row.locator("div[data-field='distance']")
+        if await dist_cell.count() > 0:
+            dist_txt = (await dist_cell.first.inner_text()).strip()
+            m = re.search(r"(\d{3,5})", dist_txt)
+            if m:
+                dist_val = int(m.group(1))
+     
+        kusk_pref: str | None = None                                   
+        pref_cell = row.locator("div[data-field='driverPreferences']")  
+        if await pref_cell.count() > 0:                                 
+            
+            raw = (await pref_cell.first.inner_text()).strip()          
+            raw = re.sub(r"[ \t]+", " ", raw)                           
+            pairs = re.findall(r"(\d+)\s*\.\s*([A-Za-zÅÄÖåäö][^(\n]+)", raw)  
+            if pairs:                                                   
+                items = [f"{n}. {nm.strip()}" for n, nm in pairs]       
+                kusk_pref = " | ".join(items)                           
+            else:                                                       
+     
+                a = pref_cell.first.locator("a")                        
+                cnt = await a.count()                                   
+                if cnt > 0:                                             
+                    names = [(await a.nth(i).inner_text()).strip() for i in range(cnt)]  
+                    kusk_pref = " | ".join(f"{i+1}. {nm}" for i, nm in enumerate(names)) 
+
+        out.append(PropRow(
+            startdatum, bankod, namn, prop_num,
+            dist_val,
+            kusk_pref,  
+        ))
+
+    lap("extract", t0, kind="propositions")
+    return out
+
+async def fetch_prop_ids_for_day(page, day_id: int) -> List[int]:
+    list_url = PROPOSITION_DAY_URL.format(day_id)
+    t0 = time.perf_counter()
+    try:
+        response = await page.goto(list_url, timeout=60_000)
+    except PlaywrightError as exc:
+        raise TransientPageError(f"goto failed: {exc}") from exc
+    check_response(response)
+    t0 = lap("goto_day", t0, kind="propositions")
+    if page_missing(response):
+        return []
+
+    link_sel = f"a[href*='/propositions/raceday/ts{day_id}/proposition/ts']"
+    try:
+        await page.wait_for_selector(link_sel, timeout=10_000)
+    except PlaywrightError:
+        lap("wait_links", t0, kind="propositions")
+        return []
+    t0 = lap("wait_links", t0, kind="propositions")
+
+    scroller = page.locator("div.MuiDataGrid-virtualScroller, div[class*='MuiDataGrid-virtualScroller']")
+    last = -1
+    for _ in range(25):
+        count = await page.locator(link_sel).count()
+        if count == last:
+            break
+        last = count
         try:
-            await page.wait_for_selector(link_sel, timeout=10_000)
-        except PlaywrightError:
-            await browser.close(); return []
-
-        scroller = page.locator("div.MuiDataGrid-virtualScroller, div[class*='MuiDataGrid-virtualScroller']")
-        last = -1
-        for _ in range(25):
-            count = await page.locator(link_sel).count()
-            if count == last:
-                break
-            last = count
-            try:
-                if await scroller.count() > 0:
-                    await scroller.first.evaluate("(el)=>el.scrollTo(0, el.scrollHeight)")
-                else:
-                    await page.mouse.wheel(0, 20000)
-            except Exception:
-                pass
-            await page.wait_for_timeout(300)
-
-        hrefs = []
-        links = page.locator(link_sel)
-        for i in range(await links.count()):
-            href = await links.nth(i).get_attribute("href")
-            if href:
-                hrefs.append(href)
-        await browser.close()
+            if await scroller.count() > 0:
+                await scroller.first.evaluate("(el)=>el.scrollTo(0, el.scrollHeight)")
+            else:
+                await page.mouse.wheel(0, 20000)
+        except Exception:
+            pass
+        await page.wait_for_timeout(300)
+
+    hrefs = []
+    links = page.locator(link_sel)
+    for i in range(await links.count()):
+        href = await links.nth(i).get_attribute("href")
+        if href:
+            hrefs.append(href)
 
     ids = set()
     for h in hrefs:
         m = re.search(r"/proposition/ts(\d+)", h)
         if m:
             ids.add(int(m.group(1)))
+    lap("collect_links", t0, kind="propositions")
     return sorted(ids)
 
+def write_proposition_rows(rows: List[PropRow]) -> int:
+    created_n = 0
+    for r in rows:
+        _, created = Proposition.objects.update_or_create(
+            startdatum=r.startdatum, bankod=r.bankod,
+            namn=r.namn, proposition=r.proposition,
+            defaults={
+                "distans": r.distans,
+                "kuskanskemal": r.kuskanskemal, 
+            },
+        )
+        created_n += created
+    invalidate(raceday_tag(r.startdatum) for r in rows)
+    metrics.inc("rows_written_total", created_n, kind="propositions", op="created")
+    metrics.inc("rows_written_total", len(rows) - created_n, kind="propositions", op="updated")
+    return len(rows)
+
+async def run_days(day_ids, browser=None, concurrency: int = 1, on_done=None) -> int:
+    grand_total = 0
+
+    async def handle(page, day_id: int):
+        nonlocal grand_total
+        logging.info("=== Raceday ts%d: hämtar proposition-länkar ===", day_id)
+        try:
+            prop_ids = await fetch_prop_ids_for_day(page, day_id)
+        except TransientPageError:
+            raise
+        except Exception as exc:
+            logging.warning("  kunde inte hämta prop-ids för ts%d: %s", day_id, exc)
+            prop_ids = []
+
+        if not prop_ids:
+            logging.info("  inga proposition-länkar hittade för ts%d", day_id)
+            return 0
+
+        day_total = 0
+        for pid in prop_ids:
+            url = PROPOSITION_URL.format(day_id, pid)
+            logging.info("  Scraping %s", url)
+            try:
+                rows = await scrape_proposition_page(page, url)
+            except TransientPageError:
+                raise
+            except Exception as exc:
+                logging.warning("    failed: %s", exc)
+                rows = []
+
+            if not rows:
+                logging.info("    no rows")
+                continue
+
+            cnt = await asyncio.to_thread(timed_db_call, "propositions", write_proposition_rows, rows)
+            day_total += cnt
+            grand_total += cnt
+            logging.info("    inserted/updated %d rows", cnt)
+
+        logging.info("=== Klar dag ts%d: %d rader ===", day_id, day_total)
+        return day_total
+
+    await crawl(day_ids, handle, browser=browser, concurrency=concurrency, on_done=on_done, kind="propositions")
+    return grand_total
+
+def _parse_ts_id(value: str) -> int:
+    return int(str(value).replace("_", ""))
+
 class Command(BaseCommand):
     help = "Scrape proposition-sidor: loopa över raceday-id, hämta prop-ids för dagen och skrapa dem."
 
     DAY_START_ID = 610_355
     DAY_END_ID   = 610_450
 
-    def handle(self, *args, **opts):
-        base_prop = "https://sportapp.travsport.se/propositions/raceday/ts{}/proposition/ts{}"
-        grand_total = 0
-
-        for day_id in range(self.DAY_START_ID, self.DAY_END_ID + 1):
-            logging.info("=== Raceday ts%d: hämtar proposition-länkar ===", day_id)
-            try:
-                prop_ids = asyncio.run(fetch_prop_ids_for_day(day_id))
-            except Exception as exc:
-                logging.warning("  kunde inte hämta prop-ids för ts%d: %s", day_id, exc)
-                prop_ids = []
-
-            if not prop_ids:
-                logging.info("  inga proposition-länkar hittade för ts%d", day_id)
-                continue
-
-            day_total = 0
-            for pid in prop_ids:
-                url = base_prop.format(day_id, pid)
-                logging.info("  Scraping %s", url)
-                try:
-                    rows = asyncio.run(scrape_proposition_page(url))
-                except Exception as exc:
-                    logging.warning("    failed: %s", exc)
-                    rows = []
-
-                if not rows:
-                    logging.info("    no rows")
-                    continue
-
-                for r in rows:
-                    Proposition.objects.update_or_create(
-                        startdatum=r.startdatum, bankod=r.bankod,
-                        namn=r.namn, proposition=r.proposition,
-                        defaults={
-                            "distans": r.distans,
-                            "kuskanskemal": r.kuskanskemal, 
-                        },
-                    )
-                cnt = len(rows)
-                day_total += cnt
-                grand_total += cnt
-                logging.info("    inserted/updated %d rows", cnt)
-
-            logging.info("=== Klar dag ts%d: %d rader ===", day_id, day_total)
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--start-id",
+            type=_parse_ts_id,
+            help="First raceday ts-ID. Default: the hard-coded DAY_START_ID.",
+        )
+        parser.add_argument(
+            "--end-id",
+            type=_parse_ts_id,
+            help="Last raceday ts-ID. Default: the hard-coded DAY_END_ID.",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=1,
+            help="How many racedays to scrape at the same time in one browser.",
+        )
+        add_profile_arguments(parser)
 
+    def handle(self, *args, **opts):
+        if opts["concurrency"] < 1:
+            raise CommandError("--concurrency must be 1 or greater.")
+        if opts["profile_traces"] < 0:
+            raise CommandError("--profile-traces must be 0 or greater.")
+
+        start_id = opts.get("start_id") or self.DAY_START_ID
+        end_id = opts.get("end_id") or (self.DAY_END_ID if opts.get("start_id") is None else start_id)
+        if end_id < start_id:
+            raise CommandError("--end-id must be greater than or equal to --start-id.")
+
+        with recorded_run("scrape_proposition", opts, start_id, end_id), \
+                profiled("scrape_proposition", opts["profile"], opts["profile_traces"]):
+            grand_total = asyncio.run(
+                run_days(range(start_id, end_id + 1), concurrency=opts["concurrency"])
+            )
         self.stdout.write(self.style.SUCCESS(f"Done. {grand_total} rows processed."))
@@ -0,0 +1,139 @@
+import statistics
+from typing import List, Optional
+from django.core.management.base import BaseCommand, CommandError
+from scraper.models import ScrapeRun
+
+MIN_BASELINE_RUNS = 3
+
+
+def throughput(run: ScrapeRun) -> Optional[float]:
+    # Pages per minute for scrape runs, rows per minute for runs without pages
+    # (refresh_analytics).
+    seconds = run.duration_seconds
+    if not seconds:
+        return None
+    work = run.pages or (run.rows_created + run.rows_updated)
+    return work / seconds * 60 if work else None
+
+
+def error_rate(run: ScrapeRun) -> float:
+    return run.failed_pages / run.pages if run.pages else 0.0
+
+
+def stage_per_unit(run: ScrapeRun) -> dict:
+    work = run.pages or (run.rows_created + run.rows_updated) or 1
+    return {stage: seconds / work for stage, seconds in (run.stage_seconds or {}).items()}
+
+
+def compare(latest: ScrapeRun, baseline: List[ScrapeRun], threshold: float) -> List[str]:
+    flags = []
+    if latest.status == ScrapeRun.FAILED:
+        flags.append(f"run failed: {latest.error or 'no error recorded'}")
+
+    rates = [r for r in (throughput(run) for run in baseline) if r]
+    current = throughput(latest)
+    if rates and current is not None:
+        median = statistics.median(rates)
+        if current < (1 - threshold) * median:
+            flags.append(f"throughput {current:.1f}/min is {(1 - current / median) * 100:.0f}% below the median {median:.1f}/min")
+
+    base_errors = statistics.median(error_rate(run) for run in baseline)
+    if error_rate(latest) > base_errors + threshold / 2:
+        flags.append(f"error rate {error_rate(latest):.1%} vs median {base_errors:.1%}")
+    return flags
+
+
+def stage_changes(latest: ScrapeRun, baseline: List[ScrapeRun], limit: int = 3) -> List[str]:
+    # The stages whose time per page grew the most; where a regression came from.
+    current = stage_per_unit(latest)
+    history = [stage_per_unit(run) for run in baseline]
+    changes = []
+    for stage, value in current.items():
+        past = [h[stage] for h in history if stage in h]
+        if not past:
+            continue
+        median = statistics.median(past)
+        changes.append((value - median, stage, value, median))
+    changes.sort(reverse=True)
+    return [
+        f"{stage}: {value:.2f}s per unit (median {median:.2f}s)"
+        for delta, stage, value, median in changes[:limit] if delta > 0
+    ]
+
+
+class Command(BaseCommand):
+    help = "Compare the latest run of each command in the scrape_run ledger with its recent runs and flag regressions."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--command",
+            action="append",
+            dest="commands",
+            help="Only report this command (repeatable). Default: every command in the ledger.",
+        )
+        parser.add_argument(
+            "--baseline-runs",
+            type=int,
+            default=10,
+            help="How many earlier successful runs form the baseline.",
+        )
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=0.25,
+            help="Flag a run whose throughput is this fraction below the baseline median.",
+        )
+        parser.add_argument(
+            "--fail-on-regression",
+            action="store_true",
+            help="Exit with an error when any command is flagged, for cron alerts.",
+        )
+
+    def handle(self, *args, **opts):
+        if opts["baseline_runs"] < MIN_BASELINE_RUNS:
+            raise CommandError(f"--baseline-runs must be {MIN_BASELINE_RUNS} or greater.")
+        if not 0 < opts["threshold"] < 1:
+            raise CommandError("--threshold must be between 0 and 1.")
+
+        finished = ScrapeRun.objects.filter(finished_at__isnull=False)
+        commands = opts.get("commands") or sorted(set(finished.values_list("command", flat=True)))
+        if not commands:
+            self.stdout.write("No finished runs in the ledger yet.")
+            return
+
+        flagged = []
+        for command in commands:
+            runs = finished.filter(command=command).order_by("-started_at")
+            latest = runs.first()
+            if latest is None:
+                self.stdout.write(f"{command}: no finished runs")
+                continue
+            baseline = list(
+                runs.filter(status=ScrapeRun.OK, started_at__lt=latest.started_at)[:opts["baseline_runs"]]
+            )
+
+            rate = throughput(latest)
+            self.stdout.write(
+                f"{command}: {latest.started_at:%Y-%m-%d %H:%M} {latest.status}, "
+                f"{latest.duration_seconds:.0f}s, {latest.pages} pages ({latest.empty_pages} empty, "
+                f"{latest.failed_pages} failed, {latest.retries} retries), "
+                f"{latest.rows_created} created / {latest.rows_updated} updated, "
+                f"{f'{rate:.1f}/min' if rate else 'n/a'}"
+            )
+            if len(baseline) < MIN_BASELINE_RUNS:
+                self.stdout.write(f"  only {len(baseline)} earlier runs; need {MIN_BASELINE_RUNS} for a baseline")
+                continue
+
+            flags = compare(latest, baseline, opts["threshold"])
+            if not flags:
+                self.stdout.write(self.style.SUCCESS(f"  ok against {len(baseline)} earlier runs"))
+                continue
+            flagged.append(command)
+            for flag in flags:
+                self.stdout.write(self.style.WARNING(f"  REGRESSION {flag}"))
+            for line in stage_changes(latest, baseline):
+                self.stdout.write(f"    {line}")
+
+        if flagged and opts["fail_on_regression"]:
+            raise CommandError(f"Regressions in: {', '.join(flagged)}")
+        self.stdout.write(self.style.SUCCESS(f"Done. {len(commands)} commands checked, {len(flagged)} flagged."))
@@ -1,13 +1,22 @@
-import asyncio, re, unicodedata, logging
+import asyncio, re, logging, time
 from dataclasses import dataclass
 from typing import List, Tuple, Optional
 from datetime import date, timedelta
-from urllib.parse import urljoin
 from django.core.management.base import BaseCommand, CommandError
-from django.db import IntegrityError
+from django.db import IntegrityError, transaction
 from django.utils import timezone
-from playwright.async_api import async_playwright, Error as PlaywrightError
+from playwright.async_api import Error as PlaywrightError
 from scraper.models import HorseResult
+from scraper.crawl import SPORTAPP_BASE, crawl
+from scraper.throttle import TransientPageError, check_response, page_missing
+from scraper.race_calendar import find_first_ts_id_for_date
+from scraper.dirty import mark_races_dirty
+from scraper import cache
+from scraper.ledger import recorded_run
+from scraper.profiling import add_profile_arguments, profiled
+from scraper.instrumentation import lap, metrics, timed_db_call
+from scraper.tracks import track_to_bankod
+from scraper.normalize import name_key, normalize_cell_text, normalize_kusk, normalize_name, parse_swe_int
 
 logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
 
@@ -17,8 +26,7 @@ SWEDISH_MONTH = {
     "JUNI": 6, "JULI": 7, "AUGUSTI": 8, "SEPTEMBER": 9, "OKTOBER": 10,
     "NOVEMBER": 11, "DECEMBER": 12,
 }
-SWEDISH_MONTH_BY_NUMBER = {v: k.lower() for k, v in SWEDISH_MONTH.items()}
-CALENDAR_URL = "https://sportapp.travsport.se/race/calendar/race?year={year}&competition=SPORT&month={month:02d}"
+RESULTS_URL = SPORTAPP_BASE + "/race/raceday/ts{}/results/all"
 
 def swedish_date_to_yyyymmdd(text: str) -> str:
     parts = (text or "").strip().upper().split()
@@ -28,27 +36,6 @@ def swedish_date_to_yyyymmdd(text: str) -> str:
         d, m, y = parts
     return f"{int(y):04d}{SWEDISH_MONTH[m]:02d}{int(d):02d}"
 
-_APOSTROPHES_RE = re.compile(r"[\'\u2019]")
-
-def normalize_cell_text(s: str) -> str:
-    if s is None:
-        return ""
-    return s.replace("\u00a0", " ").strip()
-
-def trim_to_max(s: str, max_len: int) -> str:
-    s = s or ""
-    return s if len(s) <= max_len else s[:max_len]
-
-def normalize_name(name: str) -> str:
-    cleaned = normalize_cell_text(name).replace("*", "")
-    cleaned = _APOSTROPHES_RE.sub("", cleaned)
-    cleaned = re.sub(r"\s+", " ", cleaned).strip()
-    return trim_to_max(cleaned, 50)
-
-def normalize_kusk(kusk: str) -> str:
-    cleaned = re.sub(r"\s+", " ", normalize_cell_text(kusk)).strip()
-    cleaned = _APOSTROPHES_RE.sub("", cleaned)
-    return trim_to_max(cleaned, 80)
 
 def sanitize_underlag(raw: str) -> str:
     value = normalize_cell_text(raw).lower().strip()
@@ -191,21 +178,6 @@ SAMT_TILL_OVRIGA_RE = re.compile(
 PRISPLACERADE_RE = re.compile(r"\((\d+)\s*prisplacerade\)", re.IGNORECASE)
 LAGST_RE = re.compile(r"Lägst\s+([0-9][0-9\.\s\u00a0]*)\s*kr", re.IGNORECASE)
 
-def _parse_swe_int(token: str) -> Optional[int]:
-    if token is None:
-        return None
-    t = normalize_cell_text(token)
-    t = t.replace("(", "").replace(")", "")
-    t = t.replace("\u00a0", " ")
-    t = t.replace(".", "").replace(" ", "")
-    t = re.sub(r"[^\d]", "", t)
-    if not t:
-        return None
-    try:
-        return int(t)
-    except ValueError:
-        return None
-
 def parse_pris_text(full_text: str) -> Tuple[List[int], Optional[int], Optional[int]]:
     text = normalize_cell_text(full_text)
     if not text:
@@ -214,7 +186,7 @@ def parse_pris_text(full_text: str) -> Tuple[List[int], Optional[int], Optional[
     m0 = PRIS_PREFIX_RE.search(text)
     if not m0:
         ml0 = LAGST_RE.search(text)
-        return [], _parse_swe_int(ml0.group(1)) if ml0 else None, None
+        return [], parse_swe_int(ml0.group(1)) if ml0 else None, None
 
     after = text[m0.end():]
 
@@ -223,7 +195,7 @@ def parse_pris_text(full_text: str) -> Tuple[List[int], Optional[int], Optional[
     if m1:
         leading = m1.group(1)
         for raw_tok in NUMBER_TOKEN_RE.findall(leading):
-            v = _parse_swe_int(raw_tok)
+            v = parse_swe_int(raw_tok)
             if v is not None:
                 prizes.append(v)
 
@@ -238,11 +210,11 @@ def parse_pris_text(full_text: str) -> Tuple[List[int], Optional[int], Optional[
     min_pris = None
     ml = LAGST_RE.search(text)
     if ml:
-        min_pris = _parse_swe_int(ml.group(1))
+        min_pris = parse_swe_int(ml.group(1))
 
     mo = SAMT_TILL_OVRIGA_RE.search(text)
     if mo:
-        extra = _parse_swe_int(mo.group(1))
+        extra = parse_swe_int(mo.group(1))
         if extra is not None:
             min_pris = extra if min_pris is None else max(min_pris, extra)
 
@@ -254,32 +226,6 @@ def pris_for_lopp(prizes: List[int], min_pris: Optional[int]) -> int:
     return int(min_pris) if min_pris is not None else 0
 
 
-FULLNAME_TO_BANKOD = {
-    "ARVIKA": "Ar",  "AXEVALLA": "Ax",  "BERGSÅKER": "B",  "BODEN": "Bo",
-    "BOLLNÄS": "Bs", "DANNERO": "D",   "DALA JÄRNA": "Dj","ESKILSTUNA": "E",
-    "JÄGERSRO": "J", "FÄRJESTAD": "F", "GÄVLE": "G",      "GÖTEBORG TRAV": "Gt",
-    "HAGMYREN": "H", "HALMSTAD": "Hd", "HOTING": "Hg",    "KARLSHAMN": "Kh",
-    "KALMAR": "Kr",  "LINDESBERG": "L","LYCKSELE": "Ly",  "MANTORP": "Mp",
-    "OVIKEN": "Ov",  "ROMME": "Ro",    "RÄTTVIK": "Rä",   "SOLVALLA": "S",
-    "SKELLEFTEÅ": "Sk","SOLÄNGET": "Sä","TINGSRYD": "Ti", "TÄBY TRAV": "Tt",
-    "UMÅKER": "U",   "VEMDALEN": "Vd", "VAGGERYD": "Vg",  "VISBY": "Vi",
-    "ÅBY": "Å",      "ÅMÅL": "Åm",     "ÅRJÄNG": "År",    "ÖREBRO": "Ö",
-    "ÖSTERSUND": "Ös",
-}
-
-def _strip_diacritics(s: str) -> str:
-    return unicodedata.normalize("NFKD", s).encode("ascii", "ignore").decode()
-
-_ASCII_FALLBACK = { _strip_diacritics(k): v for k, v in FULLNAME_TO_BANKOD.items() }
-
-def track_to_bankod(name: str) -> str:
-    name_up = normalize_cell_text(name).upper()
-    if name_up in FULLNAME_TO_BANKOD:
-        return FULLNAME_TO_BANKOD[name_up]
-    name_ascii = _strip_diacritics(name_up)
-    return _ASCII_FALLBACK.get(name_ascii, name_up[:2].title())
-
-
 MONTHS_PATTERN = "|".join(SWEDISH_MONTH.keys())  
 DATE_PART_RX = re.compile(rf"\b(\d{{1,2}})\s+({MONTHS_PATTERN})\s+(\d{{4}})\b", re.I)  
 WEEKDAYS = ("MÅNDAG","TISDAG","ONSDAG","TORSDAG","FREDAG","LÖRDAG","SÖNDAG")  
@@ -379,19 +325,27 @@ async def _extract_pris_text_from_section(section) -> str:
 
 
 async def scrape_page(page, url: str) -> List[Row]:
+    t0 = time.perf_counter()
     try:
-        await page.goto(url, timeout=60_000, wait_until="domcontentloaded")
-    except PlaywrightError:
+        response = await page.goto(url, timeout=60_000, wait_until="domcontentloaded")
+    except PlaywrightError as exc:
+        raise TransientPageError(f"goto failed: {exc}") from exc
+    check_response(response)
+    t0 = lap("goto", t0, kind="results")
+    if page_missing(response):
         return []
 
     try:
         await page.wait_for_selector("div[role='row'][data-rowindex]", timeout=60_000)
         await page.wait_for_selector("xpath=//h2[starts-with(normalize-space(),'Lopp')]", timeout=60_000)
     except PlaywrightError:
+        lap("wait_rows", t0, kind="results")
         return []
+    t0 = lap("wait_rows", t0, kind="results")
 
     texts = await _get_nav_texts(page)  
     track_raw, date_txt = _extract_track_and_date(texts)  
+    t0 = lap("nav", t0, kind="results")
     if not track_raw or not date_txt:  
         logging.info("Nav parse failed. texts=%s", texts)  
         return []  
@@ -496,105 +450,130 @@ async def scrape_page(page, url: str) -> List[Row]:
                 odds=odds,
             ))
 
+    lap("extract", t0, kind="results")
     return data
 
 
+def _apply_row(obj: HorseResult, r: Row) -> List[str]:
+    # Copies what changed from the scraped row onto obj; returns the fields.
+    changed_fields = []
+
+    if obj.nr != r.nr:
+        obj.nr = r.nr
+        changed_fields.append("nr")
+
+    if obj.distans != r.distans:
+        obj.distans = r.distans
+        changed_fields.append("distans")
+
+    if obj.spar != r.spar:
+        obj.spar = r.spar
+        changed_fields.append("spar")
+
+    if obj.placering != r.placering:
+        obj.placering = r.placering
+        changed_fields.append("placering")
+
+    if obj.tid != r.tid:
+        obj.tid = r.tid
+        changed_fields.append("tid")
+
+    incoming_startmetod = (r.startmetod or "").strip()
+    if incoming_startmetod and obj.startmetod != incoming_startmetod:
+        obj.startmetod = incoming_startmetod
+        changed_fields.append("startmetod")
+
+    if obj.galopp != (r.galopp or ""):
+        obj.galopp = (r.galopp or "")
+        changed_fields.append("galopp")
+
+    incoming_underlag = (r.underlag or "").strip().lower()
+    existing_underlag = (obj.underlag or "").strip().lower()
+    if incoming_underlag != existing_underlag:
+        obj.underlag = incoming_underlag
+        changed_fields.append("underlag")
+
+    kusk_clean = normalize_kusk(r.kusk)
+    if obj.kusk != (kusk_clean or ""):
+        obj.kusk = (kusk_clean or "")
+        changed_fields.append("kusk")
+
+    if obj.pris != r.pris:
+        obj.pris = r.pris
+        changed_fields.append("pris")
+
+    incoming_odds = r.odds
+    existing_odds = obj.odds if obj.odds is not None else 999
+    if incoming_odds not in (None, 999) and existing_odds == 999:
+        if obj.odds != int(incoming_odds):
+            obj.odds = int(incoming_odds)
+            changed_fields.append("odds")
+
+    return changed_fields
+
+
 def write_rows_to_db(rows: List[Row]) -> int:
+    # One transaction per page, so the rows and their dirty marks commit
+    # together. The changes are worked out first and the races marked before
+    # any resultat row is written: a refresh holds its dirty rows while it
+    # rewrites resultat, so taking them in the same order cannot deadlock.
     created_n = 0
     updated_n = 0
     unchanged_n = 0
-
-    for r in rows:
-        namn_clean = normalize_name(r.namn)
-
-        try:
-            obj, created = HorseResult.objects.get_or_create(
-                datum=r.datum,
-                bankod=r.bankod,
-                lopp=r.lopp,
-                namn=namn_clean,
-                defaults=dict(
-                    nr=r.nr,
-                    distans=r.distans,
-                    spar=r.spar,
-                    placering=r.placering,
-                    tid=r.tid,
-                    startmetod=r.startmetod,
-                    galopp=r.galopp,
-                    underlag=(r.underlag or ""),
-                    kusk=normalize_kusk(r.kusk),
-                    pris=r.pris,
-                    odds=(r.odds if (r.odds not in (None, 999)) else 999),
-                ),
-            )
-        except IntegrityError as e:
-            logging.exception("DB IntegrityError for (%s,%s,L%s,%s): %s", r.datum, r.bankod, r.lopp, namn_clean, e)
-            continue
-
-        if created:
+    dirty = set()
+
+    with transaction.atomic():
+        plan = []
+        for r in rows:
+            namn_clean = normalize_name(r.namn)
+            obj = HorseResult.objects.filter(datum=r.datum, bankod=r.bankod, lopp=r.lopp, namn=namn_clean).first()
+            changed_fields = None if obj is None else _apply_row(obj, r)
+            if changed_fields == []:
+                unchanged_n += 1
+                continue
+            plan.append((r, namn_clean, obj, changed_fields))
+            dirty.add((r.datum, r.bankod, r.lopp))
+
+        mark_races_dirty(dirty)
+        # The races' tags as the rows stand before the write, plus the page's
+        # names and drivers: a driver taken off a row is evicted too.
+        tags = set(cache.race_tags(dirty))
+        for r, namn_clean, _, _ in plan:
+            tags.update(cache.row_tags(namn_clean, normalize_kusk(r.kusk)))
+        for r, namn_clean, obj, changed_fields in plan:
+            if obj is not None:
+                obj.save(update_fields=changed_fields)
+                updated_n += 1
+                continue
+            try:
+                with transaction.atomic():
+                    HorseResult.objects.create(
+                        datum=r.datum,
+                        bankod=r.bankod,
+                        lopp=r.lopp,
+                        namn=namn_clean,
+                        namn_key=name_key(namn_clean),
+                        nr=r.nr,
+                        distans=r.distans,
+                        spar=r.spar,
+                        placering=r.placering,
+                        tid=r.tid,
+                        startmetod=r.startmetod,
+                        galopp=r.galopp,
+                        underlag=(r.underlag or ""),
+                        kusk=normalize_kusk(r.kusk),
+                        pris=r.pris,
+                        odds=(r.odds if (r.odds not in (None, 999)) else 999),
+                    )
+            except IntegrityError as e:
+                logging.exception("DB IntegrityError for (%s,%s,L%s,%s): %s", r.datum, r.bankod, r.lopp, namn_clean, e)
+                continue
             created_n += 1
-            continue
-
-        changed_fields = []
-
-        if obj.nr != r.nr:
-            obj.nr = r.nr
-            changed_fields.append("nr")
-
-        if obj.distans != r.distans:
-            obj.distans = r.distans
-            changed_fields.append("distans")
-
-        if obj.spar != r.spar:
-            obj.spar = r.spar
-            changed_fields.append("spar")
-
-        if obj.placering != r.placering:
-            obj.placering = r.placering
-            changed_fields.append("placering")
-
-        if obj.tid != r.tid:
-            obj.tid = r.tid
-            changed_fields.append("tid")
-
-        incoming_startmetod = (r.startmetod or "").strip()
-        if incoming_startmetod and obj.startmetod != incoming_startmetod:
-            obj.startmetod = incoming_startmetod
-            changed_fields.append("startmetod")
-
-        if obj.galopp != (r.galopp or ""):
-            obj.galopp = (r.galopp or "")
-            changed_fields.append("galopp")
-
-        incoming_underlag = (r.underlag or "").strip().lower()
-        existing_underlag = (obj.underlag or "").strip().lower()
-        if incoming_underlag != existing_underlag:
-            obj.underlag = incoming_underlag
-            changed_fields.append("underlag")
-
-        kusk_clean = normalize_kusk(r.kusk)
-        if obj.kusk != (kusk_clean or ""):
-            obj.kusk = (kusk_clean or "")
-            changed_fields.append("kusk")
-
-        if obj.pris != r.pris:
-            obj.pris = r.pris
-            changed_fields.append("pris")
-
-        incoming_odds = r.odds
-        existing_odds = obj.odds if obj.odds is not None else 999
-        if incoming_odds not in (None, 999) and existing_odds == 999:
-            if obj.odds != int(incoming_odds):
-                obj.odds = int(incoming_odds)
-                changed_fields.append("odds")
-
-        if changed_fields:
-            obj.save(update_fields=changed_fields)
-            updated_n += 1
-        else:
-            unchanged_n += 1
 
+        cache.invalidate(tags)
     logging.info("  db_created=%d db_updated=%d db_unchanged=%d", created_n, updated_n, unchanged_n)
+    metrics.inc("rows_written_total", created_n, kind="results", op="created")
+    metrics.inc("rows_written_total", updated_n, kind="results", op="updated")
     return created_n + updated_n
 
 
@@ -614,116 +593,33 @@ def _format_ts_id(ts_id: int) -> str:
     return f"{s[:-3]}_{s[-3:]}" if len(s) > 3 else s
 
 
-def _results_ts_id_from_href(href: str) -> Optional[int]:
-    m = re.search(r"/race/raceday/ts(\d+)/results", href or "")
-    return int(m.group(1)) if m else None
-
-
 async def find_first_results_ts_id_for_date(target_day: date) -> Optional[int]:
-    calendar_url = CALENDAR_URL.format(year=target_day.year, month=target_day.month)
-    month_name = SWEDISH_MONTH_BY_NUMBER[target_day.month]
+    return await find_first_ts_id_for_date(target_day, "results", max_scrolls=25)
 
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=True)
-        ctx = await browser.new_context()
-        ctx.set_default_timeout(120_000)
-        page = await ctx.new_page()
 
-        try:
-            await page.goto(calendar_url, timeout=0, wait_until="domcontentloaded")
-            await page.wait_for_selector("h2", timeout=60_000)
-
-            href = None
-            for _ in range(25):
-                href = await page.evaluate(
-                    """
-                    ({ day, monthName }) => {
-                        const normalize = (value) => (value || "")
-                            .normalize("NFKD")
-                            .replace(/\\s+/g, " ")
-                            .trim()
-                            .toLowerCase();
-                        const datePattern = new RegExp(`(?:^|\\\\D)${day}\\\\s+${monthName}(?:\\\\b|$)`, "i");
-                        const headers = Array.from(document.querySelectorAll("h2"));
-                        const index = headers.findIndex((header) => datePattern.test(normalize(header.textContent)));
-                        if (index === -1) {
-                            return null;
-                        }
-
-                        const header = headers[index];
-                        const nextHeader = headers[index + 1] || null;
-                        const links = Array.from(document.querySelectorAll("a[href*='/race/raceday/ts'][href*='/results']"));
-                        const before = (left, right) => Boolean(left.compareDocumentPosition(right) & Node.DOCUMENT_POSITION_FOLLOWING);
-
-                        for (const link of links) {
-                            if (!before(header, link)) {
-                                continue;
-                            }
-                            if (nextHeader && !before(link, nextHeader)) {
-                                continue;
-                            }
-                            return link.getAttribute("href");
-                        }
-
-                        return null;
-                    }
-                    """,
-                    {"day": target_day.day, "monthName": month_name},
-                )
-                if href:
-                    break
-                await page.mouse.wheel(0, 2500)
-                await page.wait_for_timeout(250)
-
-        except PlaywrightError:
-            href = None
-        finally:
-            await ctx.close()
-            await browser.close()
-
-    if not href:
-        return None
+async def run_ids(ts_ids, browser=None, concurrency: int = 1, on_done=None) -> int:
+    total_scraped = 0
 
-    full_href = urljoin("https://sportapp.travsport.se", href)
-    return _results_ts_id_from_href(full_href)
+    async def handle(page, ts_id: int):
+        nonlocal total_scraped
+        url = RESULTS_URL.format(ts_id)
+        logging.info("Scraping %s", url)
 
+        rows = await scrape_page(page, url)
+        if not rows:
+            logging.info("  no rows")
+            return 0
 
-async def run_range(start_id: int, end_id: int) -> int:
-    base = "https://sportapp.travsport.se/race/raceday/ts{}/results/all"
-    total_scraped = 0
+        total_scraped += len(rows)
+        await asyncio.to_thread(timed_db_call, "results", write_rows_to_db, rows)
+        return len(rows)
 
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=True)
-        ctx = await browser.new_context()
-        ctx.set_default_timeout(120_000)
-        page = await ctx.new_page()
+    await crawl(ts_ids, handle, browser=browser, concurrency=concurrency, on_done=on_done, kind="results")
+    return total_scraped
 
-        try:
-            for ts_id in range(start_id, end_id + 1):
-                url = base.format(ts_id)
-                logging.info("Scraping %s", url)
-
-                try:
-                    rows = await scrape_page(page, url)
-                except PlaywrightError as exc:
-                    logging.warning("  failed: %s", exc)
-                    continue
-                except Exception as exc:
-                    logging.warning("  failed: %s", exc)
-                    continue
-
-                if not rows:
-                    logging.info("  no rows")
-                    continue
-
-                total_scraped += len(rows)
-                await asyncio.to_thread(write_rows_to_db, rows)
-
-        finally:
-            await ctx.close()
-            await browser.close()
 
-    return total_scraped
+async def run_range(start_id: int, end_id: int, browser=None, concurrency: int = 1) -> int:
+    return await run_ids(range(start_id, end_id + 1), browser=browser, concurrency=concurrency)
 
 class Command(BaseCommand):
     help = "Scrape Result from the calendar ts-ID 5 days back, or from manual ts-ID options"
@@ -765,6 +661,13 @@ class Command(BaseCommand):
             type=_parse_iso_date,
             help="Find the first Resultat ts-ID from this date instead of using --days-back. Use YYYY-MM-DD.",
         )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=1,
+            help="How many raceday pages to scrape at the same time in one browser.",
+        )
+        add_profile_arguments(parser)
 
     def _resolve_id_range(self, opts):
         ids_after_start = opts["ids_after_start"]
@@ -798,6 +701,11 @@ class Command(BaseCommand):
         return resolved_start_id, resolved_start_id + ids_after_start, f"calendar date {target_day.isoformat()}"
 
     def handle(self, *args, **opts):
+        if opts["concurrency"] < 1:
+            raise CommandError("--concurrency must be 1 or greater.")
+        if opts["profile_traces"] < 0:
+            raise CommandError("--profile-traces must be 0 or greater.")
+
         start_id, end_id, source = self._resolve_id_range(opts)
         if end_id < start_id:
             raise CommandError("END_ID must be greater than or equal to START_ID.")
@@ -809,5 +717,7 @@ class Command(BaseCommand):
             _format_ts_id(end_id),
         )
 
-        total = asyncio.run(run_range(start_id, end_id))
+        with recorded_run("scrape_results", opts, start_id, end_id), \
+                profiled("scrape_results", opts["profile"], opts["profile_traces"]):
+            total = asyncio.run(run_range(start_id, end_id, concurrency=opts["concurrency"]))
         self.stdout.write(self.style.SUCCESS(f"Done. {total} rows scraped & processed."))
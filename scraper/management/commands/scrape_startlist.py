@@ -1,12 +1,22 @@
-import asyncio, re, unicodedata, logging
+import asyncio, re, logging, time
 from dataclasses import dataclass
 from typing import List, Optional
-from datetime import date, timedelta
-from urllib.parse import urljoin
+from datetime import date, time as dt_time, timedelta
+from django.db import transaction
 from django.utils import timezone
-from playwright.async_api import async_playwright, Error as PlaywrightError
+from playwright.async_api import Error as PlaywrightError
 from django.core.management.base import BaseCommand, CommandError
 from scraper.models import StartList, HorseResult
+from scraper.crawl import SPORTAPP_BASE, crawl
+from scraper.throttle import TransientPageError, check_response, page_missing
+from scraper.race_calendar import find_first_ts_id_for_date
+from scraper.dirty import mark_races_dirty
+from scraper import cache
+from scraper.ledger import recorded_run
+from scraper.profiling import add_profile_arguments, profiled
+from scraper.instrumentation import lap, metrics, timed_db_call
+from scraper.tracks import NAV_PREFIXES, strip_nav_prefixes, track_to_bankod
+from scraper.normalize import name_key, normalize_cell_text, normalize_startlista_kusk, normalize_startlista_name
 
 logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
 
@@ -16,8 +26,7 @@ SWEDISH_MONTH = {
     "JUNI": 6, "JULI": 7, "AUGUSTI": 8, "SEPTEMBER": 9, "OKTOBER": 10,
     "NOVEMBER": 11, "DECEMBER": 12,
 }
-SWEDISH_MONTH_BY_NUMBER = {v: k.lower() for k, v in SWEDISH_MONTH.items()}
-CALENDAR_URL = "https://sportapp.travsport.se/race/calendar/race?year={year}&competition=SPORT&month={month:02d}"
+STARTLIST_URL = SPORTAPP_BASE + "/race/raceday/ts{}/startlist/all"
 
 def swedish_date_to_yyyymmdd(txt: str) -> str:
     p = (txt or "").strip().upper().split()
@@ -25,38 +34,17 @@ def swedish_date_to_yyyymmdd(txt: str) -> str:
     return f"{int(y):04d}{SWEDISH_MONTH[m]:02d}{int(d):02d}"
 
 
-def normalize_cell_text(s: str) -> str:
-    if s is None:
-        return ""
-    return s.replace("\u00a0", " ").strip()
-
-def trim_to_max(s: str, max_len: int) -> str:
-    s = s or ""
-    return s if len(s) <= max_len else s[:max_len]
-
-_paren_re = re.compile(r"\([^)]*\)")
-
-def normalize_startlista_name(name: str) -> str:
-    cleaned = normalize_cell_text(name)
-
-    cleaned = cleaned.replace("*", "")
-    cleaned = cleaned.replace("'", "").replace("’", "")
-    cleaned = _paren_re.sub("", cleaned)
-
-    if len(cleaned) >= 7:
-        cleaned = cleaned[:-7]
-
-    cleaned = cleaned.rstrip()
-    cleaned = cleaned.upper()
-
-    return trim_to_max(cleaned, 50)
+dist_re = re.compile(r"\s*(\d+)\s*/\s*([\d,]+)", re.I)
 
-def normalize_kusk(kusk: str, max_len: int) -> str:
-    cleaned = re.sub(r"\s+", " ", normalize_cell_text(kusk)).strip()
-    return trim_to_max(cleaned, max_len)
+# Only "HH:MM": with a dot, km-times like 1.14,5 would read as 01:14.
+starttid_re = re.compile(r"\b([01]?\d|2[0-3]):([0-5]\d)\b")
 
+def parse_starttid(txt: str) -> Optional[dt_time]:
+    m = starttid_re.search(normalize_cell_text(txt))
+    if not m:
+        return None
+    return dt_time(int(m.group(1)), int(m.group(2)))
 
-dist_re = re.compile(r"\s*(\d+)\s*/\s*([\d,]+)", re.I)
 
 def parse_dist_spar(txt: str):
     t = normalize_cell_text(txt)
@@ -68,66 +56,6 @@ def parse_dist_spar(txt: str):
     return dist, spar
 
 
-def _strip(s: str) -> str:
-    return unicodedata.normalize("NFKD", s).encode("ascii", "ignore").decode()
-
-FULLNAME_TO_BANKOD = {
-    "ARVIKA":"Ar","AXEVALLA":"Ax","BERGSÅKER":"B","BODEN":"Bo","BOLLNÄS":"Bs",
-    "DANNERO":"D","DALA JÄRNA":"Dj","ESKILSTUNA":"E","JÄGERSRO":"J","FÄRJESTAD":"F",
-    "GÄVLE":"G","GÖTEBORG TRAV":"Gt","HAGMYREN":"H","HALMSTAD":"Hd","HOTING":"Hg",
-    "KARLSHAMN":"Kh","KALMAR":"Kr","LINDESBERG":"L","LYCKSELE":"Ly","MANTORP":"Mp",
-    "OVIKEN":"Ov","ROMME":"Ro","RÄTTVIK":"Rä","SOLVALLA":"S","SKELLEFTEÅ":"Sk",
-    "SOLÄNGET":"Sä","TINGSRYD":"Ti","TÄBY TRAV":"Tt","UMÅKER":"U","VEMDALEN":"Vd",
-    "VAGGERYD":"Vg","VISBY":"Vi","ÅBY":"Å","ÅMÅL":"Åm","ÅRJÄNG":"År",
-    "ÖREBRO":"Ö","ÖSTERSUND":"Ös","BJÄRKE":"Bj",
-}
-FULLNAME_TO_BANKOD |= {_strip(k): v for k, v in FULLNAME_TO_BANKOD.items()}
-
-def track_to_bankod(n: str) -> str:
-    n = normalize_cell_text(n).upper().strip()  
-    n = _strip_nav_prefixes(n)  
-    if not n:  
-        return ""  
-
-    hit = FULLNAME_TO_BANKOD.get(n)  
-    if hit:  
-        return hit  
-
-    n_ascii = _strip(n)  
-    hit2 = FULLNAME_TO_BANKOD.get(n_ascii)  
-    if hit2:  
-        return hit2  
-
-    fallback = n[:2].title()  
-    logging.warning("Unknown track name=%r (ascii=%r). Using fallback bankod=%r", n, n_ascii, fallback)  
-    return fallback  
-
-NAV_PREFIXES = (  
-    "TÄVLINGSDAGSRESULTAT",  
-    "DAGSRESULTAT",          
-    "STARTLISTA",            
-    "TÄVLINGSDAG",           
-    "TRAVTÄVLING",           
-    "DAG",                   
-)  
-
-def _strip_nav_prefixes(up: str) -> str:  
-    s = (up or "").strip()  
-    changed = True  
-    while changed and s:  
-        changed = False  
-        for p in NAV_PREFIXES:  
-            if s == p:  
-                s = ""  
-                changed = True  
-                break  
-            if s.startswith(p + " "):  
-                s = s[len(p):].strip()  
-                changed = True  
-                break  
-    return s  
-
-
 MONTHS_PATTERN = "|".join(SWEDISH_MONTH.keys())  
 DATE_PART_RX = re.compile(rf"\b(\d{{1,2}})\s+({MONTHS_PATTERN})\s+(\d{{4}})\b", re.I)  
 WEEKDAYS = ("MÅNDAG","TISDAG","ONSDAG","TORSDAG","FREDAG","LÖRDAG","SÖNDAG")  
@@ -171,7 +99,7 @@ def _extract_track_and_date(texts):
             continue  
 
         up = t.upper().strip()  
-        up = _strip_nav_prefixes(up)  
+        up = strip_nav_prefixes(up)  
         if not up:  
             continue  
 
@@ -187,7 +115,7 @@ def _extract_track_and_date(texts):
         up = WEEKDAYS_RX.sub(" ", up)  
         up = re.sub(r"\s+", " ", up).strip()  
 
-        up = _strip_nav_prefixes(up)  
+        up = strip_nav_prefixes(up)  
         track_txt = re.sub(r"\s+", " ", up).strip()  
 
     return track_txt, date_part  
@@ -203,110 +131,117 @@ class StartRow:
     distans: Optional[int]
     kusk: str
     struken: bool
+    starttid: Optional[dt_time] = None
+    ts_id: Optional[int] = None
 
 
-async def scrape_startlist(url: str) -> List[StartRow]:
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=True)
-        ctx = await browser.new_context()
-        ctx.set_default_timeout(120_000)
-        page = await ctx.new_page()
-
-        try:
-            await page.goto(url, timeout=0, wait_until="domcontentloaded")  
-        except PlaywrightError:
-            await browser.close()
-            return []
-
-        try:
-            await page.wait_for_selector("div[role='row'][data-rowindex]", timeout=60_000)  
-            await page.wait_for_selector("xpath=//h2[starts-with(normalize-space(),'Lopp')]", timeout=60_000)  
-        except PlaywrightError:
-            await browser.close()
-            return []
-
-        texts = await _get_nav_texts(page)  
-        raw_track, date_txt = _extract_track_and_date(texts)  
-        if not raw_track or not date_txt:  
-            logging.info("Nav parse failed. texts=%s", texts)  
-            await browser.close()
-            return []  
-
-        bankod = track_to_bankod(raw_track)  
-        startdatum = int(swedish_date_to_yyyymmdd(date_txt))  
-
-        out: List[StartRow] = []
-        lopp_headers = page.locator("//h2[starts-with(normalize-space(),'Lopp')]")
-        for i in range(await lopp_headers.count()):
-            header = lopp_headers.nth(i)
-            await header.scroll_into_view_if_needed()  
-
-            m = re.search(r"Lopp\s+(\d+)", normalize_cell_text(await header.inner_text()))
-            if not m:
-                continue
-            lopp_nr = int(m.group(1))
-
-            grid = header.locator("xpath=following::div[contains(@class,'MuiDataGrid-root')][1]")  
-            rows = await grid.locator("div[role='row'][data-rowindex]").all()  
-            if not rows:
-                logging.info("Lopp %s: inga rader, hoppar över", lopp_nr)
-                continue
-
-            for row in rows:
-                cell = lambda f: row.locator(f"div[data-field='{f}']")
-
-                # Startlista använder mobilehorse??????????????
-                horse_cell = cell("mobilehorse")  
-                if await horse_cell.count() == 0:  
-                    horse_cell = cell("horse")  
-
-                is_struken = (await horse_cell.locator("[class*='linethrough']").count()) > 0  
+async def scrape_startlist_page(page, url: str) -> List[StartRow]:
+    t0 = time.perf_counter()
+    try:
+        response = await page.goto(url, timeout=60_000, wait_until="domcontentloaded")  
+    except PlaywrightError as exc:
+        raise TransientPageError(f"goto failed: {exc}") from exc
+    check_response(response)
+    t0 = lap("goto", t0, kind="startlist")
+    if page_missing(response):
+        return []
 
+    try:
+        await page.wait_for_selector("div[role='row'][data-rowindex]", timeout=60_000)  
+        await page.wait_for_selector("xpath=//h2[starts-with(normalize-space(),'Lopp')]", timeout=60_000)  
+    except PlaywrightError:
+        lap("wait_rows", t0, kind="startlist")
+        return []
+    t0 = lap("wait_rows", t0, kind="startlist")
+
+    texts = await _get_nav_texts(page)  
+    raw_track, date_txt = _extract_track_and_date(texts)  
+    t0 = lap("nav", t0, kind="startlist")
+    if not raw_track or not date_txt:  
+        logging.info("Nav parse failed. texts=%s", texts)  
+        return []  
+
+    bankod = track_to_bankod(raw_track)  
+    startdatum = int(swedish_date_to_yyyymmdd(date_txt))  
+
+    out: List[StartRow] = []
+    lopp_headers = page.locator("//h2[starts-with(normalize-space(),'Lopp')]")
+    for i in range(await lopp_headers.count()):
+        header = lopp_headers.nth(i)
+        await header.scroll_into_view_if_needed()  
+
+        m = re.search(r"Lopp\s+(\d+)", normalize_cell_text(await header.inner_text()))
+        if not m:
+            continue
+        lopp_nr = int(m.group(1))
+
+        info_section = header.locator("xpath=ancestor::div[contains(@class,'MuiBox-root')][1]")
+        starttid = parse_starttid(normalize_cell_text(await header.inner_text()))
+        if starttid is None and await info_section.count() > 0:
+            starttid = parse_starttid(normalize_cell_text(await info_section.first.inner_text()))
+
+        grid = header.locator("xpath=following::div[contains(@class,'MuiDataGrid-root')][1]")  
+        rows = await grid.locator("div[role='row'][data-rowindex]").all()  
+        if not rows:
+            logging.info("Lopp %s: inga rader, hoppar över", lopp_nr)
+            continue
+
+        for row in rows:
+            cell = lambda f: row.locator(f"div[data-field='{f}']")
+
+            # Startlista använder mobilehorse??????????????
+            horse_cell = cell("mobilehorse")  
+            if await horse_cell.count() == 0:  
+                horse_cell = cell("horse")  
+
+            is_struken = (await horse_cell.locator("[class*='linethrough']").count()) > 0  
+
+            nr = None  
+            try:  
+                nr_txt = normalize_cell_text(await horse_cell.locator("div").first.inner_text())  
+                nr_m = re.search(r"\d+", nr_txt)  
+                if nr_m:  
+                    nr = int(nr_m.group(0))  
+            except Exception:  
                 nr = None  
-                try:  
-                    nr_txt = normalize_cell_text(await horse_cell.locator("div").first.inner_text())  
-                    nr_m = re.search(r"\d+", nr_txt)  
-                    if nr_m:  
-                        nr = int(nr_m.group(0))  
-                except Exception:  
-                    nr = None  
-
-                if nr is None:  
-                    horse_text = normalize_cell_text(await horse_cell.inner_text())  
-                    nr_m = re.search(r"\b(\d{1,2})\b", horse_text)  
-                    if not nr_m:  
-                        continue  
-                    nr = int(nr_m.group(1))  
-
-                namn_raw = ""  
-                if await horse_cell.locator("span").count() > 0:  
-                    namn_raw = normalize_cell_text(await horse_cell.locator("span").first.inner_text())  
-                if not namn_raw:  
-                    horse_text = normalize_cell_text(await horse_cell.inner_text())  
-                    namn_raw = re.sub(r"^\s*\d+\s*", "", horse_text).strip()  
-
-                namn = normalize_startlista_name(namn_raw)
-
-                kusk_raw = normalize_cell_text(await cell("driver").inner_text())
-                kusk = normalize_kusk(kusk_raw, 120)
-
-                dist_raw = normalize_cell_text(await cell("trackName").inner_text())
-                distans, spar = parse_dist_spar(dist_raw)
-
-                out.append(StartRow(
-                    startdatum=startdatum,
-                    bankod=bankod,
-                    lopp=lopp_nr,
-                    nr=nr,
-                    namn=namn,
-                    spar=spar,
-                    distans=distans,
-                    kusk=kusk,
-                    struken=is_struken,
-                ))
-
-        await browser.close()
-        return out
+
+            if nr is None:  
+                horse_text = normalize_cell_text(await horse_cell.inner_text())  
+                nr_m = re.search(r"\b(\d{1,2})\b", horse_text)  
+                if not nr_m:  
+                    continue  
+                nr = int(nr_m.group(1))  
+
+            namn_raw = ""  
+            if await horse_cell.locator("span").count() > 0:  
+                namn_raw = normalize_cell_text(await horse_cell.locator("span").first.inner_text())  
+            if not namn_raw:  
+                horse_text = normalize_cell_text(await horse_cell.inner_text())  
+                namn_raw = re.sub(r"^\s*\d+\s*", "", horse_text).strip()  
+
+            namn = normalize_startlista_name(namn_raw)
+
+            kusk_raw = normalize_cell_text(await cell("driver").inner_text())
+            kusk = normalize_startlista_kusk(kusk_raw, 120)
+
+            dist_raw = normalize_cell_text(await cell("trackName").inner_text())
+            distans, spar = parse_dist_spar(dist_raw)
+
+            out.append(StartRow(
+                startdatum=startdatum,
+                bankod=bankod,
+                lopp=lopp_nr,
+                nr=nr,
+                namn=namn,
+                spar=spar,
+                distans=distans,
+                kusk=kusk,
+                struken=is_struken,
+                starttid=starttid,
+            ))
+
+    lap("extract", t0, kind="startlist")
+    return out
 
 def _today_yyyymmdd() -> int:
     d: date = timezone.localdate()
@@ -329,103 +264,15 @@ def _format_ts_id(ts_id: int) -> str:
     return f"{s[:-3]}_{s[-3:]}" if len(s) > 3 else s
 
 
-def _startlist_ts_id_from_href(href: str) -> Optional[int]:
-    m = re.search(r"/race/raceday/ts(\d+)/startlist", href or "")
-    return int(m.group(1)) if m else None
-
-
 async def find_first_startlist_ts_id_for_date(target_day: date) -> Optional[int]:
-    calendar_url = CALENDAR_URL.format(year=target_day.year, month=target_day.month)
-    month_name = SWEDISH_MONTH_BY_NUMBER[target_day.month]
-
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=True)
-        ctx = await browser.new_context()
-        ctx.set_default_timeout(120_000)
-        page = await ctx.new_page()
-
-        try:
-            await page.goto(calendar_url, timeout=0, wait_until="domcontentloaded")
-            await page.wait_for_selector("h2", timeout=60_000)
-
-            href = None
-            for _ in range(30):
-                href = await page.evaluate(
-                    """
-                    ({ day, monthName }) => {
-                        const normalize = (value) => (value || "")
-                            .normalize("NFKD")
-                            .replace(/\\s+/g, " ")
-                            .trim()
-                            .toLowerCase();
-                        const datePattern = new RegExp(`(?:^|\\\\D)${day}\\\\s+${monthName}(?:\\\\b|$)`, "i");
-                        const headers = Array.from(document.querySelectorAll("h2"));
-                        const index = headers.findIndex((header) => datePattern.test(normalize(header.textContent)));
-                        if (index === -1) {
-                            return null;
-                        }
-
-                        const header = headers[index];
-                        const nextHeader = headers[index + 1] || null;
-                        const links = Array.from(document.querySelectorAll("a[href*='/race/raceday/ts'][href*='/startlist']"));
-                        const before = (left, right) => Boolean(left.compareDocumentPosition(right) & Node.DOCUMENT_POSITION_FOLLOWING);
-
-                        for (const link of links) {
-                            if (!before(header, link)) {
-                                continue;
-                            }
-                            if (nextHeader && !before(link, nextHeader)) {
-                                continue;
-                            }
-                            return link.getAttribute("href");
-                        }
-
-                        return null;
-                    }
-                    """,
-                    {"day": target_day.day, "monthName": month_name},
-                )
-                if href:
-                    break
-                await page.mouse.wheel(0, 2500)
-                await page.wait_for_timeout(250)
-
-        except PlaywrightError:
-            href = None
-        finally:
-            await ctx.close()
-            await browser.close()
-
-    if not href:
-        return None
+    return await find_first_ts_id_for_date(target_day, "startlist", max_scrolls=30)
 
-    full_href = urljoin("https://sportapp.travsport.se", href)
-    return _startlist_ts_id_from_href(full_href)
-
-
-def upsert_resultat_from_startrow(r: StartRow):
-    namn_clean = r.namn
-    kusk_res = normalize_kusk(r.kusk, 80)
 
+def _apply_startrow(obj: HorseResult, r: StartRow) -> List[str]:
+    # Copies what changed from the startlist row onto an existing resultat
+    # row; returns the fields. A placing from the results page is kept.
+    kusk_res = normalize_startlista_kusk(r.kusk, 80)
     desired_placering = 99 if r.struken else 0
-
-    obj, created = HorseResult.objects.get_or_create(
-        datum=r.startdatum,
-        bankod=r.bankod,
-        lopp=r.lopp,
-        namn=namn_clean,
-        defaults=dict(
-            nr=r.nr,
-            distans=r.distans,
-            spar=r.spar,
-            kusk=kusk_res,
-            placering=desired_placering,
-        ),
-    )
-
-    if created:
-        return
-
     changed_fields = []
 
     if obj.nr != r.nr:
@@ -449,8 +296,112 @@ def upsert_resultat_from_startrow(r: StartRow):
             obj.placering = desired_placering
             changed_fields.append("placering")
 
-    if changed_fields:
+    return changed_fields
+
+
+def _save_resultat(r: StartRow, obj: Optional[HorseResult], changed_fields: List[str]) -> None:
+    if obj is not None:
         obj.save(update_fields=changed_fields)
+        return
+    # get_or_create: a results scrape may have added the row meanwhile.
+    HorseResult.objects.get_or_create(
+        datum=r.startdatum,
+        bankod=r.bankod,
+        lopp=r.lopp,
+        namn=r.namn,
+        defaults=dict(
+            namn_key=name_key(r.namn),
+            nr=r.nr,
+            distans=r.distans,
+            spar=r.spar,
+            kusk=normalize_startlista_kusk(r.kusk, 80),
+            placering=99 if r.struken else 0,
+        ),
+    )
+
+
+def write_startlist_rows(rows: List[StartRow], today_int: int) -> int:
+    # One transaction per page, so the rows and their dirty marks commit
+    # together. As in scrape_results, the races are marked before any
+    # resultat row is written, the order a refresh takes them in.
+    total_resultat = 0
+    created_n = 0
+    dirty = set()
+    with transaction.atomic():
+        plan = []
+        for r in rows:
+            if r.startdatum < today_int:
+                continue
+            total_resultat += 1
+            obj = HorseResult.objects.filter(
+                datum=r.startdatum, bankod=r.bankod, lopp=r.lopp, namn=r.namn,
+            ).first()
+            changed_fields = None if obj is None else _apply_startrow(obj, r)
+            if changed_fields != []:
+                plan.append((r, obj, changed_fields))
+                dirty.add((r.startdatum, r.bankod, r.lopp))
+
+        mark_races_dirty(dirty)
+        # Tagged before the write, as in scrape_results, so a replaced driver
+        # is evicted too. Every day written, not only those whose resultat
+        # rows changed: the startlista rows themselves may have.
+        tags = set(cache.race_tags(dirty)) | {cache.raceday_tag(r.startdatum) for r in rows}
+        for r, _, _ in plan:
+            tags.update(cache.row_tags(r.namn, normalize_startlista_kusk(r.kusk, 80)))
+        for r in rows:
+            _, created = StartList.objects.update_or_create(
+                startdatum=r.startdatum,
+                bankod=r.bankod,
+                lopp=r.lopp,
+                nr=r.nr,
+                defaults=dict(
+                    namn=r.namn,
+                    namn_key=name_key(r.namn),
+                    spar=r.spar,
+                    distans=r.distans,
+                    kusk=normalize_startlista_kusk(r.kusk, 120),
+                    starttid=r.starttid,
+                    ts_id=r.ts_id,
+                ),
+            )
+            created_n += created
+        for r, obj, changed_fields in plan:
+            _save_resultat(r, obj, changed_fields)
+
+        cache.invalidate(tags)
+    metrics.inc("rows_written_total", created_n, kind="startlist", op="created")
+    metrics.inc("rows_written_total", len(rows) - created_n, kind="startlist", op="updated")
+    return total_resultat
+
+
+async def run_ids(ts_ids, browser=None, concurrency: int = 1, on_done=None):
+    total = 0
+    total_resultat = 0
+    today_int = _today_yyyymmdd()
+
+    async def handle(page, ts: int):
+        nonlocal total, total_resultat
+        url = STARTLIST_URL.format(ts)
+        logging.info("Scraping %s", url)
+
+        rows = await scrape_startlist_page(page, url)
+        if not rows:
+            logging.info("  no rows")
+            return 0
+        for r in rows:
+            r.ts_id = ts
+
+        n_resultat = await asyncio.to_thread(timed_db_call, "startlist", write_startlist_rows, rows, today_int)
+        total += len(rows)
+        total_resultat += n_resultat
+        logging.info(
+            "  inserted/updated %d startlista rows (+%d resultat upserts, today=%d)",
+            len(rows), n_resultat, today_int
+        )
+        return len(rows)
+
+    await crawl(ts_ids, handle, browser=browser, concurrency=concurrency, on_done=on_done, kind="startlist")
+    return total, total_resultat
 
 
 class Command(BaseCommand):
@@ -486,6 +437,13 @@ class Command(BaseCommand):
             type=_parse_iso_date,
             help="Find the first Startlista ts-ID from this date instead of yesterday. Use YYYY-MM-DD.",
         )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=1,
+            help="How many raceday pages to scrape at the same time in one browser.",
+        )
+        add_profile_arguments(parser)
 
     def _resolve_id_range(self, opts):
         ids_after_start = opts["ids_after_start"]
@@ -515,10 +473,10 @@ class Command(BaseCommand):
         return resolved_start_id, resolved_start_id + ids_after_start, f"calendar date {target_day.isoformat()}"
 
     def handle(self, *args, **kwargs):
-        base = "https://sportapp.travsport.se/race/raceday/ts{}/startlist/all"
-        total = 0
-        total_resultat = 0
-        today_int = _today_yyyymmdd()
+        if kwargs["concurrency"] < 1:
+            raise CommandError("--concurrency must be 1 or greater.")
+        if kwargs["profile_traces"] < 0:
+            raise CommandError("--profile-traces must be 0 or greater.")
 
         start_id, end_id, source = self._resolve_id_range(kwargs)
         if end_id < start_id:
@@ -531,42 +489,10 @@ class Command(BaseCommand):
             _format_ts_id(end_id),
         )
 
-        for ts in range(start_id, end_id + 1):
-            url = base.format(ts)
-            logging.info("Scraping %s", url)
-
-            try:
-                rows = asyncio.run(scrape_startlist(url))
-            except Exception as exc:
-                logging.warning("  failed: %s", exc)
-                continue
-
-            if not rows:
-                logging.info("  no rows")
-                continue
-
-            for r in rows:
-                StartList.objects.update_or_create(
-                    startdatum=r.startdatum,
-                    bankod=r.bankod,
-                    lopp=r.lopp,
-                    nr=r.nr,
-                    defaults=dict(
-                        namn=r.namn,
-                        spar=r.spar,
-                        distans=r.distans,
-                        kusk=normalize_kusk(r.kusk, 120),
-                    ),
-                )
-
-                if r.startdatum >= today_int:
-                    upsert_resultat_from_startrow(r)
-                    total_resultat += 1
-
-            total += len(rows)
-            logging.info(
-                "  inserted/updated %d startlista rows (+%d resultat upserts, today=%d)",
-                len(rows), total_resultat, today_int
+        with recorded_run("scrape_startlist", kwargs, start_id, end_id), \
+                profiled("scrape_startlist", kwargs["profile"], kwargs["profile_traces"]):
+            total, total_resultat = asyncio.run(
+                run_ids(range(start_id, end_id + 1), concurrency=kwargs["concurrency"])
             )
 
         self.stdout.write(self.style.SUCCESS(
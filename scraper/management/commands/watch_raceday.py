@@ -0,0 +1,249 @@
+import asyncio, logging, time
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+
+from scraper import derived, dirty
+from scraper.crawl import open_browser, open_page
+from scraper.ledger import recorded_run
+from scraper.models import StartList
+from scraper.throttle import TransientPageError
+from scraper.management.commands.scrape_results import RESULTS_URL, scrape_page, write_rows_to_db
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+
+
+def _parse_iso_date(value: str) -> date:
+    try:
+        return date.fromisoformat(value)
+    except ValueError as exc:
+        raise ValueError(f"Invalid date {value!r}. Use YYYY-MM-DD.") from exc
+
+
+def _parse_hh_mm(value: str):
+    try:
+        return datetime.strptime(value, "%H:%M").time()
+    except ValueError as exc:
+        raise ValueError(f"Invalid time {value!r}. Use HH:MM.") from exc
+
+
+@dataclass
+class WatchedRace:
+    ts_id: int
+    bankod: str
+    lopp: int
+    starts_at: datetime
+    next_poll: datetime
+    delay: float
+    signature: Optional[tuple] = None
+    final_at: Optional[datetime] = None
+
+
+def load_races(day: date, tz: ZoneInfo, grace: timedelta, poll_seconds: float, now: datetime) -> List[WatchedRace]:
+    # One entry per race on the day's startlist. Races without a parsed start time
+    # are watched from now on; backoff keeps them cheap until results show up.
+    qs = (
+        StartList.objects.filter(startdatum=int(day.strftime("%Y%m%d")), ts_id__isnull=False)
+        .values_list("ts_id", "bankod", "lopp", "starttid")
+        .distinct()
+        .order_by("ts_id", "lopp")
+    )
+    races: Dict[tuple, WatchedRace] = {}
+    for ts_id, bankod, lopp, starttid in qs:
+        starts_at = datetime.combine(day, starttid, tzinfo=tz) if starttid else now
+        key = (ts_id, lopp)
+        if key in races and races[key].starts_at <= starts_at:
+            continue
+        races[key] = WatchedRace(ts_id, bankod, lopp, starts_at, max(now, starts_at + grace), poll_seconds)
+    return list(races.values())
+
+
+def is_final(rows) -> bool:
+    # The results grid shows an empty placing until the race has been run and
+    # confirmed; scratched and disqualified horses map to a number as well.
+    return bool(rows) and all(r.placering is not None for r in rows)
+
+
+def signature(rows) -> tuple:
+    return tuple(sorted((r.nr, r.namn, r.placering, r.tid, r.galopp, r.odds, r.kusk) for r in rows))
+
+
+class Command(BaseCommand):
+    help = "Watch today's racedays from the startlist and write results for each race as soon as they are published."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--date",
+            type=_parse_iso_date,
+            help="Watch this date instead of today. Use YYYY-MM-DD.",
+        )
+        parser.add_argument(
+            "--poll-seconds",
+            type=float,
+            default=60.0,
+            help="How often to poll a race whose results are still coming in.",
+        )
+        parser.add_argument(
+            "--max-poll-seconds",
+            type=float,
+            default=600.0,
+            help="Upper bound for the poll interval when a race's results do not change.",
+        )
+        parser.add_argument(
+            "--grace-minutes",
+            type=float,
+            default=3.0,
+            help="How long after the start time to wait before the first poll.",
+        )
+        parser.add_argument(
+            "--final-recheck-minutes",
+            type=float,
+            default=15.0,
+            help="When to look at a final race once more for late corrections before dropping it.",
+        )
+        parser.add_argument(
+            "--until",
+            type=_parse_hh_mm,
+            help="Stop at this local time even if races are still open. Use HH:MM.",
+        )
+        parser.add_argument(
+            "--refresh",
+            action="store_true",
+            help="Refresh the derived metrics of changed races after every poll round.",
+        )
+
+    @staticmethod
+    def _back_off(due: List[WatchedRace], now: datetime, opts) -> None:
+        for race in due:
+            race.delay = min(opts["max_poll_seconds"], race.delay * 2)
+            race.next_poll = now + timedelta(seconds=race.delay)
+
+    async def _poll_raceday(self, page, ts_id: int, due: List[WatchedRace], now: datetime, opts) -> int:
+        # Nothing that goes wrong with one raceday may stop the watch of the
+        # others: every failure backs this raceday off and is retried.
+        url = RESULTS_URL.format(ts_id)
+        try:
+            rows = await scrape_page(page, url)
+        except (TransientPageError, PlaywrightTimeoutError) as exc:
+            logging.warning("  ts%s: %s; backing off", ts_id, exc)
+            self._back_off(due, now, opts)
+            return 0
+        except Exception:
+            logging.exception("  ts%s: scraping failed; backing off", ts_id)
+            self._back_off(due, now, opts)
+            return 0
+
+        by_lopp: Dict[int, list] = {}
+        for r in rows:
+            by_lopp.setdefault(r.lopp, []).append(r)
+
+        changed = []
+        for race in due:
+            race_rows = by_lopp.get(race.lopp, [])
+            sig = signature(race_rows)
+            race_changed = bool(race_rows) and sig != race.signature
+            if race_changed:
+                race.signature = sig
+                race.delay = opts["poll_seconds"]
+                changed.extend(race_rows)
+            else:
+                race.delay = min(opts["max_poll_seconds"], race.delay * 2)
+
+            if is_final(race_rows):
+                if race.final_at is None or race_changed:
+                    # Newly final, or corrected after being final: one more look later.
+                    race.final_at = now
+                    race.next_poll = now + timedelta(minutes=opts["final_recheck_minutes"])
+                    logging.info("  %s L%d final", race.bankod, race.lopp)
+                    continue
+                race.next_poll = None
+                continue
+            race.next_poll = now + timedelta(seconds=race.delay)
+
+        # Rows without a placing are a race that has not been run yet; writing
+        # them would overwrite the startlist's 0/99 placeholders with NULL.
+        placed = [r for r in changed if r.placering is not None]
+        if not placed:
+            return 0
+        try:
+            return await asyncio.to_thread(write_rows_to_db, placed)
+        except Exception:
+            logging.exception("  ts%s: writing results failed; backing off", ts_id)
+            for race in due:
+                race.signature = None   # write them again next time
+            self._back_off(due, now, opts)
+            return 0
+
+    async def _run(self, races: List[WatchedRace], tz: ZoneInfo, stop_at: Optional[datetime], opts):
+        stats = {"polls": 0, "written": 0, "done": 0}
+        async with open_browser() as browser, open_page(browser) as page:
+            while races:
+                now = datetime.now(tz)
+                if stop_at is not None and now >= stop_at:
+                    logging.info("Reached --until with %d races still open", len(races))
+                    break
+
+                due_by_ts: Dict[int, List[WatchedRace]] = {}
+                for race in races:
+                    if race.next_poll <= now:
+                        due_by_ts.setdefault(race.ts_id, []).append(race)
+
+                for ts_id, due in due_by_ts.items():
+                    stats["polls"] += 1
+                    written = await self._poll_raceday(page, ts_id, due, now, opts)
+                    stats["written"] += written
+                    if written and opts["refresh"]:
+                        try:
+                            await asyncio.to_thread(dirty.drain_all, "derived", derived.recompute_races)
+                        except Exception:
+                            # The races stay queued for the next round.
+                            logging.exception("  refreshing derived metrics failed")
+
+                before = len(races)
+                races = [race for race in races if race.next_poll is not None]
+                stats["done"] += before - len(races)
+                if not races:
+                    break
+
+                wake = min(race.next_poll for race in races)
+                if stop_at is not None:
+                    wake = min(wake, stop_at)
+                await asyncio.sleep(max(1.0, (wake - datetime.now(tz)).total_seconds()))
+        return stats
+
+    def handle(self, *args, **opts):
+        if opts["poll_seconds"] <= 0:
+            raise CommandError("--poll-seconds must be greater than 0.")
+        if opts["max_poll_seconds"] < opts["poll_seconds"]:
+            raise CommandError("--max-poll-seconds must be at least --poll-seconds.")
+        if opts["grace_minutes"] < 0 or opts["final_recheck_minutes"] < 0:
+            raise CommandError("--grace-minutes and --final-recheck-minutes must be 0 or greater.")
+
+        tz = ZoneInfo(settings.RACE_TIME_ZONE)
+        now = datetime.now(tz)
+        day = opts.get("date") or now.date()
+        stop_at = datetime.combine(day, opts["until"], tzinfo=tz) if opts.get("until") else None
+
+        races = load_races(day, tz, timedelta(minutes=opts["grace_minutes"]), opts["poll_seconds"], now)
+        if not races:
+            self.stdout.write(self.style.WARNING(
+                f"No startlist races with a ts-ID for {day.isoformat()}. Run scrape_startlist first."
+            ))
+            return
+        logging.info(
+            "Watching %d races on %d racedays for %s",
+            len(races), len({race.ts_id for race in races}), day.isoformat(),
+        )
+
+        t0 = time.perf_counter()
+        with recorded_run("watch_raceday", opts):
+            stats = asyncio.run(self._run(races, tz, stop_at, opts))
+        self.stdout.write(self.style.SUCCESS(
+            f"Done. {stats['done']} of {len(races)} races final, {stats['polls']} page polls, "
+            f"{stats['written']} rows written in {time.perf_counter() - t0:.0f}s."
+        ))
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DirtyRace',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('consumer', models.CharField(db_column='consumer', max_length=20)),
+                ('datum', models.IntegerField(db_column='datum')),
+                ('bankod', models.CharField(db_column='bankod', max_length=20)),
+                ('lopp', models.IntegerField(db_column='lopp')),
+                ('marked_at', models.DateTimeField(db_column='marked_at')),
+            ],
+            options={
+                'db_table': 'dirty_race',
+                'ordering': ('consumer', 'marked_at'),
+                'unique_together': {('consumer', 'datum', 'bankod', 'lopp')},
+            },
+        ),
+    ]
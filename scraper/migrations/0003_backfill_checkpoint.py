@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper', '0002_dirty_race'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BackfillCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('kind', models.CharField(db_column='kind', max_length=20)),
+                ('ts_id', models.IntegerField(db_column='ts_id')),
+                ('rows', models.IntegerField(db_column='rows', default=0)),
+                ('completed_at', models.DateTimeField(db_column='completed_at')),
+            ],
+            options={
+                'db_table': 'backfill_checkpoint',
+                'ordering': ('kind', 'ts_id'),
+                'unique_together': {('kind', 'ts_id')},
+            },
+        ),
+    ]
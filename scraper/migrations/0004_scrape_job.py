@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper', '0003_backfill_checkpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScrapeJob',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('kind', models.CharField(db_column='kind', max_length=20)),
+                ('ts_id', models.IntegerField(db_column='ts_id')),
+                ('state', models.CharField(choices=[('pending', 'pending'), ('running', 'running'), ('done', 'done'), ('failed', 'failed')], db_column='state', default='pending', max_length=10)),
+                ('attempts', models.IntegerField(db_column='attempts', default=0)),
+                ('lease_expires_at', models.DateTimeField(blank=True, db_column='lease_expires_at', null=True)),
+                ('worker', models.CharField(blank=True, db_column='worker', default='', max_length=100)),
+                ('rows', models.IntegerField(blank=True, db_column='rows', null=True)),
+                ('last_error', models.TextField(blank=True, db_column='last_error', default='')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_column='created_at')),
+                ('updated_at', models.DateTimeField(auto_now=True, db_column='updated_at')),
+            ],
+            options={
+                'db_table': 'scrape_job',
+                'ordering': ('id',),
+                'indexes': [models.Index(fields=['state', 'lease_expires_at'], name='scrape_job_state_lease_idx')],
+                'unique_together': {('kind', 'ts_id')},
+            },
+        ),
+    ]
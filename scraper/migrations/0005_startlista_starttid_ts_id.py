@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper', '0004_scrape_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='startlist',
+            name='starttid',
+            field=models.TimeField(blank=True, db_column='starttid', null=True),
+        ),
+        migrations.AddField(
+            model_name='startlist',
+            name='ts_id',
+            field=models.IntegerField(blank=True, db_column='ts_id', null=True),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper', '0005_startlista_starttid_ts_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OddsSnapshot',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('datum', models.IntegerField(db_column='datum')),
+                ('bankod', models.CharField(db_column='bankod', max_length=2)),
+                ('lopp', models.IntegerField(db_column='lopp')),
+                ('nr', models.IntegerField(db_column='nr')),
+                ('captured_at', models.DateTimeField(db_column='captured_at')),
+                ('odds', models.IntegerField(blank=True, db_column='odds', null=True)),
+            ],
+            options={
+                'db_table': 'odds_snapshot',
+                'ordering': ('datum', 'bankod', 'lopp', 'nr', 'captured_at'),
+                'indexes': [models.Index(fields=['datum', 'bankod', 'lopp', 'captured_at'], name='odds_snapshot_race_idx')],
+            },
+        ),
+    ]
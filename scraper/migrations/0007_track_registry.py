@@ -0,0 +1,63 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:33
+
+from django.db import migrations, models
+
+
+# Union of the three per-scraper tables this registry replaces.
+TRACKS = {
+    "ARVIKA": "Ar", "AXEVALLA": "Ax", "BERGSÅKER": "B", "BJÄRKE": "Bj", "BODEN": "Bo",
+    "BOLLNÄS": "Bs", "DANNERO": "D", "DALA JÄRNA": "Dj", "ESKILSTUNA": "E", "JÄGERSRO": "J",
+    "FÄRJESTAD": "F", "GÄVLE": "G", "GÖTEBORG TRAV": "Gt", "HAGMYREN": "H", "HALMSTAD": "Hd",
+    "HOTING": "Hg", "KARLSHAMN": "Kh", "KALMAR": "Kr", "LINDESBERG": "L", "LYCKSELE": "Ly",
+    "MANTORP": "Mp", "OVIKEN": "Ov", "ROMME": "Ro", "RÄTTVIK": "Rä", "SOLVALLA": "S",
+    "SKELLEFTEÅ": "Sk", "SOLÄNGET": "Sä", "TINGSRYD": "Ti", "TÄBY TRAV": "Tt", "UMÅKER": "U",
+    "VEMDALEN": "Vd", "VAGGERYD": "Vg", "VISBY": "Vi", "ÅBY": "Å", "ÅMÅL": "Åm",
+    "ÅRJÄNG": "År", "ÖREBRO": "Ö", "ÖSTERSUND": "Ös",
+}
+
+
+def seed_tracks(apps, schema_editor):
+    Track = apps.get_model("scraper", "Track")
+    Track.objects.bulk_create([Track(name=name, bankod=bankod) for name, bankod in TRACKS.items()], ignore_conflicts=True)
+
+
+def unseed_tracks(apps, schema_editor):
+    apps.get_model("scraper", "Track").objects.filter(name__in=TRACKS).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper', '0006_odds_snapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Track',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('name', models.CharField(db_column='name', max_length=40, unique=True)),
+                ('bankod', models.CharField(db_column='bankod', max_length=2)),
+            ],
+            options={
+                'db_table': 'track',
+                'ordering': ('name',),
+            },
+        ),
+        migrations.CreateModel(
+            name='UnknownTrack',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('name', models.CharField(db_column='name', max_length=100, unique=True)),
+                ('fallback', models.CharField(db_column='fallback', max_length=2)),
+                ('occurrences', models.IntegerField(db_column='occurrences', default=1)),
+                ('first_seen', models.DateTimeField(auto_now_add=True, db_column='first_seen')),
+                ('last_seen', models.DateTimeField(auto_now=True, db_column='last_seen')),
+            ],
+            options={
+                'db_table': 'unknown_track',
+                'ordering': ('-last_seen',),
+            },
+        ),
+        migrations.RunPython(seed_tracks, unseed_tracks),
+    ]
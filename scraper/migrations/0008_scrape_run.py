@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper', '0007_track_registry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScrapeRun',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('command', models.CharField(db_column='command', max_length=50)),
+                ('arguments', models.JSONField(db_column='arguments', default=dict)),
+                ('start_id', models.IntegerField(blank=True, db_column='start_id', null=True)),
+                ('end_id', models.IntegerField(blank=True, db_column='end_id', null=True)),
+                ('started_at', models.DateTimeField(db_column='started_at')),
+                ('finished_at', models.DateTimeField(blank=True, db_column='finished_at', null=True)),
+                ('status', models.CharField(choices=[('running', 'running'), ('ok', 'ok'), ('failed', 'failed')], db_column='status', default='running', max_length=10)),
+                ('pages', models.IntegerField(db_column='pages', default=0)),
+                ('empty_pages', models.IntegerField(db_column='empty_pages', default=0)),
+                ('failed_pages', models.IntegerField(db_column='failed_pages', default=0)),
+                ('retries', models.IntegerField(db_column='retries', default=0)),
+                ('rows_created', models.IntegerField(db_column='rows_created', default=0)),
+                ('rows_updated', models.IntegerField(db_column='rows_updated', default=0)),
+                ('stage_seconds', models.JSONField(db_column='stage_seconds', default=dict)),
+                ('error', models.TextField(blank=True, db_column='error', default='')),
+            ],
+            options={
+                'db_table': 'scrape_run',
+                'ordering': ('-started_at',),
+                'indexes': [models.Index(fields=['command', 'started_at'], name='scrape_run_command_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper', '0008_scrape_run'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='horseresult',
+            index=models.Index(fields=['namn', 'datum', 'id'], include=('bankod', 'lopp', 'nr', 'distans', 'spar', 'placering', 'tid', 'startmetod', 'galopp', 'underlag', 'pris', 'odds', 'kusk'), name='resultat_namn_datum_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='horseresult',
+            index=models.Index(fields=['kusk', 'datum', 'id'], include=('bankod', 'lopp', 'nr', 'distans', 'spar', 'placering', 'tid', 'startmetod', 'galopp', 'underlag', 'pris', 'odds', 'namn'), name='resultat_kusk_datum_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='horseresult',
+            index=models.Index(fields=['bankod', 'datum', 'id'], name='resultat_bankod_datum_idx'),
+        ),
+    ]
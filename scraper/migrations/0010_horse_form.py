@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper', '0009_resultat_history_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HorseForm',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('namn_key', models.CharField(db_column='namn_key', max_length=50, unique=True)),
+                ('namn', models.CharField(db_column='namn', max_length=50)),
+                ('starts', models.IntegerField(db_column='starts', default=0)),
+                ('wins', models.IntegerField(db_column='wins', default=0)),
+                ('top3', models.IntegerField(db_column='top3', default=0)),
+                ('gallops', models.IntegerField(db_column='gallops', default=0)),
+                ('win_earnings', models.BigIntegerField(db_column='win_earnings', default=0)),
+                ('first_datum', models.IntegerField(blank=True, db_column='first_datum', null=True)),
+                ('last_datum', models.IntegerField(blank=True, db_column='last_datum', null=True)),
+                ('last_placings', models.JSONField(db_column='last_placings', default=list)),
+                ('best_tid', models.JSONField(db_column='best_tid', default=dict)),
+                ('updated_at', models.DateTimeField(db_column='updated_at')),
+            ],
+            options={
+                'db_table': 'horse_form',
+                'ordering': ('namn',),
+            },
+        ),
+    ]
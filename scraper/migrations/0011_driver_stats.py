@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper', '0010_horse_form'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DriverStats',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('kusk', models.CharField(db_column='kusk', max_length=80, unique=True)),
+                ('starts', models.IntegerField(db_column='starts', default=0)),
+                ('wins', models.IntegerField(db_column='wins', default=0)),
+                ('top3', models.IntegerField(db_column='top3', default=0)),
+                ('placing_sum', models.IntegerField(db_column='placing_sum', default=0)),
+                ('first_datum', models.IntegerField(blank=True, db_column='first_datum', null=True)),
+                ('last_datum', models.IntegerField(blank=True, db_column='last_datum', null=True)),
+                ('per_track', models.JSONField(db_column='per_track', default=dict)),
+                ('updated_at', models.DateTimeField(db_column='updated_at')),
+            ],
+            options={
+                'db_table': 'driver_stats',
+                'ordering': ('kusk',),
+            },
+        ),
+        migrations.CreateModel(
+            name='DriverHorseStats',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('kusk', models.CharField(db_column='kusk', max_length=80)),
+                ('namn_key', models.CharField(db_column='namn_key', max_length=50)),
+                ('namn', models.CharField(db_column='namn', max_length=50)),
+                ('starts', models.IntegerField(db_column='starts', default=0)),
+                ('wins', models.IntegerField(db_column='wins', default=0)),
+                ('top3', models.IntegerField(db_column='top3', default=0)),
+                ('placing_sum', models.IntegerField(db_column='placing_sum', default=0)),
+                ('last_datum', models.IntegerField(blank=True, db_column='last_datum', null=True)),
+            ],
+            options={
+                'db_table': 'driver_horse_stats',
+                'ordering': ('kusk', 'namn'),
+                'unique_together': {('kusk', 'namn_key')},
+            },
+        ),
+    ]
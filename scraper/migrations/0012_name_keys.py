@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:07
+
+from django.db import migrations, models
+
+
+def name_key(name):
+    # Frozen copy of scraper.normalize.name_key as of this migration, so a
+    # later change there does not change what a fresh database backfills.
+    if name is None:
+        return ""
+    return "".join(c for c in name.upper() if c.isalnum())[:50]
+
+
+def backfill_name_keys(apps, schema_editor):
+    # One key per distinct name into a temp table, then one joined UPDATE per
+    # table: a single pass over each table instead of one UPDATE per name.
+    # UPDATE ... FROM needs SQLite 3.33 or later.
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("CREATE TEMPORARY TABLE tmp_name_key (namn varchar(50) PRIMARY KEY, namn_key varchar(50))")
+        names = set()
+        for table in ("resultat", "startlista"):
+            cursor.execute(f"SELECT DISTINCT namn FROM {table}")
+            names.update(n for (n,) in cursor.fetchall())
+        cursor.executemany("INSERT INTO tmp_name_key VALUES (%s, %s)", [(n, name_key(n)) for n in names])
+        for table in ("resultat", "startlista"):
+            cursor.execute(
+                f"UPDATE {table} SET namn_key = k.namn_key FROM tmp_name_key k WHERE {table}.namn = k.namn"
+            )
+        cursor.execute("DROP TABLE tmp_name_key")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper', '0011_driver_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='horseresult',
+            name='namn_key',
+            field=models.CharField(blank=True, db_column='namn_key', default='', max_length=50),
+        ),
+        migrations.AddField(
+            model_name='startlist',
+            name='namn_key',
+            field=models.CharField(blank=True, db_column='namn_key', default='', max_length=50),
+        ),
+        migrations.RunPython(backfill_name_keys, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='horseresult',
+            index=models.Index(fields=['namn_key', 'datum', 'id'], name='resultat_namn_key_datum_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper', '0012_name_keys'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CacheInvalidation',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('tag', models.CharField(db_column='tag', max_length=120)),
+                ('created_at', models.DateTimeField(db_column='created_at', db_index=True)),
+            ],
+            options={
+                'db_table': 'cache_invalidation',
+                'ordering': ('id',),
+            },
+        ),
+    ]
@@ -1,5 +1,17 @@
 from django.db import models
 
+# Non-key columns carried by the resultat history indexes, so the pages in
+# scraper/queries.py (HISTORY_FIELDS) rarely touch the heap on Postgres. The
+# derived columns (ny_tid, lopp_klass) stay out: derived rewrites them for
+# whole race dates, and an indexed column would make every one of those
+# updates non-HOT, rewriting entries in all the resultat indexes. The heap
+# fetch for them is the cheaper side.
+HISTORY_INCLUDE = (
+    "bankod", "lopp", "nr", "distans", "spar", "placering", "tid", "startmetod", "galopp", "underlag",
+    "pris", "odds",
+)
+
+
 class HorseResult(models.Model):
     id = models.BigAutoField(primary_key=True)
 
@@ -8,6 +20,8 @@ class HorseResult(models.Model):
     lopp    = models.IntegerField(db_column="lopp")
     nr      = models.IntegerField(db_column="nr")
     namn    = models.CharField(max_length=50, db_column="namn")
+    # normalize.name_key(namn): what startlista rows are matched on.
+    namn_key = models.CharField(max_length=50, blank=True, default="", db_column="namn_key")
 
     distans = models.IntegerField(null=True, blank=True, db_column="distans")
     tillagg = models.IntegerField(null=True, blank=True, db_column="tillagg")
@@ -45,6 +59,18 @@ class HorseResult(models.Model):
                 name="uq_resultat_datum_bankod_lopp_namn",  
             ),
         ]
+        indexes = [
+            # Horse and driver history, newest first (read backwards).
+            models.Index(fields=("namn", "datum", "id"), name="resultat_namn_datum_idx",
+                         include=HISTORY_INCLUDE + ("kusk",)),
+            models.Index(fields=("kusk", "datum", "id"), name="resultat_kusk_datum_idx",
+                         include=HISTORY_INCLUDE + ("namn",)),
+            # Track and date range: many rows per page, which sit together in
+            # the heap anyway, so not worth a covering copy.
+            models.Index(fields=("bankod", "datum", "id"), name="resultat_bankod_datum_idx"),
+            # Startlist enrichment: a horse's starts before a raceday, newest first.
+            models.Index(fields=("namn_key", "datum", "id"), name="resultat_namn_key_datum_idx"),
+        ]
         ordering = ("datum", "bankod", "lopp", "placering")  
 
 
@@ -56,9 +82,12 @@ class StartList(models.Model):
     lopp       = models.IntegerField(db_column="lopp")
     nr         = models.IntegerField(db_column="nr")
     namn       = models.CharField(max_length=50, db_column="namn")
+    namn_key   = models.CharField(max_length=50, blank=True, default="", db_column="namn_key")
     spar       = models.IntegerField(null=True, blank=True, db_column="spar")
     distans    = models.IntegerField(null=True, blank=True, db_column="distans")
     kusk       = models.CharField(max_length=120, db_column="kusk")
+    starttid   = models.TimeField(null=True, blank=True, db_column="starttid")
+    ts_id      = models.IntegerField(null=True, blank=True, db_column="ts_id")
 
     class Meta:
         db_table = "startlista"
@@ -86,3 +115,258 @@ class Proposition(models.Model):
 
     def __str__(self):
         return f"{self.startdatum} {self.bankod} {self.proposition} {self.namn}"
+
+
+class DirtyRace(models.Model):
+    id       = models.BigAutoField(primary_key=True)
+    consumer = models.CharField(max_length=20, db_column="consumer")
+    datum    = models.IntegerField(db_column="datum")
+    bankod   = models.CharField(max_length=20, db_column="bankod")
+    lopp     = models.IntegerField(db_column="lopp")
+    marked_at = models.DateTimeField(db_column="marked_at")
+
+    class Meta:
+        db_table = "dirty_race"
+        unique_together = ("consumer", "datum", "bankod", "lopp")
+        ordering = ("consumer", "marked_at")
+
+    def __str__(self):
+        return f"{self.consumer} {self.datum} {self.bankod} L{self.lopp}"
+
+
+class BackfillCheckpoint(models.Model):
+    id           = models.BigAutoField(primary_key=True)
+    kind         = models.CharField(max_length=20, db_column="kind")
+    ts_id        = models.IntegerField(db_column="ts_id")
+    rows         = models.IntegerField(default=0, db_column="rows")
+    completed_at = models.DateTimeField(db_column="completed_at")
+
+    class Meta:
+        db_table = "backfill_checkpoint"
+        unique_together = ("kind", "ts_id")
+        ordering = ("kind", "ts_id")
+
+    def __str__(self):
+        return f"{self.kind} ts{self.ts_id} ({self.rows} rows)"
+
+
+class ScrapeJob(models.Model):
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE    = "done"
+    FAILED  = "failed"
+    STATES = [(PENDING, "pending"), (RUNNING, "running"), (DONE, "done"), (FAILED, "failed")]
+
+    id         = models.BigAutoField(primary_key=True)
+    kind       = models.CharField(max_length=20, db_column="kind")
+    ts_id      = models.IntegerField(db_column="ts_id")
+    state      = models.CharField(max_length=10, choices=STATES, default=PENDING, db_column="state")
+    attempts   = models.IntegerField(default=0, db_column="attempts")
+    # running: when the worker's lease runs out; pending: earliest retry time.
+    lease_expires_at = models.DateTimeField(null=True, blank=True, db_column="lease_expires_at")
+    worker     = models.CharField(max_length=100, blank=True, default="", db_column="worker")
+    rows       = models.IntegerField(null=True, blank=True, db_column="rows")
+    last_error = models.TextField(blank=True, default="", db_column="last_error")
+    created_at = models.DateTimeField(auto_now_add=True, db_column="created_at")
+    updated_at = models.DateTimeField(auto_now=True, db_column="updated_at")
+
+    class Meta:
+        db_table = "scrape_job"
+        unique_together = ("kind", "ts_id")
+        ordering = ("id",)
+        indexes = [
+            models.Index(fields=("state", "lease_expires_at"), name="scrape_job_state_lease_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} ts{self.ts_id} {self.state}"
+
+
+class OddsSnapshot(models.Model):
+    # One row per horse and odds change before the start; a value equal to the
+    # previous sample for the same horse is not stored again.
+    id          = models.BigAutoField(primary_key=True)
+    datum       = models.IntegerField(db_column="datum")
+    bankod      = models.CharField(max_length=2, db_column="bankod")
+    lopp        = models.IntegerField(db_column="lopp")
+    nr          = models.IntegerField(db_column="nr")
+    captured_at = models.DateTimeField(db_column="captured_at")
+    odds        = models.IntegerField(null=True, blank=True, db_column="odds")
+
+    class Meta:
+        db_table = "odds_snapshot"
+        ordering = ("datum", "bankod", "lopp", "nr", "captured_at")
+        indexes = [
+            models.Index(fields=("datum", "bankod", "lopp", "captured_at"), name="odds_snapshot_race_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.datum} {self.bankod} L{self.lopp} #{self.nr} {self.odds} @ {self.captured_at:%H:%M:%S}"
+
+
+class Track(models.Model):
+    # Track names as they appear on sportapp (upper case, with diacritics) and
+    # their bankod. A bankod can have several names; scraper/tracks.py adds the
+    # ASCII forms itself.
+    id     = models.BigAutoField(primary_key=True)
+    name   = models.CharField(max_length=40, unique=True, db_column="name")
+    bankod = models.CharField(max_length=2, db_column="bankod")
+
+    class Meta:
+        db_table = "track"
+        ordering = ("name",)
+
+    def __str__(self):
+        return f"{self.name} ({self.bankod})"
+
+
+class UnknownTrack(models.Model):
+    # Names the scrapers could not resolve; add them to Track after review.
+    id          = models.BigAutoField(primary_key=True)
+    name        = models.CharField(max_length=100, unique=True, db_column="name")
+    fallback    = models.CharField(max_length=2, db_column="fallback")
+    occurrences = models.IntegerField(default=1, db_column="occurrences")
+    first_seen  = models.DateTimeField(auto_now_add=True, db_column="first_seen")
+    last_seen   = models.DateTimeField(auto_now=True, db_column="last_seen")
+
+    class Meta:
+        db_table = "unknown_track"
+        ordering = ("-last_seen",)
+
+    def __str__(self):
+        return f"{self.name} -> {self.fallback} ({self.occurrences}x)"
+
+
+class ScrapeRun(models.Model):
+    RUNNING = "running"
+    OK      = "ok"
+    FAILED  = "failed"
+    STATUSES = [(RUNNING, "running"), (OK, "ok"), (FAILED, "failed")]
+
+    id            = models.BigAutoField(primary_key=True)
+    command       = models.CharField(max_length=50, db_column="command")
+    arguments     = models.JSONField(default=dict, db_column="arguments")
+    start_id      = models.IntegerField(null=True, blank=True, db_column="start_id")
+    end_id        = models.IntegerField(null=True, blank=True, db_column="end_id")
+    started_at    = models.DateTimeField(db_column="started_at")
+    finished_at   = models.DateTimeField(null=True, blank=True, db_column="finished_at")
+    status        = models.CharField(max_length=10, choices=STATUSES, default=RUNNING, db_column="status")
+    pages         = models.IntegerField(default=0, db_column="pages")
+    empty_pages   = models.IntegerField(default=0, db_column="empty_pages")
+    failed_pages  = models.IntegerField(default=0, db_column="failed_pages")
+    retries       = models.IntegerField(default=0, db_column="retries")
+    rows_created  = models.IntegerField(default=0, db_column="rows_created")
+    rows_updated  = models.IntegerField(default=0, db_column="rows_updated")
+    # "<kind>.<stage>" -> total seconds, from scraper/instrumentation.py.
+    stage_seconds = models.JSONField(default=dict, db_column="stage_seconds")
+    error         = models.TextField(blank=True, default="", db_column="error")
+
+    class Meta:
+        db_table = "scrape_run"
+        ordering = ("-started_at",)
+        indexes = [
+            models.Index(fields=("command", "started_at"), name="scrape_run_command_idx"),
+        ]
+
+    @property
+    def duration_seconds(self):
+        if self.finished_at is None:
+            return None
+        return (self.finished_at - self.started_at).total_seconds()
+
+    def __str__(self):
+        return f"{self.command} {self.started_at:%Y-%m-%d %H:%M} {self.status}"
+
+
+class HorseForm(models.Model):
+    # Per-horse form from resultat, kept by refresh_form (scraper/form.py). Only
+    # real starts count: upcoming (placering 0) and struck (99) rows are not,
+    # and a horse without a real start has no row. One row per namn_key; namn
+    # is the spelling of the latest start.
+    id            = models.BigAutoField(primary_key=True)
+    namn_key      = models.CharField(max_length=50, unique=True, db_column="namn_key")
+    namn          = models.CharField(max_length=50, db_column="namn")
+    starts        = models.IntegerField(default=0, db_column="starts")
+    wins          = models.IntegerField(default=0, db_column="wins")
+    top3          = models.IntegerField(default=0, db_column="top3")
+    gallops       = models.IntegerField(default=0, db_column="gallops")
+    # resultat.pris is the race's first prize, so this is the sum over wins.
+    win_earnings  = models.BigIntegerField(default=0, db_column="win_earnings")
+    first_datum   = models.IntegerField(null=True, blank=True, db_column="first_datum")
+    last_datum    = models.IntegerField(null=True, blank=True, db_column="last_datum")
+    # Newest first, form.LAST_STARTS of them.
+    last_placings = models.JSONField(default=list, db_column="last_placings")
+    # "<distans><a|v>" (autostart/voltstart) -> best km-time.
+    best_tid      = models.JSONField(default=dict, db_column="best_tid")
+    updated_at    = models.DateTimeField(db_column="updated_at")
+
+    class Meta:
+        db_table = "horse_form"
+        ordering = ("namn",)
+
+    @property
+    def gallop_rate(self) -> float:
+        return self.gallops / self.starts if self.starts else 0.0
+
+    def __str__(self):
+        return f"{self.namn}: {self.starts} starts, {self.wins} wins"
+
+
+class DriverStats(models.Model):
+    # Per-driver rollup of resultat, kept by refresh_driver_stats
+    # (scraper/driver_stats.py). Same start rules as HorseForm.
+    id           = models.BigAutoField(primary_key=True)
+    kusk         = models.CharField(max_length=80, unique=True, db_column="kusk")
+    starts       = models.IntegerField(default=0, db_column="starts")
+    wins         = models.IntegerField(default=0, db_column="wins")
+    top3         = models.IntegerField(default=0, db_column="top3")
+    placing_sum  = models.IntegerField(default=0, db_column="placing_sum")
+    first_datum  = models.IntegerField(null=True, blank=True, db_column="first_datum")
+    last_datum   = models.IntegerField(null=True, blank=True, db_column="last_datum")
+    # bankod -> [starts, wins, top3]
+    per_track    = models.JSONField(default=dict, db_column="per_track")
+    updated_at   = models.DateTimeField(db_column="updated_at")
+
+    class Meta:
+        db_table = "driver_stats"
+        ordering = ("kusk",)
+
+    def __str__(self):
+        return f"{self.kusk}: {self.starts} starts, {self.wins} wins"
+
+
+class DriverHorseStats(models.Model):
+    # One row per driver and horse (namn_key) they have driven; namn is the
+    # spelling of the latest start.
+    id           = models.BigAutoField(primary_key=True)
+    kusk         = models.CharField(max_length=80, db_column="kusk")
+    namn_key     = models.CharField(max_length=50, db_column="namn_key")
+    namn         = models.CharField(max_length=50, db_column="namn")
+    starts       = models.IntegerField(default=0, db_column="starts")
+    wins         = models.IntegerField(default=0, db_column="wins")
+    top3         = models.IntegerField(default=0, db_column="top3")
+    placing_sum  = models.IntegerField(default=0, db_column="placing_sum")
+    last_datum   = models.IntegerField(null=True, blank=True, db_column="last_datum")
+
+    class Meta:
+        db_table = "driver_horse_stats"
+        ordering = ("kusk", "namn")
+        unique_together = ("kusk", "namn_key")
+
+    def __str__(self):
+        return f"{self.kusk} / {self.namn}: {self.starts} starts"
+
+
+class CacheInvalidation(models.Model):
+    # Append-only log of response cache tags a writer changed. Every web
+    # process polls it by id and evicts its own entries (scraper/cache.py).
+    id         = models.BigAutoField(primary_key=True)
+    tag        = models.CharField(max_length=120, db_column="tag")
+    created_at = models.DateTimeField(db_column="created_at", db_index=True)
+
+    class Meta:
+        db_table = "cache_invalidation"
+        ordering = ("id",)
+
+    def __str__(self):
+        return f"{self.id} {self.tag}"
@@ -0,0 +1,90 @@
+import re
+from functools import lru_cache
+from typing import Optional
+
+# Text cleanup shared by the scrapers. Kept free of Django imports so the
+# benchmarks can load it on its own.
+#
+# The same horse and driver names come through thousands of times in a backfill,
+# so the name functions are memoized. Each one must return exactly what the old
+# chained re.sub/replace versions returned, quirks included (see
+# benchmarks/bench_normalize.py, which checks that on a fixture corpus).
+
+NAME_CACHE_SIZE = 16_384
+
+_DROP_NAME_CHARS = str.maketrans("", "", "*'\u2019")
+_DROP_APOSTROPHES = str.maketrans("", "", "'\u2019")
+_NON_DIGIT_RE = re.compile(r"\D+")
+_PAREN_RE = re.compile(r"\([^)]*\)")
+
+
+def normalize_cell_text(s: Optional[str]) -> str:
+    if s is None:
+        return ""
+    return s.replace("\u00a0", " ").strip()
+
+
+def trim_to_max(s: str, max_len: int) -> str:
+    s = s or ""
+    return s if len(s) <= max_len else s[:max_len]
+
+
+@lru_cache(maxsize=NAME_CACHE_SIZE)
+def normalize_name(name: Optional[str]) -> str:
+    # Results page horse name. str.split() splits on the same characters as \s,
+    # and NBSP is one of them.
+    if name is None:
+        return ""
+    return " ".join(name.translate(_DROP_NAME_CHARS).split())[:50]
+
+
+@lru_cache(maxsize=NAME_CACHE_SIZE)
+def normalize_kusk(kusk: Optional[str]) -> str:
+    # Results page driver. Whitespace is collapsed before the apostrophes are
+    # removed, so "A ' B" keeps its double space; stored names depend on that.
+    if kusk is None:
+        return ""
+    return " ".join(kusk.split()).translate(_DROP_APOSTROPHES)[:80]
+
+
+@lru_cache(maxsize=NAME_CACHE_SIZE)
+def normalize_startlista_kusk(kusk: Optional[str], max_len: int) -> str:
+    # Startlist driver: no apostrophe removal.
+    if kusk is None:
+        return ""
+    return " ".join(kusk.split())[:max_len]
+
+
+@lru_cache(maxsize=NAME_CACHE_SIZE)
+def normalize_startlista_name(name: Optional[str]) -> str:
+    # Strip first, then drop characters: "* ABC" keeps its leading space.
+    cleaned = normalize_cell_text(name).translate(_DROP_NAME_CHARS)
+    if "(" in cleaned:
+        cleaned = _PAREN_RE.sub("", cleaned)
+    if len(cleaned) >= 7:
+        cleaned = cleaned[:-7]
+    return cleaned.rstrip().upper()[:50]
+
+
+@lru_cache(maxsize=NAME_CACHE_SIZE)
+def name_key(name: Optional[str]) -> str:
+    # Join key between a results page name (normalize_name: mixed case) and a
+    # startlist name (normalize_startlista_name: upper case, leading space
+    # kept): case, spaces and punctuation do not count. Stored in namn_key on
+    # resultat and startlista.
+    if name is None:
+        return ""
+    return "".join(c for c in name.upper() if c.isalnum())[:50]
+
+
+def parse_swe_int(token: Optional[str]) -> Optional[int]:
+    # "1.250.000", "(25 000)" and "25 000 kr" all read as their digits.
+    if token is None:
+        return None
+    t = _NON_DIGIT_RE.sub("", token)
+    if not t:
+        return None
+    try:
+        return int(t)
+    except ValueError:
+        return None
@@ -0,0 +1,147 @@
+import cProfile, csv, heapq, io, logging, os, pstats, time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import List, Optional
+
+# --profile on the scrape commands. While a session is active, crawl() traces
+# every page attempt as its own Playwright trace chunk and keeps the zip only for
+# the N slowest; every attempt also gets a row in pages.csv. The command itself
+# runs under cProfile. Everything lands in <SCRAPER_PROFILE_DIR>/<command>-<time>-<pid>/:
+#
+#   profile.prof   cProfile dump (snakeviz, python -m pstats)
+#   profile.txt    top functions by cumulative time
+#   pages.csv      kind, ts_id, attempt, outcome, seconds, rows, trace; slowest first
+#   trace-*.zip    playwright show-trace <file>
+#
+# DB writes run in threads (asyncio.to_thread) that cProfile does not see; their
+# time shows up as db_write in the stage metrics instead.
+
+PROFILE_TOP_FUNCTIONS = 40
+
+
+class ProfileSession:
+    def __init__(self, run_dir: str, keep_traces: int):
+        self.run_dir = run_dir
+        self.keep_traces = keep_traces
+        self.pages: List[dict] = []
+        # Min-heap of (seconds, path): the slowest traces seen so far.
+        self._kept: list = []
+
+    async def start_context(self, ctx) -> None:
+        # Called by open_page(); the chunks of one context share its resources.
+        if self.keep_traces > 0:
+            await ctx.tracing.start(screenshots=True, snapshots=True)
+
+    async def start_page(self, page, kind: str, ts_id: int) -> None:
+        if self.keep_traces <= 0:
+            return
+        try:
+            await page.context.tracing.start_chunk(title=f"{kind} ts{ts_id}")
+        except Exception:
+            logging.exception("Could not start a trace for %s ts%s", kind, ts_id)
+
+    async def end_page(self, page, kind: str, ts_id: int, attempt: int, outcome: str,
+                       seconds: float, rows: Optional[int]) -> None:
+        trace = ""
+        if self.keep_traces > 0:
+            trace = await self._stop_chunk(page, kind, ts_id, attempt, seconds)
+        self.pages.append({
+            "kind": kind, "ts_id": ts_id, "attempt": attempt, "outcome": outcome,
+            "seconds": round(seconds, 3), "rows": rows or 0, "trace": trace,
+        })
+
+    async def _stop_chunk(self, page, kind, ts_id, attempt, seconds) -> str:
+        name = f"trace-{kind}-ts{ts_id}-a{attempt}.zip"
+        path = os.path.join(self.run_dir, name)
+        if len(self._kept) >= self.keep_traces and seconds <= self._kept[0][0]:
+            path = None
+        try:
+            # Stopping without a path discards the chunk instead of writing it.
+            await page.context.tracing.stop_chunk(path=path)
+        except Exception:
+            logging.exception("Could not stop the trace for %s ts%s", kind, ts_id)
+            return ""
+        if path is None:
+            return ""
+        heapq.heappush(self._kept, (seconds, path))
+        if len(self._kept) > self.keep_traces:
+            _, evicted = heapq.heappop(self._kept)
+            if os.path.exists(evicted):
+                os.remove(evicted)
+        return name
+
+    def write(self, profiler: cProfile.Profile) -> None:
+        profiler.dump_stats(os.path.join(self.run_dir, "profile.prof"))
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(PROFILE_TOP_FUNCTIONS)
+        with open(os.path.join(self.run_dir, "profile.txt"), "w", encoding="utf-8") as fh:
+            fh.write(out.getvalue())
+
+        # A row keeps its trace name only if that trace was not evicted later on.
+        kept = {os.path.basename(path) for _, path in self._kept}
+        rows = sorted(self.pages, key=lambda r: r["seconds"], reverse=True)
+        with open(os.path.join(self.run_dir, "pages.csv"), "w", encoding="utf-8", newline="") as fh:
+            writer = csv.DictWriter(fh, fieldnames=["kind", "ts_id", "attempt", "outcome", "seconds", "rows", "trace"])
+            writer.writeheader()
+            for row in rows:
+                writer.writerow({**row, "trace": row["trace"] if row["trace"] in kept else ""})
+
+        for row in rows[:5]:
+            logging.info(
+                "Slow page %-12s ts%s %6.1fs %-6s %s",
+                row["kind"], row["ts_id"], row["seconds"], row["outcome"], row["trace"] if row["trace"] in kept else "",
+            )
+
+
+_active: Optional[ProfileSession] = None
+
+
+def active() -> Optional[ProfileSession]:
+    return _active
+
+
+def run_dir_for(command: str) -> str:
+    from django.conf import settings
+
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    return os.path.join(settings.SCRAPER_PROFILE_DIR, f"{command}-{stamp}-{os.getpid()}")
+
+
+@contextmanager
+def profiled(command: str, enabled: bool, keep_traces: int = 5):
+    # No-op unless enabled, so commands can always wrap their run in it.
+    global _active
+    if not enabled:
+        yield None
+        return
+
+    session = ProfileSession(run_dir_for(command), keep_traces)
+    os.makedirs(session.run_dir, exist_ok=True)
+    profiler = cProfile.Profile()
+    _active = session
+    t0 = time.perf_counter()
+    profiler.enable()
+    try:
+        yield session
+    finally:
+        profiler.disable()
+        _active = None
+        session.write(profiler)
+        logging.info(
+            "Profile of %s (%.1fs, %d page attempts) written to %s",
+            command, time.perf_counter() - t0, len(session.pages), session.run_dir,
+        )
+
+
+def add_profile_arguments(parser) -> None:
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Write a cProfile, a per-page timing table and Playwright traces of the slowest pages to SCRAPER_PROFILE_DIR.",
+    )
+    parser.add_argument(
+        "--profile-traces",
+        type=int,
+        default=5,
+        help="How many of the slowest page traces --profile keeps (0 disables tracing).",
+    )
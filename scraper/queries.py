@@ -0,0 +1,292 @@
+import base64, json
+from dataclasses import dataclass
+from datetime import date
+from typing import List, Optional, Sequence, Tuple
+
+from django.db import connection
+from django.db.models import Exists, OuterRef, Q, QuerySet, Subquery
+
+from scraper.models import DriverHorseStats, DriverStats, HorseForm, HorseResult, Proposition, StartList
+from scraper.normalize import normalize_kusk, normalize_name
+
+# Read side of resultat, startlista, proposition and the rollups. Every query
+# is backed by an index whose leading columns are its filter, and lists are
+# paged by keyset on their sort key, so page 500 costs the same as page 1
+# whatever the table size.
+
+# models.HISTORY_INCLUDE covers all of these but the derived ny_tid and
+# lopp_klass, which a horse or driver page reads from the heap.
+HISTORY_FIELDS = (
+    "id", "datum", "bankod", "lopp", "nr", "namn", "kusk", "distans", "spar", "placering", "tid",
+    "startmetod", "galopp", "underlag", "pris", "odds", "ny_tid", "lopp_klass",
+)
+RACEDAY_RESULT_FIELDS = HISTORY_FIELDS
+STARTLIST_FIELDS = ("startdatum", "bankod", "lopp", "nr", "namn", "spar", "distans", "kusk", "starttid", "ts_id")
+PROPOSITION_FIELDS = ("startdatum", "bankod", "proposition", "namn", "distans", "kuskanskemal")
+FORM_FIELDS = (
+    "namn", "namn_key", "starts", "wins", "top3", "gallops", "win_earnings", "first_datum", "last_datum",
+    "last_placings", "best_tid",
+)
+DRIVER_FIELDS = ("kusk", "starts", "wins", "top3", "placing_sum", "first_datum", "last_datum", "per_track")
+PAIR_FIELDS = ("kusk", "namn", "namn_key", "starts", "wins", "top3", "placing_sum", "last_datum")
+CARD_FIELDS = ("bankod", "lopp", "nr", "namn", "spar", "distans", "kusk", "starttid", "struken")
+CARD_HISTORY_FIELDS = (
+    "datum", "bankod", "lopp", "nr", "distans", "spar", "placering", "tid", "startmetod", "galopp",
+    "underlag", "pris", "odds", "kusk",
+)
+
+# Sort keys; the last column makes each one unique.
+HISTORY_KEY = ("datum", "id")
+RACEDAY_RESULT_KEY = ("bankod", "lopp", "nr", "id")
+STARTLIST_KEY = ("bankod", "lopp", "nr")
+PROPOSITION_KEY = ("bankod", "proposition", "namn")
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+CARD_STARTS = 5
+MAX_CARD_STARTS = 20
+
+
+@dataclass
+class Page:
+    rows: List[dict]
+    next_cursor: Optional[str]
+
+
+def encode_cursor(values: Sequence) -> str:
+    raw = json.dumps(list(values), ensure_ascii=False, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, n: int) -> list:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, UnicodeDecodeError) as exc:
+        raise ValueError(f"Invalid cursor {cursor!r}.") from exc
+    # Only scalars: a list or object would reach the ORM as a lookup value
+    # and fail there with a TypeError.
+    if not isinstance(values, list) or len(values) != n or not all(
+        isinstance(v, (str, int, float)) for v in values
+    ):
+        raise ValueError(f"Invalid cursor {cursor!r}.")
+    return values
+
+
+def _after(qs: QuerySet, key: Sequence[str], cursor: Optional[str], descending: bool = False) -> QuerySet:
+    # Rows past the cursor in (k1, k2, ...) order, spelled out as
+    # k1 >= v1 AND (k1 > v1 OR (k1 = v1 AND (k2 > v2 OR ...))). The k1 bound
+    # alone is what the index range uses; the rest settles ties.
+    if not cursor:
+        return qs
+    values = decode_cursor(cursor, len(key))
+    op = "lt" if descending else "gt"
+    cond = Q(**{f"{key[-1]}__{op}": values[-1]})
+    for k, v in reversed(list(zip(key[:-1], values[:-1]))):
+        cond = Q(**{f"{k}__{op}": v}) | (Q(**{k: v}) & cond)
+    return qs.filter(Q(**{f"{key[0]}__{op}e": values[0]}) & cond)
+
+
+def _ordered(qs: QuerySet, key: Sequence[str], descending: bool = False) -> QuerySet:
+    return qs.order_by(*(f"-{k}" if descending else k for k in key))
+
+
+def page(qs: QuerySet, key: Sequence[str], limit: int = DEFAULT_LIMIT) -> Page:
+    # One extra row tells whether there is a next page without a COUNT.
+    limit = max(1, min(limit, MAX_LIMIT))
+    rows = list(qs[:limit + 1])
+    if len(rows) <= limit:
+        return Page(rows, None)
+    rows = rows[:limit]
+    return Page(rows, encode_cursor(rows[-1][k] for k in key))
+
+
+def horse_history_query(namn: str, cursor: Optional[str] = None) -> QuerySet:
+    qs = HorseResult.objects.filter(namn=normalize_name(namn))
+    return _ordered(_after(qs, HISTORY_KEY, cursor, True), HISTORY_KEY, True).values(*HISTORY_FIELDS)
+
+
+def driver_history_query(kusk: str, cursor: Optional[str] = None) -> QuerySet:
+    qs = HorseResult.objects.filter(kusk=normalize_kusk(kusk))
+    return _ordered(_after(qs, HISTORY_KEY, cursor, True), HISTORY_KEY, True).values(*HISTORY_FIELDS)
+
+
+def track_range_query(bankod: str, datum_from: int, datum_to: int, cursor: Optional[str] = None) -> QuerySet:
+    qs = HorseResult.objects.filter(bankod=bankod, datum__gte=datum_from, datum__lte=datum_to)
+    return _ordered(_after(qs, HISTORY_KEY, cursor), HISTORY_KEY).values(*HISTORY_FIELDS)
+
+
+def raceday_results_query(datum: int, bankod: Optional[str] = None, cursor: Optional[str] = None) -> QuerySet:
+    qs = HorseResult.objects.filter(datum=datum)
+    if bankod:
+        qs = qs.filter(bankod=bankod)
+    return _ordered(_after(qs, RACEDAY_RESULT_KEY, cursor), RACEDAY_RESULT_KEY).values(*RACEDAY_RESULT_FIELDS)
+
+
+def raceday_startlist_query(datum: int, bankod: Optional[str] = None, cursor: Optional[str] = None) -> QuerySet:
+    # Struck horses are the ones the startlist scraper gave placering 99 in
+    # resultat; the EXISTS probes the resultat unique index once per row.
+    struck = HorseResult.objects.filter(
+        datum=OuterRef("startdatum"), bankod=OuterRef("bankod"), lopp=OuterRef("lopp"), namn=OuterRef("namn"),
+        placering=99,
+    )
+    qs = StartList.objects.filter(startdatum=datum)
+    if bankod:
+        qs = qs.filter(bankod=bankod)
+    qs = _ordered(_after(qs, STARTLIST_KEY, cursor), STARTLIST_KEY)
+    return qs.annotate(struken=Exists(struck)).values(*STARTLIST_FIELDS, "struken")
+
+
+def propositions_query(datum: int, bankod: Optional[str] = None, cursor: Optional[str] = None) -> QuerySet:
+    qs = Proposition.objects.filter(startdatum=datum)
+    if bankod:
+        qs = qs.filter(bankod=bankod)
+    return _ordered(_after(qs, PROPOSITION_KEY, cursor), PROPOSITION_KEY).values(*PROPOSITION_FIELDS)
+
+
+def horse_history(namn: str, cursor: Optional[str] = None, limit: int = DEFAULT_LIMIT) -> Page:
+    # Newest start first.
+    return page(horse_history_query(namn, cursor), HISTORY_KEY, limit)
+
+
+def driver_history(kusk: str, cursor: Optional[str] = None, limit: int = DEFAULT_LIMIT) -> Page:
+    # Newest drive first.
+    return page(driver_history_query(kusk, cursor), HISTORY_KEY, limit)
+
+
+def track_range(bankod: str, datum_from: int, datum_to: int, cursor: Optional[str] = None,
+                limit: int = DEFAULT_LIMIT) -> Page:
+    # Oldest first, within [datum_from, datum_to].
+    return page(track_range_query(bankod, datum_from, datum_to, cursor), HISTORY_KEY, limit)
+
+
+def raceday_results(datum: int, bankod: Optional[str] = None, cursor: Optional[str] = None,
+                    limit: int = DEFAULT_LIMIT) -> Page:
+    return page(raceday_results_query(datum, bankod, cursor), RACEDAY_RESULT_KEY, limit)
+
+
+def raceday_startlist(datum: int, bankod: Optional[str] = None, cursor: Optional[str] = None,
+                      limit: int = DEFAULT_LIMIT) -> Page:
+    return page(raceday_startlist_query(datum, bankod, cursor), STARTLIST_KEY, limit)
+
+
+def propositions(datum: int, bankod: Optional[str] = None, cursor: Optional[str] = None,
+                 limit: int = DEFAULT_LIMIT) -> Page:
+    return page(propositions_query(datum, bankod, cursor), PROPOSITION_KEY, limit)
+
+
+def _to_date(datum: int) -> date:
+    return date(datum // 10000, datum // 100 % 100, datum % 100)
+
+
+def card_entries(datum: int, bankod: Optional[str] = None) -> List[Tuple[str, str]]:
+    # (namn, kusk) of every start on a raceday's startlists.
+    qs = StartList.objects.filter(startdatum=datum)
+    if bankod:
+        qs = qs.filter(bankod=bankod)
+    return list(qs.values_list("namn", "kusk"))
+
+
+def startlist_form_query(datum: int, bankod: Optional[str] = None) -> QuerySet:
+    # One statement: the day's startlista name keys (startlista index)
+    # semi-joined to horse_form on its unique namn_key index.
+    names = StartList.objects.filter(startdatum=datum)
+    if bankod:
+        names = names.filter(bankod=bankod)
+    return (
+        HorseForm.objects.filter(namn_key__in=Subquery(names.values("namn_key")))
+        .order_by("namn").values(*FORM_FIELDS)
+    )
+
+
+def startlist_form(datum: int, bankod: Optional[str] = None) -> List[dict]:
+    # Form of every horse on a raceday's startlists; a raceday is a few hundred
+    # horses at most, so no paging. days_since_last counts to the raceday.
+    day = _to_date(datum)
+    rows = list(startlist_form_query(datum, bankod))
+    for row in rows:
+        last = row["last_datum"]
+        row["gallop_rate"] = round(row["gallops"] / row["starts"], 3) if row["starts"] else 0.0
+        row["days_since_last"] = (day - _to_date(last)).days if last and last < datum else None
+    return rows
+
+
+def _rates(row: dict) -> dict:
+    n = row["starts"]
+    row["win_rate"] = round(row["wins"] / n, 3) if n else 0.0
+    row["top3_rate"] = round(row["top3"] / n, 3) if n else 0.0
+    row["avg_placering"] = round(row["placing_sum"] / n, 2) if n else None
+    return row
+
+
+def startlist_drivers(datum: int, bankod: Optional[str] = None) -> dict:
+    # Driver stats for every driver on a raceday's startlists and the stats of
+    # each driver with the horse they drive there. Three indexed reads: the
+    # card, driver_stats by kusk and driver_horse_stats by (kusk, namn_key).
+    # startlista keeps apostrophes in driver names and resultat does not, so
+    # the names are normalised here rather than joined in SQL.
+    card = StartList.objects.filter(startdatum=datum)
+    if bankod:
+        card = card.filter(bankod=bankod)
+    pairs = {(normalize_kusk(k), n) for k, n in card.values_list("kusk", "namn_key")}
+    kusks = sorted({k for k, _ in pairs if k})
+    drivers = [_rates(r) for r in DriverStats.objects.filter(kusk__in=kusks).values(*DRIVER_FIELDS)]
+    combos = [
+        _rates(r)
+        for r in DriverHorseStats.objects.filter(kusk__in=kusks, namn_key__in={n for _, n in pairs}).values(*PAIR_FIELDS)
+        if (r["kusk"], r["namn_key"]) in pairs
+    ]
+    return {"drivers": drivers, "pairs": combos}
+
+
+def raceday_card_sql(datum: int, bankod: Optional[str] = None, starts: int = CARD_STARTS) -> Tuple[str, list]:
+    # The day's startlista with each horse's last `starts` starts before the
+    # raceday, in one statement. Horses are matched on namn_key, which both
+    # tables store, so the join is resultat_namn_key_datum_idx ranges. A horse
+    # with no history keeps its one row with NULL history columns.
+    on_track = "AND c.bankod = %s" if bankod else ""
+    history = ", ".join(f"r.{f} AS h_{f}" for f in CARD_HISTORY_FIELDS)
+    sql = f"""
+        SELECT s.bankod, s.lopp, s.nr, s.namn, s.spar, s.distans, s.kusk, s.starttid,
+               EXISTS (
+                   SELECT 1 FROM resultat x
+                   WHERE x.datum = s.startdatum AND x.bankod = s.bankod AND x.lopp = s.lopp
+                     AND x.namn = s.namn AND x.placering = 99
+               ) AS struken,
+               {", ".join(f"h.h_{f}" for f in CARD_HISTORY_FIELDS)}
+        FROM startlista s
+        LEFT JOIN (
+            SELECT c.id AS start_id, {history},
+                   ROW_NUMBER() OVER (PARTITION BY c.id ORDER BY r.datum DESC, r.id DESC) AS rn
+            FROM startlista c
+            JOIN resultat r ON r.namn_key = c.namn_key AND r.datum < c.startdatum
+            WHERE c.startdatum = %s {on_track} AND c.namn_key <> ''
+              AND r.placering IS NOT NULL AND r.placering NOT IN (0, 99)
+        ) h ON h.start_id = s.id AND h.rn <= %s
+        WHERE s.startdatum = %s {on_track.replace("c.", "s.")}
+        ORDER BY s.bankod, s.lopp, s.nr, h.rn
+    """
+    params = [datum, *([bankod] if bankod else []), starts, datum, *([bankod] if bankod else [])]
+    return sql, params
+
+
+def raceday_card(datum: int, bankod: Optional[str] = None, starts: int = CARD_STARTS) -> List[dict]:
+    # A raceday's starters, each with "history": its last starts, newest
+    # first. One round trip for the whole card.
+    starts = max(1, min(starts, MAX_CARD_STARTS))
+    sql, params = raceday_card_sql(datum, bankod, starts)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+
+    card: List[dict] = []
+    n = len(CARD_FIELDS)
+    for row in rows:
+        key = row[:3]
+        if not card or (card[-1]["bankod"], card[-1]["lopp"], card[-1]["nr"]) != key:
+            starter = dict(zip(CARD_FIELDS, row[:n]))
+            starter["struken"] = bool(starter["struken"])
+            starter["history"] = []
+            card.append(starter)
+        if row[n] is not None:
+            card[-1]["history"].append(dict(zip(CARD_HISTORY_FIELDS, row[n:])))
+    return card
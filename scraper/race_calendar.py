@@ -0,0 +1,100 @@
+import re, time
+from datetime import date
+from typing import Dict, Optional
+from urllib.parse import urljoin
+from playwright.async_api import Error as PlaywrightError
+
+from scraper.crawl import SPORTAPP_BASE, open_browser, open_page
+from scraper.instrumentation import COUNT_BUCKETS, lap, metrics
+
+SWEDISH_MONTH_BY_NUMBER = {
+    1: "januari", 2: "februari", 3: "mars", 4: "april", 5: "maj", 6: "juni",
+    7: "juli", 8: "augusti", 9: "september", 10: "oktober", 11: "november", 12: "december",
+}
+CALENDAR_PATH = "/race/calendar/race?year={year}&competition=SPORT&month={month:02d}"
+
+# kind is the raceday sub page the link points to: "results" or "startlist".
+FIRST_LINK_FOR_DAY_JS = """
+({ day, monthName, kind }) => {
+    const normalize = (value) => (value || "")
+        .normalize("NFKD")
+        .replace(/\\s+/g, " ")
+        .trim()
+        .toLowerCase();
+    const datePattern = new RegExp(`(?:^|\\\\D)${day}\\\\s+${monthName}(?:\\\\b|$)`, "i");
+    const headers = Array.from(document.querySelectorAll("h2"));
+    const index = headers.findIndex((header) => datePattern.test(normalize(header.textContent)));
+    if (index === -1) {
+        return null;
+    }
+
+    const header = headers[index];
+    const nextHeader = headers[index + 1] || null;
+    const links = Array.from(document.querySelectorAll(`a[href*='/race/raceday/ts'][href*='/${kind}']`));
+    const before = (left, right) => Boolean(left.compareDocumentPosition(right) & Node.DOCUMENT_POSITION_FOLLOWING);
+
+    for (const link of links) {
+        if (!before(header, link)) {
+            continue;
+        }
+        if (nextHeader && !before(link, nextHeader)) {
+            continue;
+        }
+        return link.getAttribute("href");
+    }
+
+    return null;
+}
+"""
+
+
+def ts_id_from_href(href: str, kind: str) -> Optional[int]:
+    m = re.search(rf"/race/raceday/ts(\d+)/{kind}", href or "")
+    return int(m.group(1)) if m else None
+
+
+async def find_first_ts_ids(page, wanted: Dict[str, date], max_scrolls: int = 30) -> Dict[str, Optional[int]]:
+    # wanted maps a link kind to the day to look up. Each calendar month is loaded
+    # once no matter how many kinds are looked up in it.
+    found: Dict[str, Optional[int]] = {kind: None for kind in wanted}
+    by_month: Dict[tuple, list] = {}
+    for kind, day in wanted.items():
+        by_month.setdefault((day.year, day.month), []).append(kind)
+
+    for (year, month), kinds in by_month.items():
+        t0 = time.perf_counter()
+        scrolls = 0
+        try:
+            await page.goto(urljoin(SPORTAPP_BASE, CALENDAR_PATH.format(year=year, month=month)), timeout=60_000, wait_until="domcontentloaded")
+            await page.wait_for_selector("h2", timeout=60_000)
+            t0 = lap("calendar_load", t0, kind="calendar")
+
+            pending = list(kinds)
+            for scrolls in range(max_scrolls):
+                for kind in list(pending):
+                    day = wanted[kind]
+                    href = await page.evaluate(
+                        FIRST_LINK_FOR_DAY_JS,
+                        {"day": day.day, "monthName": SWEDISH_MONTH_BY_NUMBER[day.month], "kind": kind},
+                    )
+                    if href:
+                        found[kind] = ts_id_from_href(urljoin(SPORTAPP_BASE, href), kind)
+                        pending.remove(kind)
+                if not pending:
+                    break
+                await page.mouse.wheel(0, 2500)
+                await page.wait_for_timeout(250)
+        except PlaywrightError:
+            metrics.inc("page_errors_total", kind="calendar", error="playwright")
+            continue
+        finally:
+            lap("calendar_search", t0, kind="calendar")
+            metrics.observe("calendar_scrolls", scrolls, buckets=COUNT_BUCKETS)
+
+    return found
+
+
+async def find_first_ts_id_for_date(target_day: date, kind: str, max_scrolls: int = 30) -> Optional[int]:
+    async with open_browser() as browser, open_page(browser) as page:
+        found = await find_first_ts_ids(page, {kind: target_day}, max_scrolls=max_scrolls)
+    return found[kind]
@@ -0,0 +1,249 @@
+import json, logging, os, shutil
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+from django.conf import settings
+from django.db import models
+from django.utils import timezone
+
+from scraper.models import HorseResult
+
+# Columnar copy of resultat for the modelling scripts:
+#
+#   <dir>/manifest.json              columns, dtypes, per year its rows and
+#                                    directory, stale years
+#   <dir>/dict.g<n>/<column>.json    dictionary for a text column; code = index
+#   <dir>/<year>.g<n>/<column>.npy   one typed array per column, rows ordered
+#                                    by datum, bankod, lopp, nr; written by
+#                                    refresh n
+#
+# Text columns are stored as integer codes into an append-only dictionary, so
+# codes stay valid across refreshes. NULL integers are INT_NULL, NULL floats
+# NaN. A refresh writes its years into new directories, then the extended
+# dictionaries (a --full rebuild starts new ones in a new directory), and
+# replaces the manifest last. Readers resolve every path from the manifest
+# they loaded, so a reader never sees half a refresh: the directories it
+# points at are never modified, and those of the previous refresh are only
+# deleted by the next one.
+#
+# Changed races reach build_snapshot through the "snapshot" dirty queue, which
+# the writers only fill when RESULTAT_SNAPSHOT_DIR is set (dirty.CONSUMERS).
+
+FORMAT = 2
+INT_NULL = int(np.iinfo(np.int32).min)
+CONSUMER = "snapshot"
+
+
+def _dtype(field: models.Field) -> str:
+    if isinstance(field, models.BigAutoField):
+        return "int64"
+    if isinstance(field, models.IntegerField):
+        return "int32"
+    if isinstance(field, models.FloatField):
+        return "float64"
+    if isinstance(field, models.CharField):
+        return "int16" if field.max_length <= 20 else "int32"
+    raise TypeError(f"No snapshot dtype for {field.name} ({type(field).__name__})")
+
+
+# namn_key is a function of namn and only serves the startlist join.
+FIELDS = [f for f in HorseResult._meta.concrete_fields if f.name != "namn_key"]
+COLUMNS = {f.column: _dtype(f) for f in FIELDS}
+TEXT_COLUMNS = [f.column for f in FIELDS if isinstance(f, models.CharField)]
+ORDER = ("datum", "bankod", "lopp", "nr", "id")
+
+
+def default_dir() -> Path:
+    if not settings.RESULTAT_SNAPSHOT_DIR:
+        raise ValueError("RESULTAT_SNAPSHOT_DIR is not set.")
+    return Path(settings.RESULTAT_SNAPSHOT_DIR)
+
+
+def _write_json(path: Path, data) -> None:
+    tmp = path.with_name(f".{path.name}.tmp")
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(data, fh, ensure_ascii=False)
+        fh.flush()
+        os.fsync(fh.fileno())
+    os.replace(tmp, path)
+
+
+def read_manifest(root: Path) -> Optional[dict]:
+    try:
+        with open(root / "manifest.json", encoding="utf-8") as fh:
+            return json.load(fh)
+    except FileNotFoundError:
+        return None
+
+
+class Writer:
+    def __init__(self, root: Path, full: bool = False):
+        # full: every year will be rebuilt, into new dictionaries.
+        self.root = root
+        root.mkdir(parents=True, exist_ok=True)
+        manifest = read_manifest(root)
+        if manifest is not None and (manifest.get("format") != FORMAT or manifest.get("columns") != COLUMNS):
+            if not full:
+                raise ValueError(f"{root} holds a snapshot with another layout; rebuild it with --full.")
+            manifest = None   # its directories are swept by commit()
+        self.manifest = manifest or {
+            "format": FORMAT, "columns": COLUMNS, "int_null": INT_NULL, "generation": 0,
+            "dict": "dict.g0", "years": {}, "stale_years": [],
+        }
+        # What readers of the manifest as loaded can still open.
+        self.previous = {entry["dir"] for entry in self.manifest["years"].values()} | {self.manifest["dict"]}
+        self.dict_dir = f"dict.g{self.manifest['generation'] + 1}" if full else self.manifest["dict"]
+        # year -> {"rows", "dir"} written by this refresh, None for a year
+        # that has no rows any more.
+        self.built: Dict[int, Optional[dict]] = {}
+        self.values: Dict[str, List[str]] = {}
+        self.codes: Dict[str, Dict[str, int]] = {}
+        for col in TEXT_COLUMNS:
+            path = root / self.dict_dir / f"{col}.json"
+            self.values[col] = json.loads(path.read_text(encoding="utf-8")) if not full and path.exists() else []
+            self.codes[col] = {v: i for i, v in enumerate(self.values[col])}
+
+    def mark_stale(self, years: Iterable[int]) -> None:
+        # Persisted before the dirty rows are deleted, so a crash between the two
+        # rebuilds the year next time instead of losing the change.
+        stale = set(self.manifest["stale_years"]) | {int(y) for y in years}
+        self.manifest["stale_years"] = sorted(stale)
+        _write_json(self.root / "manifest.json", self.manifest)
+
+    def database_years(self) -> List[int]:
+        datums = HorseResult.objects.order_by("datum").values_list("datum", flat=True).distinct()
+        return sorted({d // 10000 for d in datums.iterator()})
+
+    def _encode(self, col: str, value: Optional[str]) -> int:
+        value = value or ""
+        code = self.codes[col].get(value)
+        if code is None:
+            code = self.codes[col][value] = len(self.values[col])
+            self.values[col].append(value)
+        return code
+
+    def _arrays(self, year: int) -> Dict[str, np.ndarray]:
+        qs = (
+            HorseResult.objects.filter(datum__gte=year * 10000, datum__lte=year * 10000 + 9999)
+            .order_by(*ORDER)
+            .values_list(*(f.attname for f in FIELDS))
+        )
+        cols: List[list] = [[] for _ in FIELDS]
+        for row in qs.iterator(chunk_size=20_000):
+            for values, value in zip(cols, row):
+                values.append(value)
+
+        arrays = {}
+        for field, values in zip(FIELDS, cols):
+            col, dtype = field.column, COLUMNS[field.column]
+            if col in TEXT_COLUMNS:
+                arrays[col] = np.fromiter((self._encode(col, v) for v in values), dtype=dtype, count=len(values))
+            elif dtype == "float64":
+                arrays[col] = np.array([np.nan if v is None else v for v in values], dtype=dtype)
+            else:
+                arrays[col] = np.array([INT_NULL if v is None else v for v in values], dtype=dtype)
+        return arrays
+
+    def build_year(self, year: int) -> int:
+        # Into a directory no manifest points at yet; readers see it only
+        # after commit().
+        arrays = self._arrays(year)
+        n = len(arrays["id"])
+        if not n:
+            self.built[year] = None
+            return 0
+
+        name = f"{year}.g{self.manifest['generation'] + 1}"
+        path = self.root / name
+        shutil.rmtree(path, ignore_errors=True)   # left by a crashed refresh
+        path.mkdir()
+        for col, arr in arrays.items():
+            np.save(path / f"{col}.npy", arr, allow_pickle=False)
+        self.built[year] = {"rows": n, "dir": name}
+        return n
+
+    def commit(self, rebuilt: Iterable[int]) -> None:
+        # Dictionaries before the manifest: a new year never points past the
+        # end of a dictionary a reader can load, and older readers only ever
+        # see dictionaries grow.
+        (self.root / self.dict_dir).mkdir(exist_ok=True)
+        for col in TEXT_COLUMNS:
+            _write_json(self.root / self.dict_dir / f"{col}.json", self.values[col])
+
+        done = set(rebuilt)
+        for year in done:
+            entry = self.built.get(year)
+            if entry is None:
+                self.manifest["years"].pop(str(year), None)
+            else:
+                self.manifest["years"][str(year)] = entry
+        self.manifest["generation"] += 1
+        self.manifest["dict"] = self.dict_dir
+        self.manifest["stale_years"] = [y for y in self.manifest["stale_years"] if y not in done]
+        self.manifest["refreshed_at"] = timezone.now().isoformat()
+        _write_json(self.root / "manifest.json", self.manifest)
+
+        # Readers of the previous manifest may still open its directories;
+        # anything older (or left by a crash) goes.
+        keep = self.previous | {entry["dir"] for entry in self.manifest["years"].values()} | {self.dict_dir}
+        for path in self.root.iterdir():
+            if path.is_dir() and path.name not in keep:
+                shutil.rmtree(path, ignore_errors=True)
+        logging.info("  snapshot: rebuilt %s", ", ".join(map(str, sorted(done))) or "nothing")
+
+
+class Snapshot:
+    # Read side. Arrays are np.load(mmap_mode="r"): opening is a few syscalls
+    # and pages come from the OS cache, so nothing is copied until a column
+    # spanning several years is concatenated.
+
+    def __init__(self, root: Optional[Path] = None):
+        self.root = Path(root) if root is not None else default_dir()
+        self.manifest = read_manifest(self.root)
+        if self.manifest is None:
+            raise FileNotFoundError(f"No snapshot in {self.root}; run build_snapshot first.")
+        self._dicts: Dict[str, np.ndarray] = {}
+
+    @property
+    def years(self) -> List[int]:
+        return sorted(int(y) for y in self.manifest["years"])
+
+    @property
+    def rows(self) -> int:
+        return sum(entry["rows"] for entry in self.manifest["years"].values())
+
+    @property
+    def columns(self) -> List[str]:
+        return list(self.manifest["columns"])
+
+    def partition(self, year: int, columns: Optional[Iterable[str]] = None) -> Dict[str, np.ndarray]:
+        return {
+            col: np.load(self.root / self.manifest["years"][str(year)]["dir"] / f"{col}.npy", mmap_mode="r")
+            for col in (columns or self.columns)
+        }
+
+    def column(self, name: str, years: Optional[Iterable[int]] = None) -> np.ndarray:
+        parts = [self.partition(y, [name])[name] for y in (years or self.years)]
+        if len(parts) == 1:
+            return parts[0]
+        if not parts:
+            return np.empty(0, dtype=self.manifest["columns"][name])
+        return np.concatenate(parts)
+
+    def load(self, columns: Optional[Iterable[str]] = None, years: Optional[Iterable[int]] = None) -> Dict[str, np.ndarray]:
+        return {col: self.column(col, years) for col in (columns or self.columns)}
+
+    def dictionary(self, name: str) -> np.ndarray:
+        if name not in self._dicts:
+            values = json.loads((self.root / self.manifest["dict"] / f"{name}.json").read_text(encoding="utf-8"))
+            self._dicts[name] = np.array(values, dtype=object)
+        return self._dicts[name]
+
+    def decode(self, name: str, codes: np.ndarray) -> np.ndarray:
+        return self.dictionary(name)[codes]
+
+    def code(self, name: str, value: str) -> Optional[int]:
+        # For filtering on codes: snap.column("bankod") == snap.code("bankod", "S").
+        hits = np.flatnonzero(self.dictionary(name) == value)
+        return int(hits[0]) if len(hits) else None
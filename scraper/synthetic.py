@@ -0,0 +1,185 @@
+import itertools, random
+from dataclasses import dataclass
+from datetime import date, time as dt_time, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from scraper.normalize import name_key
+
+# Synthetic racedays for generate_synthetic: the shape of production data
+# (tracks weighted by how often they race, 8-12 races of 8-15 starters, the
+# usual distances, horses that start every few weeks over a career, drivers
+# with a long tail) without any real names. Everything follows from the seed.
+
+# Approximate racedays per year for the bigger tracks; the rest race ~10 times.
+RACEDAY_WEIGHTS = {
+    "S": 60, "Å": 45, "J": 45, "B": 35, "Ro": 30, "Mp": 30, "F": 30, "E": 30, "Ax": 30, "Hd": 28,
+    "G": 28, "Ös": 28, "U": 26, "Kr": 22, "Ö": 22, "Bs": 20, "D": 20, "Bo": 18, "År": 16, "Sk": 16,
+    "L": 14, "Sä": 12, "Vi": 10, "Ar": 10, "Åm": 8, "Ly": 6, "Rä": 4, "Ov": 3, "Hg": 3, "Vd": 2,
+}
+RACEDAYS_PER_DAY = (1, 2, 2, 3, 3, 3, 4)
+
+# (distance, autostart share) and how often each distance is run.
+DISTANCES = ((1640, 1.0), (2140, 0.6), (2640, 0.1), (1609, 1.0), (3140, 0.0), (2160, 0.2))
+DISTANCE_WEIGHTS = (22, 48, 18, 5, 4, 3)
+STARTERS = range(8, 16)
+STARTER_WEIGHTS = (4, 5, 6, 8, 10, 12, 20, 15)
+
+PRIZES = (15_000, 20_000, 25_000, 30_000, 40_000, 50_000, 70_000, 100_000, 200_000, 500_000)
+PRIZE_WEIGHTS = (10, 20, 18, 15, 12, 10, 7, 5, 2, 1)
+
+NAME_HEADS = (
+    "Staro", "Global", "Mellby", "Önas", "Järvsö", "Readly", "Power", "Vivid", "Prince", "Lady", "Don",
+    "Hail", "Ecurie", "Star", "Who's", "Chapuy", "Björk", "Dream", "Sir", "Iron", "Zola", "Bold", "Frost",
+    "Villa", "Golden", "Nordic", "Ruby", "Brodda", "Tuscan", "Muscle",
+)
+NAME_TAILS = (
+    "Kronos", "Trix", "Fighter", "Mary", "Express", "Victory", "Boy", "Bigi", "Mearas", "Princess",
+    "Hästen", "Fröken", "Sign", "Åsa", "Boko", "Hill", "Sund", "Mission", "Diamond", "Comet", "River",
+    "Storm", "Queen", "King", "Legend", "Spirit", "Flash", "Brick", "Gold", "Cash",
+)
+DRIVER_FIRST = ("Erik", "Björn", "Örjan", "Magnus", "Carl", "Ulf", "Per", "Kevin", "Mats", "Jorma",
+                "Johan", "Peter", "Daniel", "Oskar", "Rikard", "Anna", "Sofia", "Emilia", "Linda", "Hanna")
+DRIVER_LAST = ("Andersson", "Goop", "Adielsson", "Djuse", "Jepson", "Ohlsson", "Linderoth", "Kihlström",
+               "Kontio", "Untersteiner", "Ingves", "Wäjersten", "Skoglund", "Eriksson", "Lindqvist",
+               "Persson", "Nilsson", "Svensson", "Berg", "Ek")
+
+RESULTAT_FIELDS = ("datum", "bankod", "lopp", "nr", "namn", "namn_key", "distans", "spar", "placering", "tid",
+                   "startmetod", "galopp", "underlag", "pris", "odds", "kusk")
+STARTLISTA_FIELDS = (
+    "startdatum", "bankod", "lopp", "nr", "namn", "namn_key", "spar", "distans", "kusk", "starttid", "ts_id",
+)
+PROPOSITION_FIELDS = ("startdatum", "bankod", "namn", "proposition", "distans", "kuskanskemal")
+
+
+@dataclass
+class Raceday:
+    day: date
+    bankod: str
+    ts_id: int
+    resultat: List[tuple]
+    startlista: List[tuple]
+    proposition: List[tuple]
+
+
+def horse_name(i: int) -> str:
+    # Unique for every i: head and tail cycle, the suffix counts the laps.
+    head = NAME_HEADS[i % len(NAME_HEADS)]
+    tail = NAME_TAILS[(i // len(NAME_HEADS)) % len(NAME_TAILS)]
+    lap = i // (len(NAME_HEADS) * len(NAME_TAILS))
+    return f"{head} {tail} {lap}".upper() if lap else f"{head} {tail}".upper()
+
+
+def driver_name(i: int) -> str:
+    first = DRIVER_FIRST[i % len(DRIVER_FIRST)]
+    last = DRIVER_LAST[(i // len(DRIVER_FIRST)) % len(DRIVER_LAST)]
+    lap = i // (len(DRIVER_FIRST) * len(DRIVER_LAST))
+    return f"{first} {last}" + (f" {lap}" if lap else "")
+
+
+def _zipf_weights(n: int, s: float = 1.1) -> List[float]:
+    return [1 / (k ** s) for k in range(1, n + 1)]
+
+
+class Generator:
+    def __init__(self, seed: int = 41, horses_active: int = 12_000, career_days: int = 1_500,
+                 drivers: int = 1_500, bankod_weights: Optional[Dict[str, float]] = None,
+                 first_ts_id: int = 400_000):
+        self.rnd = random.Random(seed)
+        self.horses_active = horses_active
+        self.career_days = career_days
+        self.driver_ids = range(drivers)
+        # Cumulative, so a pick is a bisect and not a pass over every weight.
+        self.driver_cum = list(itertools.accumulate(_zipf_weights(drivers)))
+        weights = bankod_weights or RACEDAY_WEIGHTS
+        self.bankods = list(weights)
+        self.bankod_weights = [weights[b] for b in self.bankods]
+        self.next_ts_id = first_ts_id
+
+    def _horse_pool(self, day_no: int) -> range:
+        # A window of horse ids slides forward one career per career_days, so a
+        # horse races for ~career_days and a new crop keeps coming in.
+        first = day_no * self.horses_active // self.career_days
+        return range(first, first + self.horses_active)
+
+    def _driver(self) -> str:
+        return driver_name(self.rnd.choices(self.driver_ids, cum_weights=self.driver_cum)[0])
+
+    def _tracks_for_day(self) -> List[str]:
+        n = self.rnd.choice(RACEDAYS_PER_DAY)
+        picked: List[str] = []
+        while len(picked) < min(n, len(self.bankods)):
+            b = self.rnd.choices(self.bankods, self.bankod_weights)[0]
+            if b not in picked:
+                picked.append(b)
+        return picked
+
+    def raceday(self, day: date, day_no: int, bankod: str) -> Raceday:
+        rnd = self.rnd
+        datum = int(day.strftime("%Y%m%d"))
+        ts_id = self.next_ts_id
+        self.next_ts_id += 1
+        winter = day.month in (12, 1, 2)
+        pool = self._horse_pool(day_no)
+
+        resultat, startlista, proposition = [], [], []
+        n_races = rnd.choices((8, 9, 10, 11, 12), (10, 20, 30, 25, 15))[0]
+        first_start = dt_time(rnd.choice((12, 13, 18, 18, 19)), rnd.choice((0, 15, 30, 45)))
+        for lopp in range(1, n_races + 1):
+            distans, auto_share = rnd.choices(DISTANCES, DISTANCE_WEIGHTS)[0]
+            autostart = rnd.random() < auto_share
+            starters = rnd.choices(STARTERS, STARTER_WEIGHTS)[0]
+            pris = rnd.choices(PRIZES, PRIZE_WEIGHTS)[0]
+            minutes = first_start.hour * 60 + first_start.minute + (lopp - 1) * 25
+            starttid = dt_time((minutes // 60) % 24, minutes % 60)
+            underlag = "v" if winter and rnd.random() < 0.6 else rnd.choices(("", "n", "t"), (85, 10, 5))[0]
+
+            horses = rnd.sample(pool, starters)
+            places = list(range(1, starters + 1))
+            rnd.shuffle(places)
+            base = 12.0 + (1.0 if not autostart else 0.0) + (distans - 2140) / 2000
+            for nr, (horse, place) in enumerate(zip(horses, places), start=1):
+                namn = horse_name(horse)
+                kusk = self._driver()
+                galopp = "g" if rnd.random() < 0.08 else ""
+                if galopp and rnd.random() < 0.5:
+                    placering, tid = 15, 99.0
+                elif rnd.random() < 0.02:
+                    placering, tid = 99, None
+                else:
+                    placering = place if place <= 8 else 15
+                    tid = round(base + place * 0.15 + rnd.uniform(0, 1.2), 1)
+                resultat.append((
+                    datum, bankod, lopp, nr, namn, name_key(namn), distans, nr, placering, tid,
+                    "a" if autostart else "", galopp, underlag, pris, rnd.randint(15, 600) if rnd.random() < 0.9 else 999,
+                    kusk,
+                ))
+                startlista.append((datum, bankod, lopp, nr, namn, name_key(namn), nr, distans, kusk, starttid, ts_id))
+
+        # Propositions are written a few weeks ahead and draw more entries than
+        # the races end up with.
+        for prop in range(1, n_races + rnd.randint(1, 4)):
+            distans, _ = rnd.choices(DISTANCES, DISTANCE_WEIGHTS)[0]
+            for horse in rnd.sample(pool, rnd.randint(6, 24)):
+                wishes = " | ".join(
+                    f"{k}. {self._driver()}"
+                    for k in range(1, rnd.randint(1, 3) + 1)
+                )
+                proposition.append((datum, bankod, horse_name(horse), prop, distans, wishes[:120]))
+
+        return Raceday(day, bankod, ts_id, resultat, startlista, proposition)
+
+    def racedays(self, start: date, n: int) -> Iterator[Raceday]:
+        day, day_no, made = start, 0, 0
+        while made < n:
+            for bankod in self._tracks_for_day():
+                if made >= n:
+                    return
+                yield self.raceday(day, day_no, bankod)
+                made += 1
+            day += timedelta(days=1)
+            day_no += 1
+
+
+def bankod_weights_from_counts(counts: List[Tuple[str, int]]) -> Dict[str, float]:
+    # Shares from an existing resultat table, when there is one to copy.
+    return {bankod: float(n) for bankod, n in counts if bankod and n}
@@ -1,3 +1,681 @@
-from django.test import TestCase
+import asyncio, base64, gzip, tempfile
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.utils import timezone
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+
+from scraper import cache, derived, dirty, export, jobqueue, queries, snapshot, throttle, tracks
+from scraper.management.commands import capture_odds, scrape_results
+from scraper.models import CacheInvalidation, DirtyRace, HorseResult, OddsSnapshot, ScrapeJob, StartList, UnknownTrack
+from scraper.normalize import name_key, normalize_cell_text, normalize_kusk, normalize_name, parse_swe_int
+from scraper.normalize import normalize_startlista_kusk, normalize_startlista_name
+
+KUSK = "Anna Adielsson"
+NAN = float("nan")
+
+
+class DerivedMetricsTests(SimpleTestCase):
+    # Four races, worked out by hand. LOAD_FIELDS order, sorted by (datum,
+    # bankod, lopp) like the loader does.
+    ROWS = [
+        # S 1: nr 2 wins from 20 m behind; nr 4 has no time or placing, nr 5
+        # the "no time" sentinel.
+        (1, 20050319, "S", 1, 1, 2, 14.0, 2140, 100_000),
+        (2, 20050319, "S", 1, 2, 1, 15.0, 2160, 100_000),
+        (3, 20050319, "S", 1, 3, 3, 16.0, 2140, 100_000),
+        (4, 20050319, "S", 1, 4, None, None, 2140, 100_000),
+        (5, 20050319, "S", 1, 5, 15, 99.0, 2140, 100_000),
+        # S 2: a lone starter.
+        (6, 20050319, "S", 2, 1, 1, 13.5, 1640, 20_000),
+        # U 1: the winner has no valid time, so the best time is the reference.
+        (7, 20050319, "U", 1, 1, 1, 99.0, 2640, 50_000),
+        (8, 20050319, "U", 1, 2, 2, 15.5, 2640, 50_000),
+        # Next day: nothing known but the start.
+        (9, 20050320, "S", 1, 1, None, None, None, None),
+    ]
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.m = derived.compute_metrics(derived.load_arrays(cls.ROWS))
+
+    def check(self, name, expected):
+        np.testing.assert_allclose(self.m[name], np.array(expected, dtype=float), atol=1e-9, err_msg=name)
+
+    def test_handicap(self):
+        # 20 m at 1.15,0: (60 + 15) * 20 / 2140 = 0.7009 s of credit.
+        self.check("tillagg", [0, 20, 0, 0, 0, 0, 0, 0, NAN])
+        self.check("tillagg_tid", [0, 0.70, 0, NAN, NAN, 0, NAN, 0, NAN])
+        self.check("ny_tid", [14.0, 14.30, 16.0, NAN, 99.0, 13.5, 99.0, 15.5, NAN])
+
+    def test_winner_diff(self):
+        self.check("lopp_tid", [15.0] * 5 + [13.5, 15.5, 15.5, NAN])
+        self.check("diff_tid", [-1.0, 0.0, 1.0, NAN, NAN, 0.0, NAN, 0.0, NAN])
+        # Against the winner's handicap-adjusted time, 14.2991.
+        self.check("diff_vinst", [-0.30, 0.0, 1.70, NAN, NAN, 0.0, NAN, 0.0, NAN])
+
+    def test_field_mean_diff(self):
+        # Mean of the valid ny_tid: (14.0 + 14.2991 + 16.0) / 3 = 14.7664.
+        self.check("diff_medel", [-0.77, -0.47, 1.23, NAN, NAN, 0.0, NAN, 0.0, NAN])
+
+    def test_sort_keys(self):
+        self.check("sortering_plac", [2, 1, 3, 5, 4, 1, 1, 2, 1])
+        # Rows without a valid time share the last rank.
+        self.check("sortering_tid", [1, 2, 3, 4, 4, 1, 2, 1, 1])
+        self.check("sortering", [2, 1, 3, 5, 4, 1, 1, 2, 1])
+
+    def test_class_from_prize(self):
+        self.check("lopp_klass", [5.0] * 5 + [4.301, 4.699, 4.699, NAN])
+        # Prize rank per track and day, class rank across the day's tracks.
+        self.check("sortering_pris", [1] * 5 + [2, 1, 1, 1])
+        self.check("sortering_klass", [1] * 5 + [3, 2, 2, 1])
+
+
+def result_row(lopp, nr, namn, **kw):
+    fields = dict(
+        datum=20050319, bankod="S", lopp=lopp, nr=nr, namn=namn, distans=2140, spar=nr, placering=nr,
+        tid=14.0 + nr, startmetod="a", galopp="", underlag="", kusk=KUSK, pris=100_000,
+    )
+    fields.update(kw)
+    return scrape_results.Row(**fields)
+
+
+class DirtyRaceTests(TestCase):
+    def test_marks_coalesce_per_consumer(self):
+        keys = [(20050319, "S", 1), (20050319, "S", 1), ("20050319", "S", "1"), (20050319, "S", 2)]
+        self.assertEqual(dirty.mark_races_dirty(keys, ("derived", "form")), 2)
+        self.assertEqual(dirty.mark_races_dirty(keys[:1], ("derived",)), 1)
+        self.assertEqual(DirtyRace.objects.count(), 4)
+
+    def test_drain_deletes_only_what_was_refreshed(self):
+        keys = [(20050319, "S", lopp) for lopp in range(1, 6)]
+        dirty.mark_races_dirty(keys, ("derived", "form"))
+
+        with self.assertRaises(RuntimeError), dirty.drain_dirty_races("derived", limit=2) as claimed:
+            self.assertEqual(len(claimed), 2)
+            raise RuntimeError("refresh failed")
+        self.assertEqual(dirty.pending_count("derived"), 5)
+
+        seen = []
+        races, rows = dirty.drain_all("derived", lambda batch: seen.extend(batch) or len(batch), limit=2)
+        self.assertEqual((races, rows), (5, 5))
+        self.assertEqual(sorted(seen), keys)
+        self.assertEqual(dirty.pending_count("derived"), 0)
+        self.assertEqual(dirty.pending_count("form"), 5)
+
+    def test_writer_marks_changed_races_with_its_rows(self):
+        rows = [result_row(1, 1, "Bold River"), result_row(1, 2, "Lady Spirit"), result_row(2, 1, "Nordic Star")]
+        self.assertEqual(scrape_results.write_rows_to_db(rows), 3)
+        self.assertEqual(
+            set(DirtyRace.objects.values_list("consumer", "lopp")),
+            {(c, lopp) for c in dirty.CONSUMERS for lopp in (1, 2)},
+        )
+
+        DirtyRace.objects.all().delete()
+        rows[2] = result_row(2, 1, "Nordic Star", placering=2)
+        self.assertEqual(scrape_results.write_rows_to_db(rows), 1)
+        self.assertEqual(set(DirtyRace.objects.values_list("lopp", flat=True)), {2})
+
+    def test_failed_write_leaves_neither_rows_nor_marks(self):
+        with mock.patch.object(scrape_results.cache, "invalidate", side_effect=RuntimeError("db gone")):
+            with self.assertRaises(RuntimeError):
+                scrape_results.write_rows_to_db([result_row(1, 1, "Bold River")])
+        self.assertFalse(HorseResult.objects.exists())
+        self.assertFalse(DirtyRace.objects.exists())
+
+
+class SnapshotTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        HorseResult.objects.bulk_create([
+            HorseResult(datum=20051230, bankod="S", lopp=1, nr=2, namn="Bold River", kusk=KUSK, tid=14.5),
+            HorseResult(datum=20051230, bankod="S", lopp=1, nr=1, namn="Lady Spirit", kusk="Bo Ek"),
+            HorseResult(datum=20060102, bankod="U", lopp=3, nr=1, namn="Bold River", kusk=KUSK, placering=1),
+        ])
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = Path(tmp.name)
+
+    def refresh(self, years, full=False):
+        writer = snapshot.Writer(self.root, full=full)
+        if not full:
+            writer.mark_stale(years)
+        for year in years:
+            writer.build_year(year)
+        writer.commit(years)
+
+    def test_round_trip(self):
+        self.refresh([2005, 2006], full=True)
+        snap = snapshot.Snapshot(self.root)
+        self.assertEqual((snap.years, snap.rows), ([2005, 2006], 3))
+        data = snap.load()
+        # Ordered by datum, bankod, lopp, nr.
+        self.assertEqual(list(snap.decode("namn", data["namn"])), ["Lady Spirit", "Bold River", "Bold River"])
+        self.assertEqual(list(data["placering"]), [snapshot.INT_NULL, snapshot.INT_NULL, 1])
+        np.testing.assert_array_equal(data["tid"], [np.nan, 14.5, np.nan])
+        self.assertEqual(snap.code("bankod", "U"), data["bankod"][2])
+
+        # A refresh appends to the dictionaries and leaves what an open
+        # reader maps untouched.
+        HorseResult.objects.filter(datum=20060102).update(kusk="Ny Kusk")
+        self.refresh([2006])
+        self.assertEqual(list(snap.decode("kusk", snap.column("kusk"))), ["Bo Ek", KUSK, KUSK])
+        fresh = snapshot.Snapshot(self.root)
+        self.assertEqual(list(fresh.decode("kusk", fresh.column("kusk"))), ["Bo Ek", KUSK, "Ny Kusk"])
+        self.assertEqual(fresh.manifest["stale_years"], [])
+
+        # One refresh later the first 2006 directory is gone; the previous
+        # refresh's stays for its readers.
+        self.refresh([2006])
+        self.assertEqual(
+            sorted(p.name for p in self.root.iterdir() if p.is_dir()), ["2005.g1", "2006.g2", "2006.g3", "dict.g1"],
+        )
+
+    def test_year_without_rows_leaves_the_manifest(self):
+        self.refresh([2005, 2006], full=True)
+        HorseResult.objects.filter(datum=20060102).delete()
+        self.refresh([2006])
+        self.assertEqual(snapshot.Snapshot(self.root).years, [2005])
+
+    def test_refuses_to_run_when_nothing_queues_changes(self):
+        with mock.patch.object(dirty, "CONSUMERS", ("derived", "form", "driver")):
+            with self.assertRaisesMessage(CommandError, "RESULTAT_SNAPSHOT_DIR is not set"):
+                call_command("build_snapshot", "--path", str(self.root))
+        self.assertFalse((self.root / "manifest.json").exists())
+
+
+class NormalizeTests(SimpleTestCase):
+    # What the per-command copies returned before they moved to
+    # scraper/normalize.py, quirks included: stored names depend on them.
+    CASES = {
+        normalize_cell_text: [
+            (None, ""), ("\u00a0 Åby \n", "Åby"), ("A\u00a0\u00a0B", "A  B"),
+        ],
+        normalize_name: [
+            (None, ""), ("O'Neill  Trix*", "ONeill Trix"), ("D’n\nBoy", "Dn Boy"),
+            ("Don\u00a0Fighter", "Don Fighter"), (" *Who's Hästen ", "Whos Hästen"), ("A" * 60, "A" * 50),
+        ],
+        normalize_kusk: [
+            (None, ""), ("Örjan  Kihlström ", "Örjan Kihlström"), ("O’Brien\u00a0Jr", "OBrien Jr"),
+            # Whitespace collapses before the apostrophe goes.
+            ("A ' B", "A  B"), ("x" * 90, "x" * 80),
+        ],
+        normalize_startlista_name: [
+            (None, ""), ("Önas Fröken (SE) 5 år v", "ÖNAS FRÖKEN"), ("O'Neill Trix* 10 år s", "ONEILL TRIX"),
+            # Stripped before the star goes, so the leading space stays.
+            ("* Abc Def 10 år s", " ABC DEF"), ("Don (FR)", "DON"), ("Abc", "ABC"),
+        ],
+        parse_swe_int: [
+            (None, None), ("1.250.000", 1250000), ("(25 000)", 25000), ("25\u00a0000 kr", 25000),
+            ("kr", None), ("", None),
+        ],
+    }
+
+    def test_expected_outputs(self):
+        for fn, cases in self.CASES.items():
+            for value, expected in cases:
+                with self.subTest(fn=fn.__name__, value=value):
+                    self.assertEqual(fn(value), expected)
+
+    def test_startlist_driver_keeps_apostrophes(self):
+        self.assertEqual(normalize_startlista_kusk("  O'Brien\n Adielsson ", 80), "O'Brien Adielsson")
+        self.assertEqual(normalize_startlista_kusk("Anna  Adielsson", 10), "Anna Adiel")
+
+
+class NameKeyTests(SimpleTestCase):
+    # The startlist cell carries the age and sex after the name and is upper
+    # cased; the results cell keeps the case. Both sides must land on one key.
+    PAIRS = [
+        ("Önas Fröken (SE) 5 år v", "Önas Fröken (SE)"),
+        ("O'Neill Trix* 10 år s", "O’Neill Trix*"),
+        ("B.W.  Spirit 4 år h", "B.W. Spirit"),
+        ("Don\u00a0Fighter (FR) 3 år h", "Don  Fighter (FR)"),
+    ]
+
+    def test_startlist_and_results_names_share_a_key(self):
+        for startlist, results in self.PAIRS:
+            with self.subTest(startlist=startlist):
+                key = name_key(normalize_startlista_name(startlist))
+                self.assertTrue(key)
+                self.assertEqual(key, name_key(normalize_name(results.split("(")[0])))
+
+    def test_frozen_copy_in_migration_matches(self):
+        from importlib import import_module
+        frozen = import_module("scraper.migrations.0012_name_keys").name_key
+        for name in ("Önas Fröken", "ONEILL TRIX", "B.W. Spirit", "", None):
+            self.assertEqual(frozen(name), name_key(name))
+
+
+class TrackTests(TestCase):
+    # Against the names seeded by the track migration.
+    def setUp(self):
+        tracks.reload()
+        patcher = mock.patch.object(tracks, "_reported", set())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_names_with_and_without_diacritics(self):
+        for name, bankod in [
+            ("Åby", "Å"), ("ABY", "Å"), ("Göteborg Trav", "Gt"), ("GOTEBORG TRAV", "Gt"),
+            ("Bjärke", "Bj"), ("BJARKE", "Bj"), ("Tävlingsdag Bjärke", "Bj"), ("Dagsresultat  Solvalla", "S"),
+        ]:
+            with self.subTest(name=name):
+                self.assertEqual(tracks.track_to_bankod(name), bankod)
+        self.assertFalse(UnknownTrack.objects.exists())
+
+    def test_longest_name_in_text_wins(self):
+        self.assertEqual(tracks.find_bankod_in_text("Åby Stora Pris, Göteborg Trav 2024"), "Gt")
+        self.assertEqual(tracks.find_bankod_in_text("Prop. 12 Bjärke"), "Bj")
+        self.assertEqual(tracks.find_bankod_in_text("V75 pa Goteborg Trav"), "Gt")
+        # Names as written beat ASCII forms found in the stripped text.
+        self.assertEqual(tracks.find_bankod_in_text("ABY-loppet i Gävle"), "G")
+        self.assertIsNone(tracks.find_bankod_in_text("Prop. 12, 2140 m"))
+
+    def test_unknown_name_recorded_once_per_process(self):
+        for _ in range(3):
+            self.assertEqual(tracks.track_to_bankod("Startlista Nowhere Park"), "No")
+        unknown = UnknownTrack.objects.get()
+        self.assertEqual((unknown.name, unknown.fallback, unknown.occurrences), ("NOWHERE PARK", "No", 1))
+
+        tracks._reported.clear()
+        tracks.track_to_bankod("nowhere  park")
+        unknown.refresh_from_db()
+        self.assertEqual(unknown.occurrences, 2)
+
+
+class RacedayCardTests(TestCase):
+    DATUM = 20050320
+
+    @classmethod
+    def setUpTestData(cls):
+        StartList.objects.bulk_create(
+            StartList(startdatum=cls.DATUM, bankod="S", lopp=1, nr=nr, namn=namn, namn_key=name_key(namn), kusk=KUSK)
+            for nr, namn in enumerate(["BOLD RIVER", "LADY SPIRIT", "NEW STAR"], 1)
+        )
+        history = [
+            # Bold River, spelled as the results page does: three starts,
+            # an upcoming and a struck row that are not starts, and one on
+            # the raceday itself, which is not history.
+            (20050301, 1, 3), (20050305, 2, 1), (20050310, 3, 2), (20050312, 4, 0), (20050315, 5, 99),
+            (cls.DATUM, 1, 0),
+        ]
+        HorseResult.objects.bulk_create(
+            [HorseResult(datum=d, bankod="S", lopp=lopp, nr=1, namn="Bold River", namn_key="BOLDRIVER",
+                         placering=plac, kusk=KUSK) for d, lopp, plac in history]
+            + [
+                HorseResult(datum=20050301, bankod="S", lopp=2, nr=1, namn="Lady Spirit", namn_key="LADYSPIRIT",
+                            placering=5),
+                HorseResult(datum=cls.DATUM, bankod="S", lopp=1, nr=2, namn="LADY SPIRIT", namn_key="LADYSPIRIT",
+                            placering=99),
+            ]
+        )
+
+    def test_last_starts_per_horse_in_one_query(self):
+        with self.assertNumQueries(1):
+            card = queries.raceday_card(self.DATUM, starts=2)
+        self.assertEqual([c["namn"] for c in card], ["BOLD RIVER", "LADY SPIRIT", "NEW STAR"])
+        bold, lady, new = card
+        self.assertEqual([(h["datum"], h["placering"]) for h in bold["history"]], [(20050310, 2), (20050305, 1)])
+        self.assertEqual([h["datum"] for h in lady["history"]], [20050301])
+        self.assertEqual(new["history"], [])
+        self.assertEqual([c["struken"] for c in card], [False, True, False])
+
+        with self.assertNumQueries(1):
+            card = queries.raceday_card(self.DATUM, "S", starts=5)
+        self.assertEqual(len(card[0]["history"]), 3)
+
+
+class AdaptiveLimiterTests(SimpleTestCase):
+    def test_grows_about_one_slot_per_limit_of_healthy_pages(self):
+        limiter = throttle.AdaptiveLimiter(max_limit=8, initial=2)
+        for _ in range(2):
+            limiter.record_success(1.0)
+        self.assertAlmostEqual(limiter.limit, 2 + 1 / 2 + 1 / 2.5)
+        for _ in range(100):
+            limiter.record_success(1.0)
+        self.assertEqual(limiter.limit, 8)
+        self.assertEqual(limiter.peak_limit, 8)
+
+    def test_shrinks_when_latency_degrades(self):
+        limiter = throttle.AdaptiveLimiter(max_limit=8, initial=4, tolerance=2.0)
+        limiter.record_success(1.0)
+        grown = limiter.limit
+        for _ in range(10):
+            limiter.record_success(10.0)
+        self.assertLess(limiter.limit, grown)
+        self.assertGreaterEqual(limiter.limit, limiter.min_limit)
+
+    def test_halves_on_timeouts_once_per_cooldown(self):
+        limiter = throttle.AdaptiveLimiter(max_limit=16, initial=16, cooldown=5.0)
+        with mock.patch.object(throttle.time, "monotonic", return_value=1000.0):
+            limiter.record_failure(throttle.TransientPageError("goto failed"))
+            limiter.record_failure(PlaywrightTimeoutError("Timeout 60000ms exceeded"))
+        self.assertEqual(limiter.limit, 8)
+        with mock.patch.object(throttle.time, "monotonic", return_value=1005.0):
+            limiter.record_failure(PlaywrightTimeoutError("Timeout 60000ms exceeded"))
+        self.assertEqual(limiter.limit, 4)
+        with mock.patch.object(throttle.time, "monotonic", return_value=1010.0):
+            limiter.record_failure(throttle.TransientPageError("HTTP 503", status=503))
+        self.assertEqual((limiter.limit, limiter.timeouts, limiter.server_errors), (2, 3, 1))
+
+        # Not a capacity problem: counted, limit kept.
+        limiter.record_failure(ValueError("bad cell"))
+        self.assertEqual((limiter.limit, limiter.errors), (2, 5))
+
+    def test_never_below_min_limit(self):
+        limiter = throttle.AdaptiveLimiter(max_limit=4, initial=1, cooldown=0.0)
+        for _ in range(5):
+            limiter.record_failure(asyncio.TimeoutError())
+        self.assertEqual(limiter.limit, 1)
+
+    def test_acquire_waits_for_a_free_slot(self):
+        async def run():
+            limiter = throttle.AdaptiveLimiter(max_limit=4, initial=2)
+            await limiter.acquire()
+            await limiter.acquire()
+            with self.assertRaises(asyncio.TimeoutError):
+                await asyncio.wait_for(limiter.acquire(), 0.05)
+            await limiter.release()
+            await asyncio.wait_for(limiter.acquire(), 0.05)
+            return limiter.in_flight
+
+        self.assertEqual(asyncio.run(run()), 2)
+
+
+class RetryScheduleTests(SimpleTestCase):
+    def test_upper_bound_doubles_up_to_the_cap(self):
+        with mock.patch.object(throttle.random, "uniform", side_effect=lambda lo, hi: hi):
+            delays = [throttle.backoff_delay(attempt, 2.0, 30.0) for attempt in range(6)]
+        self.assertEqual(delays, [2.0, 4.0, 8.0, 16.0, 30.0, 30.0])
+
+    def test_full_jitter(self):
+        for attempt in range(6):
+            delays = [throttle.backoff_delay(attempt, 2.0, 30.0) for _ in range(200)]
+            self.assertTrue(all(0 <= d <= min(30.0, 2.0 * 2 ** attempt) for d in delays))
+            # Spread over the whole window, not clustered at the top.
+            self.assertLess(min(delays), 0.25 * min(30.0, 2.0 * 2 ** attempt))
+
+
+class ResponseCacheTests(TestCase):
+    # A cache of its own, with a check interval long enough that only the
+    # explicit sync() calls read the invalidation log.
+
+    def setUp(self):
+        self.responses = cache.ResponseCache(1024 * 1024, 3600.0)
+        self.responses.sync(force=True)
+
+    def test_committed_invalidation_evicts(self):
+        tag = cache.horse_tag("Bold River")
+        self.responses.put("a", b"{}", [tag], self.responses.generation)
+        self.responses.put("b", b"{}", [cache.horse_tag("Lady Spirit")], self.responses.generation)
+
+        with self.captureOnCommitCallbacks(execute=False):
+            cache.invalidate([tag])
+        self.assertEqual(self.responses.sync(force=True), 0)
+        self.assertIsNotNone(self.responses.get("a"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            cache.invalidate([tag])
+        self.assertEqual(self.responses.sync(force=True), 1)
+        self.assertIsNone(self.responses.get("a"))
+        self.assertIsNotNone(self.responses.get("b"))
+
+    def test_writers_append_and_readers_prune(self):
+        old = timezone.now() - cache.RETENTION - timedelta(minutes=1)
+        CacheInvalidation.objects.create(tag="horse:OLD", created_at=old)
+        with self.assertNumQueries(1), self.captureOnCommitCallbacks(execute=True):
+            cache.invalidate([cache.horse_tag("Bold River")])
+        self.assertEqual(CacheInvalidation.objects.count(), 2)
+
+        # setUp's sync pruned already; the next prune waits PRUNE_SECONDS.
+        self.responses.sync(force=True)
+        self.assertEqual(CacheInvalidation.objects.count(), 2)
+        self.responses._pruned_at -= cache.PRUNE_SECONDS
+        self.responses.sync(force=True)
+        self.assertEqual(list(CacheInvalidation.objects.values_list("tag", flat=True)), ["horse:BOLDRIVER"])
+
+    def test_race_tags_cover_only_the_races(self):
+        HorseResult.objects.bulk_create([
+            HorseResult(datum=20050319, bankod="S", lopp=1, nr=1, namn="Bold River", kusk=KUSK),
+            HorseResult(datum=20050319, bankod="S", lopp=2, nr=1, namn="Lady Spirit", kusk="Bo Ek"),
+        ])
+        self.assertEqual(
+            cache.race_tags([(20050319, "S", 1), ("20050319", "S", "1")]),
+            ["driver:Anna Adielsson", "horse:BOLDRIVER", "raceday:20050319"],
+        )
+
+    def test_writer_evicts_the_replaced_driver(self):
+        scrape_results.write_rows_to_db([result_row(1, 1, "Bold River")])
+        with self.captureOnCommitCallbacks(execute=True):
+            scrape_results.write_rows_to_db([result_row(1, 1, "Bold River", kusk="Bo Ek")])
+        tags = set(CacheInvalidation.objects.values_list("tag", flat=True))
+        self.assertTrue({cache.driver_tag(KUSK), cache.driver_tag("Bo Ek"), "horse:BOLDRIVER"} <= tags)
+
+    def test_response_computed_across_an_invalidation_is_not_stored(self):
+        tag = cache.horse_tag("Bold River")
+        since = self.responses.generation
+        with self.captureOnCommitCallbacks(execute=True):
+            cache.invalidate([tag])
+        self.responses.sync(force=True)
+        self.responses.put("a", b"{}", [tag], since)
+        self.assertIsNone(self.responses.get("a"))
+
+        # Nothing it depends on changed since.
+        self.responses.put("a", b"{}", [tag], self.responses.generation)
+        self.assertIsNotNone(self.responses.get("a"))
+
+    def test_response_stored_before_the_sync_is_evicted_by_it(self):
+        # put() does not poll the log itself; an invalidation committed while
+        # the response was computed is caught by the next sync.
+        tag = cache.horse_tag("Bold River")
+        since = self.responses.generation
+        with self.captureOnCommitCallbacks(execute=True):
+            cache.invalidate([tag])
+        with self.assertNumQueries(0):
+            self.responses.put("a", b"{}", [tag], since)
+        self.assertIsNotNone(self.responses.get("a"))
+        self.assertEqual(self.responses.sync(force=True), 1)
+        self.assertIsNone(self.responses.get("a"))
+
+
+class PagingTests(TestCase):
+    # Several starts on one datum: the cursor has to settle ties on id.
+
+    @classmethod
+    def setUpTestData(cls):
+        HorseResult.objects.bulk_create(
+            HorseResult(datum=datum, bankod="S", lopp=lopp, nr=1, namn="Bold River", kusk=KUSK)
+            for datum in (20050319, 20050320, 20050321)
+            for lopp in range(1, 6)
+        )
+
+    def pages(self, fetch, limit):
+        ids, cursor = [], None
+        while True:
+            page = fetch(cursor, limit)
+            ids += [row["id"] for row in page.rows]
+            if page.next_cursor is None:
+                return ids
+            cursor = page.next_cursor
+
+    def test_ascending_pages_cover_ties_once(self):
+        expected = list(HorseResult.objects.order_by("datum", "id").values_list("id", flat=True))
+        for limit in (1, 2, 4, 5, 7):
+            ids = self.pages(lambda cursor, n: queries.track_range("S", 20050319, 20050321, cursor, n), limit)
+            self.assertEqual(ids, expected)
+
+    def test_descending_pages_cover_ties_once(self):
+        self.assertEqual(normalize_kusk(KUSK), KUSK)
+        expected = list(HorseResult.objects.order_by("-datum", "-id").values_list("id", flat=True))
+        for limit in (1, 2, 4, 5, 7):
+            ids = self.pages(lambda cursor, n: queries.driver_history(KUSK, cursor, n), limit)
+            self.assertEqual(ids, expected)
+
+    def test_horse_history_pages_cover_ties_once(self):
+        # The name goes through normalize_name like a request's would.
+        expected = list(HorseResult.objects.order_by("-datum", "-id").values_list("id", flat=True))
+        for limit in (1, 3, 5, 15, 16):
+            ids = self.pages(lambda cursor, n: queries.horse_history("Bold  River*", cursor, n), limit)
+            self.assertEqual(ids, expected)
+
+    def test_invalid_cursor(self):
+        garbled = [
+            "not a cursor", "%%%", queries.encode_cursor([20050320]), queries.encode_cursor([20050320, 1, 2]),
+            base64.urlsafe_b64encode(b'{"datum":20050320,"id":1}').decode(), queries.encode_cursor([[20050320], 1]),
+            queries.encode_cursor([None, 1]), queries.encode_cursor(["x", 1])[:-3] + "@@@",
+        ]
+        for cursor in garbled:
+            with self.subTest(cursor=cursor), self.assertRaises(ValueError):
+                queries.horse_history("Bold River", cursor)
+
+
+class ExportTests(TestCase):
+    # The later date goes in first, so its id is the lowest: the resume point
+    # has to compare dates before ids.
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.late = HorseResult.objects.create(datum=20050302, bankod="S", lopp=1, nr=1, namn="Bold River", kusk=KUSK)
+        cls.early = [
+            HorseResult.objects.create(datum=20050301, bankod="S", lopp=lopp, nr=1, namn="Bold River", kusk=KUSK)
+            for lopp in (1, 2)
+        ]
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = Path(tmp.name)
+
+    def ids(self, after=None):
+        return [row[0] for row in export.rows("resultat", after=after, chunk_size=1)]
+
+    def test_after_settles_ties_on_id(self):
+        first, second = self.early
+        self.assertEqual(self.ids(), [first.id, second.id, self.late.id])
+        self.assertEqual(self.ids((20050301, first.id)), [second.id, self.late.id])
+        self.assertEqual(self.ids((20050301, second.id)), [self.late.id])
+        self.assertEqual(self.ids((20050302, self.late.id)), [])
+        with self.assertRaises(ValueError):
+            export.parse_after("20050301")
+
+    def export(self, out, *args):
+        call_command("export_table", "resultat", "--output", str(out), "--chunk-size", "1", *args)
+
+    def test_resume_appends_without_header(self):
+        out = self.root / "resultat.csv"
+        self.export(out, "--end-date", "2005-03-01")
+        self.export(out, "--after", f"20050301,{self.early[1].id}")
+        lines = out.read_text().splitlines()
+        self.assertEqual(lines[0].split(","), export.columns("resultat"))
+        self.assertEqual([int(line.split(",")[0]) for line in lines[1:]],
+                         [self.early[0].id, self.early[1].id, self.late.id])
+
+    def test_resumed_gzip_members_read_as_one_file(self):
+        plain, packed = self.root / "resultat.csv", self.root / "resultat.csv.gz"
+        self.export(plain)
+        self.export(packed, "--gzip", "--end-date", "2005-03-01")
+        self.export(packed, "--gzip", "--after", f"20050301,{self.early[1].id}")
+        with gzip.open(packed, "rt") as f:
+            self.assertEqual(f.read(), plain.read_text())
+
+        chunks = list(export.lines("resultat", "ndjson", export.rows("resultat"), chunk_size=1))
+        body = b"".join(export.encoded(chunks[:1], gzip=True)) + b"".join(export.encoded(chunks[1:], gzip=True))
+        self.assertEqual(gzip.decompress(body).decode(), "".join(chunks))
+
+
+class JobQueueTests(TestCase):
+    LEASE = 600
+
+    def setUp(self):
+        jobqueue.enqueue("results", [401, 402, 403])
+        jobqueue.enqueue("startlist", [401])
+
+    def test_claims_in_id_order_and_only_given_kinds(self):
+        jobs = jobqueue.claim(["results"], "w1", self.LEASE, 3, limit=2)
+        self.assertEqual([(j.kind, j.ts_id, j.state, j.worker, j.attempts) for j in jobs],
+                         [("results", 401, ScrapeJob.RUNNING, "w1", 1), ("results", 402, ScrapeJob.RUNNING, "w1", 1)])
+        self.assertEqual([j.ts_id for j in jobqueue.claim(["results"], "w2", self.LEASE, 3, limit=5)], [403])
+        self.assertEqual(jobqueue.claim(["results"], "w3", self.LEASE, 3), [])
+
+    def test_expired_lease_moves_to_another_worker(self):
+        job, = jobqueue.claim(["startlist"], "w1", self.LEASE, 3)
+        self.assertEqual(jobqueue.claim(["startlist"], "w2", self.LEASE, 3), [])
+
+        ScrapeJob.objects.filter(id=job.id).update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+        taken, = jobqueue.claim(["startlist"], "w2", self.LEASE, 3)
+        self.assertEqual((taken.id, taken.worker, taken.attempts), (job.id, "w2", 2))
+        # The first worker lost the lease, so neither its heartbeat nor its
+        # result counts.
+        self.assertEqual(jobqueue.renew([job.id], "w1", self.LEASE), 0)
+        self.assertFalse(jobqueue.complete(job, "w1", 10))
+        self.assertTrue(jobqueue.complete(taken, "w2", 10))
+
+    def test_failures_back_off_then_give_up(self):
+        job, = jobqueue.claim(["startlist"], "w1", self.LEASE, 2)
+        jobqueue.fail(job, "w1", "page failed", 2)
+        job.refresh_from_db()
+        self.assertEqual(job.state, ScrapeJob.PENDING)
+        self.assertGreater(job.lease_expires_at, timezone.now())
+        self.assertEqual(jobqueue.claim(["startlist"], "w1", self.LEASE, 2), [])
+        self.assertTrue(jobqueue.outstanding(["startlist"], 2))
+
+        ScrapeJob.objects.filter(id=job.id).update(lease_expires_at=timezone.now())
+        job, = jobqueue.claim(["startlist"], "w1", self.LEASE, 2)
+        jobqueue.fail(job, "w1", "page failed", 2)
+        job.refresh_from_db()
+        self.assertEqual(job.state, ScrapeJob.FAILED)
+        self.assertFalse(jobqueue.outstanding(["startlist"], 2))
+
+    def test_expired_last_attempt_is_failed(self):
+        job, = jobqueue.claim(["startlist"], "w1", self.LEASE, 1)
+        self.assertTrue(jobqueue.outstanding(["startlist"], 1))
+        self.assertEqual(jobqueue.fail_exhausted(1), 0)
+        ScrapeJob.objects.filter(id=job.id).update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(jobqueue.claim(["startlist"], "w2", self.LEASE, 1), [])
+        self.assertEqual(jobqueue.fail_exhausted(1), 1)
+        self.assertFalse(jobqueue.outstanding(["startlist"], 1))
+
+
+class WorkerExitTests(TransactionTestCase):
+    # The worker runs its queries in threads, which only see committed rows.
+
+    def test_exit_when_empty_waits_for_backoff(self):
+        jobqueue.enqueue("results", [401])
+        ScrapeJob.objects.update(attempts=1, lease_expires_at=timezone.now() + timedelta(seconds=0.3))
+
+        async def run_job(job, browser):
+            return 8
+
+        with mock.patch.object(jobqueue, "run_job", run_job):
+            finished = asyncio.run(jobqueue.work(None, ["results"], "w1", concurrency=2, lease_seconds=60,
+                                                 max_attempts=3, poll_seconds=0.05, exit_when_empty=True))
+        self.assertEqual(finished, 1)
+        job = ScrapeJob.objects.get()
+        self.assertEqual((job.state, job.rows, job.attempts), (ScrapeJob.DONE, 8, 2))
+
+
+class OddsLastValuesTests(TestCase):
+    def test_newest_sample_per_horse(self):
+        t0 = timezone.now()
+        samples = [
+            (20050320, "S", 1, 1, 0, 45), (20050320, "S", 1, 1, 60, 38), (20050320, "S", 1, 1, 120, None),
+            (20050320, "S", 1, 2, 60, 120), (20050320, "S", 1, 2, 0, 150),
+            (20050320, "S", 2, 1, 0, 31), (20050320, "Å", 1, 1, 30, 77),
+            (20050319, "S", 1, 1, 300, 12),
+        ]
+        OddsSnapshot.objects.bulk_create(
+            OddsSnapshot(datum=d, bankod=b, lopp=lopp, nr=nr, captured_at=t0 + timedelta(seconds=s), odds=odds)
+            for d, b, lopp, nr, s, odds in samples
+        )
+        self.assertEqual(capture_odds.load_last_values(20050320), {
+            (20050320, "S", 1, 1): None, (20050320, "S", 1, 2): 120,
+            (20050320, "S", 2, 1): 31, (20050320, "Å", 1, 1): 77,
+        })
+        self.assertEqual(capture_odds.load_last_values(20050321), {})
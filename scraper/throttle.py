@@ -0,0 +1,116 @@
+import asyncio, logging, random, time
+from typing import Optional
+
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+
+
+class TransientPageError(Exception):
+    # Raised by the page scrapers for failures worth retrying: navigation timeouts,
+    # 5xx and 429 responses.
+    def __init__(self, message: str, status: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+
+
+def check_response(response) -> None:
+    if response is not None and (response.status >= 500 or response.status == 429):
+        raise TransientPageError(f"HTTP {response.status} for {response.url}", status=response.status)
+
+
+def page_missing(response) -> bool:
+    # A 404 (an ID that is not a raceday) never renders rows, so there is no
+    # point waiting for the selectors to time out.
+    return response is not None and response.status == 404
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    # "Full jitter" exponential backoff: uniform in [0, min(cap, base * 2**attempt)].
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class AdaptiveLimiter:
+    # AIMD concurrency limit. The limit grows by about one slot per limit's worth of
+    # healthy pages and is halved on a timeout or 5xx (at most once per cooldown, so
+    # a burst of failures from one slow period counts once). "Healthy" means the
+    # latency average stays within `tolerance` times the best average seen.
+
+    def __init__(self, max_limit: int, initial: Optional[int] = None, min_limit: int = 1,
+                 tolerance: float = 2.0, cooldown: float = 5.0):
+        self.min_limit = min_limit
+        self.max_limit = max(min_limit, max_limit)
+        self.limit = float(min(self.max_limit, initial if initial is not None else max(min_limit, (max_limit + 1) // 2)))
+        self.tolerance = tolerance
+        self.cooldown = cooldown
+
+        self.in_flight = 0
+        self.latency_ewma: Optional[float] = None
+        self.baseline: Optional[float] = None
+        self.last_decrease = 0.0
+
+        self.ok = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.server_errors = 0
+        self.retries = 0
+        self.peak_limit = self.limit
+        self.low_limit = self.limit
+
+        self._cond = asyncio.Condition()
+
+    async def acquire(self):
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+    async def release(self):
+        async with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    def _track(self):
+        self.peak_limit = max(self.peak_limit, self.limit)
+        self.low_limit = min(self.low_limit, self.limit)
+
+    def record_success(self, latency: Optional[float]):
+        self.ok += 1
+        if latency is None:
+            return
+        self.latency_ewma = latency if self.latency_ewma is None else 0.8 * self.latency_ewma + 0.2 * latency
+        # The baseline follows the best average seen and drifts up slowly so a site
+        # that becomes permanently slower is accepted as the new normal.
+        if self.baseline is None:
+            self.baseline = self.latency_ewma
+        else:
+            self.baseline = min(self.baseline * 1.01, self.latency_ewma)
+
+        if self.latency_ewma <= self.tolerance * self.baseline:
+            self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+        else:
+            self.limit = max(self.min_limit, self.limit - 1.0 / self.limit)
+        self._track()
+
+    def record_failure(self, exc: BaseException):
+        self.errors += 1
+        status = getattr(exc, "status", None)
+        if status is not None and (status >= 500 or status == 429):
+            self.server_errors += 1
+        elif isinstance(exc, (TransientPageError, asyncio.TimeoutError, PlaywrightTimeoutError)):
+            self.timeouts += 1
+        else:
+            return
+
+        now = time.monotonic()
+        if now - self.last_decrease >= self.cooldown:
+            self.limit = max(self.min_limit, self.limit * 0.5)
+            self.last_decrease = now
+            self._track()
+
+    def summary(self) -> str:
+        return (
+            f"limit={self.limit:.1f} (range {self.low_limit:.1f}-{self.peak_limit:.1f}, max {self.max_limit}) "
+            f"ok={self.ok} errors={self.errors} timeouts={self.timeouts} 5xx={self.server_errors} "
+            f"retries={self.retries} latency_avg={self.latency_ewma or 0:.2f}s"
+        )
+
+    def log_state(self, label: str = ""):
+        logging.info("Controller%s: %s", f" {label}" if label else "", self.summary())
@@ -0,0 +1,198 @@
+import asyncio, logging, re, threading, unicodedata
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Optional
+
+from django.db import DatabaseError, connection
+from django.db.models import F
+from django.utils import timezone
+
+from scraper.models import Track, UnknownTrack
+from scraper.normalize import normalize_cell_text
+
+# Track name -> bankod, shared by all scrapers. The table lives in the `track`
+# table and is loaded once per process; every name is also indexed in its ASCII
+# form, so "ABY" and "ÅBY" both resolve. Names that do not resolve are logged
+# and recorded in `unknown_track` for review.
+
+NAV_PREFIXES = (
+    "TÄVLINGSDAGSRESULTAT",
+    "DAGSRESULTAT",
+    "STARTLISTA",
+    "TÄVLINGSDAG",
+    "TRAVTÄVLING",
+    "DAG",
+)
+
+_NON_LETTER_RE = re.compile(r"[^A-ZÅÄÖ\s]")
+
+
+def strip_diacritics(s: str) -> str:
+    return unicodedata.normalize("NFKD", s).encode("ascii", "ignore").decode()
+
+
+def strip_nav_prefixes(up: str) -> str:
+    s = (up or "").strip()
+    changed = True
+    while changed and s:
+        changed = False
+        for p in NAV_PREFIXES:
+            if s == p:
+                s = ""
+                changed = True
+                break
+            if s.startswith(p + " "):
+                s = s[len(p):].strip()
+                changed = True
+                break
+    return s
+
+
+def _trie_pattern(words: Iterable[str]) -> str:
+    # One alternation with shared prefixes factored out ("Å(?:BY|MÅL|RJÄNG)"), so
+    # the regex engine walks the text once instead of trying every name at every
+    # position. Optional tails are greedy: the longest name at a position wins.
+    trie: dict = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def build(node) -> str:
+        terminal = "" in node
+        alts = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not alts:
+            return ""
+        body = alts[0] if len(alts) == 1 else "(?:" + "|".join(alts) + ")"
+        if terminal:
+            return ("(?:" + body + ")?") if len(alts) == 1 else body + "?"
+        return body
+
+    return build(trie)
+
+
+class TrackRegistry:
+    def __init__(self, names: Dict[str, str]):
+        self.exact: Dict[str, str] = {}
+        for name, bankod in names.items():
+            self.exact[unicodedata.normalize("NFC", name.upper())] = bankod
+        self.ascii: Dict[str, str] = {}
+        for name, bankod in self.exact.items():
+            self.ascii.setdefault(strip_diacritics(name), bankod)
+        self.by_name: Dict[str, str] = dict(self.exact)
+        for name, bankod in self.ascii.items():
+            self.by_name.setdefault(name, bankod)
+        # A lookahead around the trie matches at every position, overlapping
+        # matches included, so search() can pick the longest name in the text.
+        self.exact_re = re.compile("(?=(" + _trie_pattern(self.exact) + "))") if self.exact else None
+        self.ascii_re = re.compile("(?=(" + _trie_pattern(self.ascii) + "))") if self.ascii else None
+
+    def lookup(self, name: str) -> Optional[str]:
+        hit = self.by_name.get(name)
+        if hit is None:
+            hit = self.by_name.get(strip_diacritics(name))
+        return hit
+
+    def search(self, text: str) -> Optional[str]:
+        # The longest name anywhere in the text wins, not the first one: in
+        # "ÅBY STORA PRIS PÅ GÖTEBORG TRAV" the race is at Göteborg. Names as
+        # written are tried before the ASCII forms of the stripped text.
+        for pattern, names, t in (
+            (self.exact_re, self.exact, text),
+            (self.ascii_re, self.ascii, strip_diacritics(text)),
+        ):
+            if pattern is None:
+                continue
+            found = [m.group(1) for m in pattern.finditer(t)]
+            if found:
+                return names[max(found, key=len)]
+        return None
+
+
+_registry: Optional[TrackRegistry] = None
+_lock = threading.Lock()
+_reported = set()
+
+
+def _sync(fn):
+    # The page scrapers run inside the event loop, where Django refuses ORM
+    # calls. Both callers are rare (first use, unknown name), so a short-lived
+    # thread is simpler than making every track lookup async. The thread's
+    # connection is closed before it exits; with the connection pool an
+    # unclosed one would hold its slot for good.
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return fn()
+
+    def run():
+        try:
+            return fn()
+        finally:
+            connection.close()
+
+    with ThreadPoolExecutor(max_workers=1) as ex:
+        return ex.submit(run).result()
+
+
+def get_registry() -> TrackRegistry:
+    global _registry
+    with _lock:
+        if _registry is None:
+            names = _sync(lambda: dict(Track.objects.values_list("name", "bankod")))
+            _registry = TrackRegistry(names)
+            logging.debug("Loaded %d track names", len(names))
+        return _registry
+
+
+def preload() -> TrackRegistry:
+    # For async code, through asyncio.to_thread before the page scrapers
+    # start, so the first lookup does not block the event loop.
+    try:
+        return get_registry()
+    finally:
+        connection.close()
+
+
+def reload() -> TrackRegistry:
+    global _registry
+    with _lock:
+        _registry = None
+    return get_registry()
+
+
+def _record_unknown(name: str, fallback: str) -> None:
+    # Once per name and process; occurrences counts the runs that saw it.
+    if name in _reported:
+        return
+    _reported.add(name)
+    logging.warning("Unknown track name=%r. Using fallback bankod=%r", name, fallback)
+
+    def write():
+        obj, created = UnknownTrack.objects.get_or_create(name=name[:100], defaults={"fallback": fallback})
+        if not created:
+            UnknownTrack.objects.filter(pk=obj.pk).update(occurrences=F("occurrences") + 1, last_seen=timezone.now())
+
+    try:
+        _sync(write)
+    except DatabaseError:
+        logging.exception("Could not record unknown track %r", name)
+
+
+def track_to_bankod(name: str) -> str:
+    n = unicodedata.normalize("NFC", normalize_cell_text(name).upper())
+    n = " ".join(strip_nav_prefixes(n).split())
+    if not n:
+        return ""
+    hit = get_registry().lookup(n)
+    if hit is not None:
+        return hit
+    fallback = n[:2].title()
+    _record_unknown(n, fallback)
+    return fallback
+
+
+def find_bankod_in_text(raw: str) -> Optional[str]:
+    # Longest track name anywhere in a free-text line such as a proposition title.
+    text = _NON_LETTER_RE.sub(" ", unicodedata.normalize("NFC", (raw or "").upper()))
+    return get_registry().search(" ".join(text.split()))
@@ -0,0 +1,18 @@
+from django.urls import path
+
+from scraper import views
+
+app_name = "scraper"
+
+urlpatterns = [
+    path("racedays/<str:day>/results/", views.raceday_results, name="raceday-results"),
+    path("racedays/<str:day>/startlist/", views.raceday_startlist, name="raceday-startlist"),
+    path("racedays/<str:day>/form/", views.raceday_form, name="raceday-form"),
+    path("racedays/<str:day>/drivers/", views.raceday_drivers, name="raceday-drivers"),
+    path("racedays/<str:day>/card/", views.raceday_card, name="raceday-card"),
+    path("propositions/<str:day>/", views.propositions, name="propositions"),
+    path("horses/<str:namn>/history/", views.horse_history, name="horse-history"),
+    path("export/<str:table>/", views.export_table, name="export"),
+    path("cache/", views.cache_stats, name="cache-stats"),
+    path("pool/", views.pool_stats, name="pool-stats"),
+]
@@ -1,3 +1,210 @@
-from django.shortcuts import render
+from datetime import date
+from typing import Callable, Iterable, Optional
 
-# Create your views here.
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, HttpResponseNotModified, JsonResponse, StreamingHttpResponse
+from django.utils.http import parse_etags
+from django.db import connections
+from django.views.decorators.http import require_GET
+
+from scraper import cache, export, queries
+
+# Read-only JSON over scraper/queries.py. Every list is one index-backed query
+# per request, paged with ?cursor= (the next_cursor of the previous page) and
+# ?limit= (at most queries.MAX_LIMIT). Responses go through the in-process
+# cache (scraper/cache.py) and carry an ETag; If-None-Match gets a 304.
+#
+# The read views are async. Under ASGI (horseproj.asgi) a fresh cache hit is
+# answered on the event loop; a miss runs the query on the request's own
+# thread with a pooled connection, so slow queries do not hold up hits.
+
+
+def _datum(day: str) -> int:
+    try:
+        d = date.fromisoformat(day)
+    except ValueError as exc:
+        raise ValueError(f"Invalid date {day!r}. Use YYYY-MM-DD.") from exc
+    return d.year * 10000 + d.month * 100 + d.day
+
+
+def _limit(value: Optional[str]) -> int:
+    if value is None:
+        return queries.DEFAULT_LIMIT
+    try:
+        limit = int(value)
+    except ValueError as exc:
+        raise ValueError(f"Invalid limit {value!r}.") from exc
+    if not 1 <= limit <= queries.MAX_LIMIT:
+        raise ValueError(f"limit must be between 1 and {queries.MAX_LIMIT}.")
+    return limit
+
+
+async def _cached(request, compute: Callable[[], tuple]) -> HttpResponse:
+    # compute() returns (payload, cache tags) and may raise ValueError for a
+    # bad parameter, which is a 400 and never cached.
+    key = request.path + "?" + "&".join(sorted(request.GET.urlencode().split("&")))
+    entry = cache.responses.fresh(key)
+    hit = entry is not None
+    if entry is None:
+        try:
+            entry, hit = await sync_to_async(cache.cached)(key, compute)
+        except ValueError as exc:
+            return JsonResponse({"error": str(exc)}, status=400)
+    if entry.etag in parse_etags(request.headers.get("If-None-Match", "")):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(entry.body, content_type="application/json")
+    response["ETag"] = entry.etag
+    response["Cache-Control"] = "no-cache"
+    response["X-Cache"] = "hit" if hit else "miss"
+    return response
+
+
+async def _respond(request, fetch: Callable[..., queries.Page], tags: Iterable[str], *args) -> HttpResponse:
+    def compute():
+        result = fetch(*args, cursor=request.GET.get("cursor") or None, limit=_limit(request.GET.get("limit")))
+        return {"results": result.rows, "next_cursor": result.next_cursor}, tags
+
+    return await _cached(request, compute)
+
+
+async def _with_day(request, fetch, day: str) -> HttpResponse:
+    try:
+        datum = _datum(day)
+    except ValueError as exc:
+        return JsonResponse({"error": str(exc)}, status=400)
+    return await _respond(request, fetch, [cache.raceday_tag(datum)], datum, request.GET.get("bankod") or None)
+
+
+@require_GET
+async def raceday_results(request, day: str):
+    return await _with_day(request, queries.raceday_results, day)
+
+
+@require_GET
+async def raceday_startlist(request, day: str):
+    return await _with_day(request, queries.raceday_startlist, day)
+
+
+@require_GET
+async def propositions(request, day: str):
+    return await _with_day(request, queries.propositions, day)
+
+
+@require_GET
+async def raceday_form(request, day: str):
+    try:
+        datum = _datum(day)
+    except ValueError as exc:
+        return JsonResponse({"error": str(exc)}, status=400)
+
+    # Tagged with every horse on the card, not only those with a form row
+    # yet, so a debutant's first form evicts the response.
+    def compute():
+        bankod = request.GET.get("bankod") or None
+        tags = [cache.raceday_tag(datum), *(cache.form_tag(n) for n, _ in queries.card_entries(datum, bankod))]
+        return {"results": queries.startlist_form(datum, bankod)}, tags
+
+    return await _cached(request, compute)
+
+
+@require_GET
+async def raceday_drivers(request, day: str):
+    try:
+        datum = _datum(day)
+    except ValueError as exc:
+        return JsonResponse({"error": str(exc)}, status=400)
+
+    def compute():
+        bankod = request.GET.get("bankod") or None
+        tags = [cache.raceday_tag(datum), *(cache.driver_tag(k) for _, k in queries.card_entries(datum, bankod))]
+        return queries.startlist_drivers(datum, bankod), tags
+
+    return await _cached(request, compute)
+
+
+@require_GET
+async def raceday_card(request, day: str):
+    # ?bankod= and ?starts= (history rows per horse, default
+    # queries.CARD_STARTS, at most queries.MAX_CARD_STARTS).
+    try:
+        datum = _datum(day)
+        starts = int(request.GET.get("starts", queries.CARD_STARTS))
+    except ValueError as exc:
+        return JsonResponse({"error": str(exc)}, status=400)
+    if not 1 <= starts <= queries.MAX_CARD_STARTS:
+        return JsonResponse({"error": f"starts must be between 1 and {queries.MAX_CARD_STARTS}."}, status=400)
+
+    def compute():
+        card = queries.raceday_card(datum, request.GET.get("bankod") or None, starts)
+        return {"results": card}, [cache.raceday_tag(datum), *(cache.horse_tag(r["namn"]) for r in card)]
+
+    return await _cached(request, compute)
+
+
+@require_GET
+async def horse_history(request, namn: str):
+    return await _respond(request, queries.horse_history, [cache.horse_tag(namn)], namn)
+
+
+@require_GET
+def cache_stats(request):
+    # This process's response cache; each web worker has its own.
+    return JsonResponse(cache.responses.stats())
+
+
+@require_GET
+def pool_stats(request):
+    # This process's database connection pool (psycopg_pool stats plus how
+    # much of it is in use), or null when DB_POOL is off.
+    pool = getattr(connections["default"], "pool", None)
+    if pool is None:
+        return JsonResponse({"pool": None})
+    stats = pool.get_stats()
+    in_use = stats.get("pool_size", 0) - stats.get("pool_available", 0)
+    stats["in_use"] = in_use
+    stats["utilization"] = round(in_use / stats["pool_max"], 3) if stats.get("pool_max") else None
+    return JsonResponse({"pool": stats})
+
+
+async def _aiter(chunks):
+    # Under ASGI a sync iterator would be read into a list before the first
+    # byte goes out. Each chunk is pulled on the request's thread instead,
+    # where the server-side cursor's connection lives.
+    step = sync_to_async(next)
+    done = object()
+    while True:
+        chunk = await step(chunks, done)
+        if chunk is done:
+            return
+        yield chunk
+
+
+@require_GET
+def export_table(request, table: str):
+    # ?format=csv|ndjson, ?from= and ?to= (YYYY-MM-DD), ?bankod=, ?gzip=1, and
+    # ?after=<YYYYMMDD>,<id> to resume after the last row received (no CSV
+    # header then). Streamed from a server-side cursor; nothing is buffered.
+    if table not in export.TABLES:
+        return JsonResponse({"error": f"Unknown table {table!r}."}, status=404)
+    fmt = request.GET.get("format", "csv")
+    if fmt not in export.FORMATS:
+        return JsonResponse({"error": f"format must be one of {', '.join(export.FORMATS)}."}, status=400)
+    try:
+        datum_from = _datum(request.GET["from"]) if request.GET.get("from") else None
+        datum_to = _datum(request.GET["to"]) if request.GET.get("to") else None
+        after = export.parse_after(request.GET["after"]) if request.GET.get("after") else None
+    except ValueError as exc:
+        return JsonResponse({"error": str(exc)}, status=400)
+    gz = request.GET.get("gzip") in ("1", "true")
+
+    data = export.rows(table, datum_from, datum_to, request.GET.get("bankod") or None, after)
+    body = export.encoded(export.lines(table, fmt, data, header=after is None), gzip=gz)
+    filename = f"{table}.{fmt}" + (".gz" if gz else "")
+    content_type = "text/csv" if fmt == "csv" else "application/x-ndjson"
+    if isinstance(request, ASGIRequest):
+        body = _aiter(iter(body))
+    response = StreamingHttpResponse(body, content_type="application/gzip" if gz else f"{content_type}; charset=utf-8")
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response